@@ -0,0 +1,74 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from camera.ball_detector import BallDetector
+from camera.frame_source import ReplayFrameSource
+from camera.tracking_settings import TrackingSettings
+
+"""
+Benchmarks the color lookup table segmentation against the HSV segmentation and checks that both produce the same
+masks on a recording.
+
+USAGE: python -m benchmarks.color_lookup_table outpy.avi --bits 6
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lookup table segmentation against HSV segmentation.")
+    parser.add_argument("recording", help="outpy.avi style recording or .npy raw frame dump.")
+    parser.add_argument("--calibration", default=None, help="Calibration file, <recording>.calibration.json by "
+                                                            "default.")
+    parser.add_argument("--bits", type=int, default=6, help="Number of bits kept from every color channel.")
+    args = parser.parse_args()
+
+    frame_source = ReplayFrameSource(args.recording, args.calibration, "Max")
+    frame_source.start()
+    corners = np.array(frame_source.get_calibration()["corners"])
+    frame = frame_source.read()
+
+    hsv_detector = BallDetector(corners, frame.shape, TrackingSettings(segmentation="HSV"))
+    start_time = time.perf_counter()
+    lut_detector = BallDetector(corners, frame.shape, TrackingSettings(segmentation="LUT", lut_bits=args.bits))
+    compile_time = time.perf_counter() - start_time
+    x, y, w, h = hsv_detector.roi_rect
+    roi_pixels = max(np.count_nonzero(hsv_detector.roi_mask), 1)
+
+    hsv_times, lut_times, pixel_mismatches, detection_mismatches = [], [], [], 0
+    frames = 0
+    while frame is not None:
+        frames += 1
+        blurred = cv2.GaussianBlur(frame[y:y + h, x:x + w], (5, 5), 0)
+
+        start_time = time.perf_counter()
+        hsv_mask = hsv_detector.segment(blurred)
+        hsv_times.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        lut_mask = lut_detector.segment(blurred)
+        lut_times.append(time.perf_counter() - start_time)
+
+        # Only pixels inside the playing field are used by the tracker.
+        mismatch = cv2.bitwise_and(cv2.bitwise_xor(hsv_mask, lut_mask), hsv_detector.roi_mask)
+        pixel_mismatches.append(np.count_nonzero(mismatch) / roi_pixels)
+        if len(hsv_detector.detect(frame)) != len(lut_detector.detect(frame)):
+            detection_mismatches += 1
+        frame = frame_source.read()
+    frame_source.stop()
+
+    print(f"Frames: {frames}, region of interest: {w}x{h}")
+    print(f"Lookup table compile time: {round(compile_time * 1000, 2)} ms, "
+          f"size: {round(lut_detector.color_lookup_table.table.nbytes / 1e6, 2)} MB")
+    print(f"HSV segmentation: mean {round(np.mean(hsv_times) * 1000, 3)} ms, "
+          f"p99 {round(np.percentile(hsv_times, 99) * 1000, 3)} ms")
+    print(f"LUT segmentation: mean {round(np.mean(lut_times) * 1000, 3)} ms, "
+          f"p99 {round(np.percentile(lut_times, 99) * 1000, 3)} ms")
+    print(f"Mismatched pixels: mean {round(np.mean(pixel_mismatches) * 100, 4)} %, "
+          f"max {round(np.max(pixel_mismatches) * 100, 4)} %")
+    print(f"Frames with a different number of contours: {detection_mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from camera.background_detector import BackgroundSubtractionDetector
+from camera.ball_detector import BallDetector
+from camera.frame_source import ReplayFrameSource
+from camera.tracking_settings import TrackingSettings
+
+"""
+Benchmarks the HSV and the background subtraction ball detectors on a recording for latency and miss rate. A frame is
+a miss when the detector does not return exactly one ball contour, which is what the tracking loop requires.
+
+USAGE: python -m benchmarks.detectors outpy.avi
+"""
+
+
+def get_center(contour) -> tuple:
+    M = cv2.moments(contour)
+    return M["m10"] / M["m00"], M["m01"] / M["m00"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ball detectors.")
+    parser.add_argument("recording", help="outpy.avi style recording or .npy raw frame dump.")
+    parser.add_argument("--calibration", default=None, help="Calibration file, <recording>.calibration.json by "
+                                                            "default.")
+    args = parser.parse_args()
+
+    frame_source = ReplayFrameSource(args.recording, args.calibration, "Max")
+    frame_source.start()
+    corners = np.array(frame_source.get_calibration()["corners"])
+    frame = frame_source.read()
+    detectors = {"HSV": BallDetector(corners, frame.shape, TrackingSettings(detector="HSV")),
+                 "Background": BackgroundSubtractionDetector(corners, frame.shape,
+                                                             TrackingSettings(detector="Background"))}
+    times = {name: [] for name in detectors}
+    misses = {name: 0 for name in detectors}
+    # Distance between the ball centers when both detectors found the ball.
+    center_distances = []
+
+    frames = 0
+    while frame is not None:
+        frames += 1
+        centers = {}
+        for name, detector in detectors.items():
+            start_time = time.perf_counter()
+            cnts = detector.detect(frame)
+            detector.finish_frame()
+            times[name].append(time.perf_counter() - start_time)
+            if len(cnts) == 1:
+                centers[name] = get_center(cnts[0])
+            else:
+                misses[name] += 1
+        if len(centers) == len(detectors):
+            (x1, y1), (x2, y2) = centers.values()
+            center_distances.append(np.hypot(x1 - x2, y1 - y2))
+        frame = frame_source.read()
+    frame_source.stop()
+
+    print(f"Frames: {frames}")
+    for name in detectors:
+        print(f"{name}: mean {round(np.mean(times[name]) * 1000, 3)} ms, "
+              f"p99 {round(np.percentile(times[name], 99) * 1000, 3)} ms, "
+              f"miss rate {round(misses[name] / frames * 100, 2)} %")
+    if center_distances:
+        print(f"Center distance when both detect the ball: mean {round(np.mean(center_distances), 2)} px, "
+              f"max {round(np.max(center_distances), 2)} px")
+
+
+if __name__ == "__main__":
+    main()
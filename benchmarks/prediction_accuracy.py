@@ -0,0 +1,290 @@
+import argparse
+import itertools
+import json
+import time
+from queue import SimpleQueue
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.trajectory_solver import create_prediction, get_ball_states
+from camera.frame_journal import FrameJournal
+from camera.frame_source import load_calibration
+from camera.prediction_parameters import PredictionParameters
+from camera.tracking_settings import TrackingSettings
+from camera.trajectory_solver import predict_batch
+from camera.undistortion import PointUndistorter
+
+"""
+Replays recorded ball positions through BallPrediction and compares every predicted goalie line crossing with the
+crossing that was actually observed next. The ball positions are read from a frame journal, or from a CSV file with a
+header and the columns timestamp, ball_x and ball_y, empty when the ball was not detected. Reports the distribution of
+the arrival y error, how long before the crossing the predictions were made and the time per get_predicted call as
+JSON, so runs with different parameters or commits can be compared. The physics parameters can be overridden to tune
+them against the recordings. The lens distortion saved with the calibration is only removed when --undistort is
+passed, like with undistort_points on the camera, to measure its effect.
+The --sweep-* options additionally score every combination of the given parameter values with the vectorized
+predict_batch. Every pair of consecutive detections is one ball state, and all states of a recording are predicted in
+one call per parameter combination. The sweep uses the velocity of the last two detections like the closed form
+solver without the Kalman filter, and also reports the error of the predicted arrival time.
+
+USAGE: python -m benchmarks.prediction_accuracy recording.journal --output accuracy.json
+       python -m benchmarks.prediction_accuracy shots.csv --calibration shots.calibration.json --restitution 0.7
+       python -m benchmarks.prediction_accuracy recording.journal --sweep-damping 0.8 0.9 --sweep-restitution 0.6 0.75
+"""
+
+# Maximum number of frames between two detections that the ball is interpolated over to find the crossing.
+MAX_CROSSING_GAP = 5
+
+
+def load_journal_positions(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :param path: Frame journal.
+    :return: Timestamps, x pixels and y pixels of all frames, NaN when the ball was not detected.
+    """
+    journal = FrameJournal.open(path)
+    records = journal.get_records().copy()
+    journal.close()
+    return (records["timestamp"].astype(np.float64), records["ball_x"].astype(np.float64),
+            records["ball_y"].astype(np.float64))
+
+
+def load_csv_positions(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :param path: CSV file with the columns timestamp, ball_x and ball_y.
+    :return: Timestamps, x pixels and y pixels of all frames, NaN when the ball was not detected.
+    """
+    rows = np.atleast_1d(np.genfromtxt(path, delimiter=",", names=True, dtype=np.float64))
+    return rows["timestamp"], rows["ball_x"], rows["ball_y"]
+
+
+def find_crossings(timestamps: np.ndarray, x_pixels: np.ndarray, y_pixels: np.ndarray,
+                   target_x_pixel: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds the frames in which the ball crossed the goalie line towards the goal, interpolating the crossing between the
+    last detection before the line and the first one after it.
+    :return: Frame index after every crossing, and the interpolated time and y pixel of the crossings.
+    """
+    detected = np.flatnonzero(~np.isnan(x_pixels))
+    before, after = detected[:-1], detected[1:]
+    crosses = ((x_pixels[before] < target_x_pixel) & (x_pixels[after] >= target_x_pixel)
+               & (after - before <= MAX_CROSSING_GAP))
+    before, after = before[crosses], after[crosses]
+    fraction = (target_x_pixel - x_pixels[before]) / (x_pixels[after] - x_pixels[before])
+    crossing_times = timestamps[before] + fraction * (timestamps[after] - timestamps[before])
+    crossing_ys = y_pixels[before] + fraction * (y_pixels[after] - y_pixels[before])
+    return after, crossing_times, crossing_ys
+
+
+def match_crossings(frames: np.ndarray, timestamps: np.ndarray, crossing_frames: np.ndarray,
+                    crossing_times: np.ndarray, max_lead_time: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Matches every prediction with the next crossing after the frame it was made in.
+    :param frames: Frame index of every prediction.
+    :param max_lead_time: Predictions made longer than this in seconds before the next crossing are not matched to it.
+    :return: Index of the next crossing and time in seconds until it of every prediction, and which predictions were
+    matched. The lead time is infinite when there is no next crossing.
+    """
+    next_crossings = np.searchsorted(crossing_frames, frames, side="right")
+    has_crossing = next_crossings < len(crossing_frames)
+    lead_times = np.full(len(frames), np.inf)
+    lead_times[has_crossing] = crossing_times[next_crossings[has_crossing]] - timestamps[frames[has_crossing]]
+    return next_crossings, lead_times, has_crossing & (lead_times <= max_lead_time)
+
+
+def summarize(values: np.ndarray, scale: float = 1.0) -> dict:
+    """
+    :param values: Samples, e.g. errors or latencies.
+    :param scale: Factor applied to the samples, e.g. to convert seconds to microseconds.
+    :return: Count, mean and percentiles of the samples, rounded for the report.
+    """
+    values = np.asarray(values, dtype=np.float64) * scale
+    if len(values) == 0:
+        return {"count": 0, "mean": None, "p50": None, "p90": None, "p95": None, "p99": None, "max": None}
+    summary = {"count": int(len(values)), "mean": round(float(np.mean(values)), 3)}
+    for percentile in (50, 90, 95, 99):
+        summary[f"p{percentile}"] = round(float(np.percentile(values, percentile)), 3)
+    summary["max"] = round(float(np.max(values)), 3)
+    return summary
+
+
+def replay(calibration: dict, timestamps: np.ndarray, x_pixels: np.ndarray, y_pixels: np.ndarray,
+           settings: TrackingSettings, parameters: PredictionParameters, max_lead_time: float,
+           source: Optional[str] = None) -> dict:
+    """
+    Feeds the recorded ball positions frame by frame into a new BallPrediction and matches its trajectory predictions
+    with the observed crossings.
+    :param calibration: Dictionary with "corners" and "goalie_x_pixel_position".
+    :param max_lead_time: Predictions made longer than this in seconds before the next crossing are not matched to it.
+    :param source: Name of the recording for the report.
+    :return: Report of the accuracy, lead time and latency.
+    """
+    queue = SimpleQueue()
+    point_undistorter = PointUndistorter.from_calibration(calibration) if settings.undistort_points else None
+    prediction = create_prediction(calibration, queue, settings, parameters, point_undistorter)
+    latencies = []
+    quick_strikes = 0
+    # Frame index and predicted y pixel of every frame in which a trajectory was predicted.
+    predicted_frames, predicted_ys = [], []
+    for index in range(len(x_pixels)):
+        timestamp = None if np.isnan(timestamps[index]) else float(timestamps[index])
+        if np.isnan(x_pixels[index]):
+            prediction.add_new_empty(timestamp)
+        else:
+            prediction.add_new(float(x_pixels[index]), float(y_pixels[index]), timestamp)
+        start_time = time.perf_counter()
+        predicted_y = prediction.get_predicted()
+        latencies.append(time.perf_counter() - start_time)
+        while not queue.empty():
+            queue.get_nowait()
+            quick_strikes += 1
+        # The path is only set when a trajectory was predicted, not when the goalie follows the current position.
+        if prediction.get_path() is not None:
+            predicted_frames.append(index)
+            predicted_ys.append(predicted_y)
+
+    # The predictions are returned in camera pixels, so the crossings are found on the goalie line of the camera image.
+    crossing_frames, crossing_times, crossing_ys = find_crossings(timestamps, x_pixels, y_pixels,
+                                                                  calibration["goalie_x_pixel_position"])
+    predicted_frames = np.array(predicted_frames, dtype=np.int64)
+    predicted_ys = np.array(predicted_ys, dtype=np.float64)
+    next_crossings, lead_times, matched = match_crossings(predicted_frames, timestamps, crossing_frames,
+                                                          crossing_times, max_lead_time)
+    errors = predicted_ys[matched] - crossing_ys[next_crossings[matched]]
+    lead_times = lead_times[matched]
+    matched_crossings = next_crossings[matched]
+    # The earliest prediction of every crossing, which decides how much time the goalie has to move.
+    _, first = np.unique(matched_crossings, return_index=True)
+
+    return {
+        "source": source,
+        "solver": settings.prediction_solver,
+        "kalman_filter": settings.kalman_filter,
+        "undistort_points": point_undistorter is not None,
+        "parameters": parameters.dict(),
+        "frames": int(len(x_pixels)),
+        "detections": int(np.count_nonzero(~np.isnan(x_pixels))),
+        "crossings": int(len(crossing_frames)),
+        "predicted_crossings": int(len(first)),
+        "predictions": int(len(predicted_frames)),
+        "matched_predictions": int(np.count_nonzero(matched)),
+        "quick_strikes": quick_strikes,
+        "y_error_px": summarize(np.abs(errors)),
+        "y_bias_px": round(float(np.mean(errors)), 3) if len(errors) else None,
+        "first_prediction_y_error_px": summarize(np.abs(errors[first])),
+        "lead_time_ms": summarize(lead_times, 1000),
+        "first_prediction_lead_time_ms": summarize(lead_times[first], 1000),
+        "latency_us": summarize(latencies, 1e6),
+    }
+
+
+def sweep(calibration: dict, timestamps: np.ndarray, x_pixels: np.ndarray, y_pixels: np.ndarray,
+          parameter_sets: List[PredictionParameters], max_lead_time: float,
+          point_undistorter: Optional[PointUndistorter] = None) -> List[dict]:
+    """
+    Scores parameter combinations with the batch predictor on all ball states of a recording that are moving towards
+    the goalie and are followed by a crossing.
+    :param calibration: Dictionary with "corners" and "goalie_x_pixel_position".
+    :param parameter_sets: Parameter combinations to score.
+    :param max_lead_time: States more than this in seconds before the next crossing are not scored.
+    :param point_undistorter: Removes the lens distortion from the ball positions before predicting.
+    :return: Report of every parameter combination, the most accurate first.
+    """
+    # Only used for the playing field in the pixels the prediction works in.
+    prediction = create_prediction(calibration, point_undistorter=point_undistorter)
+    if point_undistorter is not None:
+        detected = ~np.isnan(x_pixels)
+        points = point_undistorter.undistort_points(np.column_stack((x_pixels[detected], y_pixels[detected])))
+        x_pixels, y_pixels = x_pixels.copy(), y_pixels.copy()
+        x_pixels[detected], y_pixels[detected] = points[:, 0], points[:, 1]
+    frames, states = get_ball_states(timestamps, x_pixels, y_pixels)
+    crossing_frames, crossing_times, crossing_ys = find_crossings(timestamps, x_pixels, y_pixels,
+                                                                  prediction.target_x_pixel)
+    next_crossings, lead_times, matched = match_crossings(frames, timestamps, crossing_frames, crossing_times,
+                                                          max_lead_time)
+    scored = matched & (states[:, 2] > 0) & (states[:, 0] < prediction.target_x_pixel)
+    states, lead_times, actual_ys = states[scored], lead_times[scored], crossing_ys[next_crossings[scored]]
+
+    results = []
+    for parameters in parameter_sets:
+        start_time = time.perf_counter()
+        arrival_ys, arrival_times, _ = predict_batch(states, prediction.target_x_pixel, prediction.playing_field_top,
+                                                     prediction.playing_field_bottom, parameters)
+        batch_time = time.perf_counter() - start_time
+        # NaN for the states in which the ball is predicted to stop before the goalie, although it crossed the line.
+        arrives = ~np.isnan(arrival_ys)
+        results.append({
+            "parameters": parameters.dict(),
+            "states": int(len(states)),
+            "predicted_states": int(np.count_nonzero(arrives)),
+            "y_error_px": summarize(np.abs(arrival_ys[arrives] - actual_ys[arrives])),
+            "time_error_ms": summarize(np.abs(arrival_times[arrives] - lead_times[arrives]), 1000),
+            "batch_time_ms": round(batch_time * 1000, 3),
+        })
+    # Combinations that predict no state at all are listed last.
+    results.sort(key=lambda result: (result["y_error_px"]["mean"] is None, result["y_error_px"]["mean"] or 0))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the prediction accuracy on recorded ball positions.")
+    parser.add_argument("recording", help="Frame journal, or CSV file with timestamp, ball_x and ball_y columns.")
+    parser.add_argument("--calibration", default=None,
+                        help="Calibration file, <recording>.calibration.json by default.")
+    parser.add_argument("--output", default=None, help="JSON file to write the report to instead of printing it.")
+    parser.add_argument("--solver", choices=["ClosedForm", "Iterative"], default=TrackingSettings().prediction_solver,
+                        help="Trajectory solver of the prediction.")
+    parser.add_argument("--kalman", action="store_true", help="Filter the ball state with the Kalman filter.")
+    parser.add_argument("--undistort", action="store_true",
+                        help="Predict on the undistorted pixels if the calibration has the lens distortion.")
+    parser.add_argument("--max-lead-time", type=float, default=1.0,
+                        help="Seconds before a crossing after which predictions are not matched to it.")
+    parser.add_argument("--damping", type=float, default=None, help="Fraction of the speed kept per time step.")
+    parser.add_argument("--restitution", type=float, default=None, help="Fraction of the speed kept by a bounce.")
+    parser.add_argument("--threshold", type=float, default=None, help="Speed in pixels per second of a stopped ball.")
+    parser.add_argument("--y-restitution-factor", type=float, default=None,
+                        help="Additional factor of the y speed after a bounce.")
+    parser.add_argument("--time-step", type=float, default=None, help="Time step in seconds of the damping.")
+    parser.add_argument("--sweep-damping", type=float, nargs="+", default=None, help="Damping values to sweep.")
+    parser.add_argument("--sweep-restitution", type=float, nargs="+", default=None,
+                        help="Restitution values to sweep.")
+    parser.add_argument("--sweep-threshold", type=float, nargs="+", default=None, help="Threshold values to sweep.")
+    parser.add_argument("--sweep-y-restitution-factor", type=float, nargs="+", default=None,
+                        help="Y restitution factor values to sweep.")
+    args = parser.parse_args()
+
+    overrides = {"damping": args.damping, "restitution": args.restitution, "threshold": args.threshold,
+                 "y_restitution_factor": args.y_restitution_factor, "time_step": args.time_step}
+    parameters = PredictionParameters(**{name: value for name, value in overrides.items() if value is not None})
+    settings = TrackingSettings(prediction_solver=args.solver, kalman_filter=args.kalman,
+                                undistort_points=args.undistort)
+
+    if args.recording.endswith(".csv"):
+        timestamps, x_pixels, y_pixels = load_csv_positions(args.recording)
+    else:
+        timestamps, x_pixels, y_pixels = load_journal_positions(args.recording)
+    calibration = load_calibration(args.calibration if args.calibration is not None
+                                   else args.recording + ".calibration.json")
+    report = replay(calibration, timestamps, x_pixels, y_pixels, settings, parameters, args.max_lead_time,
+                    args.recording)
+
+    sweeps = {"damping": args.sweep_damping, "restitution": args.sweep_restitution,
+              "threshold": args.sweep_threshold, "y_restitution_factor": args.sweep_y_restitution_factor}
+    sweeps = {name: values for name, values in sweeps.items() if values is not None}
+    if sweeps:
+        # Parameters that are not swept keep the values of the replay.
+        parameter_sets = [parameters.copy(update=dict(zip(sweeps, values)))
+                          for values in itertools.product(*sweeps.values())]
+        point_undistorter = PointUndistorter.from_calibration(calibration) if settings.undistort_points else None
+        report["sweep"] = sweep(calibration, timestamps, x_pixels, y_pixels, parameter_sets, args.max_lead_time,
+                                point_undistorter)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import sys
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from camera.ball_prediction import BallPrediction
+from camera.camera_measurements import CameraMeasurements
+from camera.frame_journal import FrameJournal
+from camera.frame_source import load_calibration, sort_field_corners
+from camera.prediction_parameters import PredictionParameters
+from camera.tracking_settings import TrackingSettings
+from camera.undistortion import PointUndistorter
+from camera.trajectory_solver import predict_batch, solve_bounce_trajectory
+
+"""
+Compares the closed form bounce solver with the iterative time step loop of BallPrediction. The ball states are taken
+from the ball positions of a frame journal, or generated at random on the playing field with --synthetic. Reports how
+often both agree on whether the ball reaches the goalie, the difference of the arrival position and time, and the time
+per call of both. Also checks that the vectorized predict_batch gives the same arrivals, times and bounce counts as the
+closed form solver, including the balls that stop before the goalie, and exits with status 1 if it does not.
+
+USAGE: python -m benchmarks.trajectory_solver recording.journal
+       python -m benchmarks.trajectory_solver --synthetic 10000
+"""
+
+
+def create_prediction(calibration: dict, queue=None, settings: Optional[TrackingSettings] = None,
+                      parameters: Optional[PredictionParameters] = None,
+                      point_undistorter: Optional[PointUndistorter] = None) -> BallPrediction:
+    """
+    Creates a BallPrediction with the playing field of a calibration, like CameraManager does.
+    :param calibration: Dictionary with "corners" and "goalie_x_pixel_position".
+    :param queue: Queue that receives the strike events of the prediction.
+    :param settings: Tracking settings, e.g. the solver and the Kalman filter.
+    :param parameters: Physics parameters of the prediction.
+    :param point_undistorter: Removes the lens distortion from the ball positions.
+    :return:
+    """
+    bottom_left, top_left, top_right, _ = sort_field_corners(calibration["corners"])
+    return BallPrediction(top_right[0] - top_left[0], bottom_left[1] - top_left[1], CameraMeasurements().camera_fps,
+                          queue, calibration["goalie_x_pixel_position"], top_left, 15, settings, parameters,
+                          point_undistorter)
+
+
+def get_ball_states(timestamps: np.ndarray, x_pixels: np.ndarray,
+                    y_pixels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the ball states of all pairs of consecutive frames in which the ball was detected, like BallPrediction
+    does from its last two positions.
+    :param timestamps: Capture time of every frame in seconds.
+    :param x_pixels: Ball position of every frame, NaN when the ball was not detected.
+    :param y_pixels:
+    :return: Index of the later frame of every pair, and array of (x, y, x speed, y speed) rows in pixels and pixels per
+    second.
+    """
+    detected = ~np.isnan(x_pixels)
+    pairs = np.flatnonzero(detected[1:] & detected[:-1]) + 1
+    time_deltas = timestamps[pairs] - timestamps[pairs - 1]
+    pairs, time_deltas = pairs[time_deltas > 0], time_deltas[time_deltas > 0]
+    x_speeds = (x_pixels[pairs] - x_pixels[pairs - 1]) / time_deltas
+    y_speeds = (y_pixels[pairs] - y_pixels[pairs - 1]) / time_deltas
+    return pairs, np.column_stack((x_pixels[pairs], y_pixels[pairs], x_speeds, y_speeds))
+
+
+def load_journal_states(path: str) -> np.ndarray:
+    """
+    Computes the ball states of all pairs of consecutive frames of a journal in which the ball was detected.
+    :param path: Frame journal.
+    :return: Array of (x, y, x speed, y speed) rows in pixels and pixels per second.
+    """
+    journal = FrameJournal.open(path)
+    records = journal.get_records().copy()
+    journal.close()
+    _, states = get_ball_states(records["timestamp"].astype(np.float64), records["ball_x"].astype(np.float64),
+                                records["ball_y"].astype(np.float64))
+    return states
+
+
+def generate_states(prediction: BallPrediction, count: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    x_pixels = rng.uniform(prediction.playing_field_top_left[0], prediction.target_x_pixel, count)
+    y_pixels = rng.uniform(prediction.playing_field_top, prediction.playing_field_bottom, count)
+    x_speeds = rng.uniform(0, 3000, count)
+    y_speeds = rng.uniform(-2000, 2000, count)
+    return np.column_stack((x_pixels, y_pixels, x_speeds, y_speeds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the closed form bounce solver with the iterative loop.")
+    parser.add_argument("journal", nargs="?", default=None, help="Frame journal with detected ball positions.")
+    parser.add_argument("--calibration", default=None,
+                        help="Calibration file, <journal>.calibration.json by default. The last saved calibration "
+                             "without a journal.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Number of random ball states to use instead.")
+    args = parser.parse_args()
+    if args.journal is None and args.synthetic <= 0:
+        parser.error("Pass a journal or --synthetic.")
+
+    calibration_file = args.calibration
+    if calibration_file is None and args.journal is not None:
+        calibration_file = args.journal + ".calibration.json"
+    calibration = load_calibration(calibration_file)
+    prediction = create_prediction(calibration)
+    if args.synthetic > 0:
+        states = generate_states(prediction, args.synthetic)
+    else:
+        states = load_journal_states(args.journal)
+    # Both solvers only run for balls moving towards the goalie.
+    states = states[(states[:, 2] > 0) & (states[:, 0] < prediction.target_x_pixel)]
+
+    iterative_results, iterative_times = [], []
+    closed_form_results, closed_form_times = [], []
+    for x_pixel, y_pixel, x_speed, y_speed in states.tolist():
+        start_time = time.perf_counter()
+        iterative_results.append(prediction._predict_iterative(x_pixel, y_pixel, x_speed, y_speed))
+        iterative_times.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        closed_form_results.append(solve_bounce_trajectory(
+            x_pixel, y_pixel, x_speed, y_speed, prediction.target_x_pixel, prediction.playing_field_top,
+            prediction.playing_field_bottom, prediction.parameters))
+        closed_form_times.append(time.perf_counter() - start_time)
+
+    both = [(iterative, closed_form) for iterative, closed_form in zip(iterative_results, closed_form_results)
+            if iterative is not None and closed_form is not None]
+    agreements = sum((iterative is None) == (closed_form is None)
+                     for iterative, closed_form in zip(iterative_results, closed_form_results))
+    print(f"Ball states moving towards the goalie: {len(states)}")
+    if len(states) == 0:
+        return
+    print(f"Agree on reaching the goalie: {round(agreements / len(states) * 100, 2)} %, "
+          f"both reach it: {len(both)}")
+    if both:
+        y_errors = np.abs([iterative[0] - closed_form[0] for iterative, closed_form in both])
+        time_errors = np.abs([iterative[1] - closed_form[1] for iterative, closed_form in both])
+        print(f"Arrival y difference: mean {round(float(np.mean(y_errors)), 2)} px, "
+              f"p95 {round(float(np.percentile(y_errors, 95)), 2)} px, max {round(float(np.max(y_errors)), 2)} px")
+        print(f"Arrival time difference: mean {round(float(np.mean(time_errors)) * 1000, 2)} ms, "
+              f"p95 {round(float(np.percentile(time_errors, 95)) * 1000, 2)} ms")
+    for name, times in (("Iterative", iterative_times), ("Closed form", closed_form_times)):
+        print(f"{name}: mean {round(float(np.mean(times)) * 1e6, 2)} us, "
+              f"p99 {round(float(np.percentile(times, 99)) * 1e6, 2)} us, "
+              f"max {round(float(np.max(times)) * 1e6, 2)} us")
+
+    start_time = time.perf_counter()
+    batch_ys, batch_times, batch_bounces = predict_batch(states, prediction.target_x_pixel,
+                                                         prediction.playing_field_top,
+                                                         prediction.playing_field_bottom, prediction.parameters)
+    batch_time = time.perf_counter() - start_time
+    closed_form = np.array([(np.nan, np.nan, -1) if result is None else result[:3] for result in closed_form_results])
+    # Both have to agree on which balls stop before the goalie, and on the arrival of the others.
+    mismatches = np.isnan(batch_ys) != np.isnan(closed_form[:, 0])
+    reached = ~np.isnan(batch_ys) & ~np.isnan(closed_form[:, 0])
+    y_differences = np.abs(batch_ys[reached] - closed_form[reached, 0])
+    time_differences = np.abs(batch_times[reached] - closed_form[reached, 1])
+    mismatches[reached] |= ((y_differences > 1e-6) | (time_differences > 1e-9)
+                            | (batch_bounces[reached] != closed_form[reached, 2]))
+    print(f"Batch: {round(batch_time / len(states) * 1e6, 3)} us per state, "
+          f"differs from the closed form for {np.count_nonzero(mismatches)} of {len(states)} states, "
+          f"max arrival y difference {round(float(np.max(y_differences, initial=0)), 9)} px, "
+          f"max arrival time difference {round(float(np.max(time_differences, initial=0)) * 1000, 9)} ms")
+    if np.any(mismatches):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
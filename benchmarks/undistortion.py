@@ -0,0 +1,81 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from camera.camera_measurements import CameraMeasurements
+from camera.undistortion import PointUndistorter
+
+"""
+Benchmarks undistorting only the ball position and the predicted path with cv2.undistortPoints against undistorting
+every frame with cv2.remap, and checks the accuracy of the point undistortion by distorting the result again.
+The default intrinsics are typical for the D435 color camera at 960x540, pass the values of the camera to compare.
+
+USAGE: python -m benchmarks.undistortion --iterations 1000 --coeffs 0.1 -0.25 0 0 0.1
+"""
+
+
+def main():
+    camera_measurements = CameraMeasurements()
+    parser = argparse.ArgumentParser(description="Benchmark point undistortion against full frame remap.")
+    parser.add_argument("--iterations", type=int, default=1000, help="Number of timed calls of every method.")
+    parser.add_argument("--fx", type=float, default=680.0, help="Focal length in x pixels.")
+    parser.add_argument("--fy", type=float, default=680.0, help="Focal length in y pixels.")
+    parser.add_argument("--coeffs", type=float, nargs=5, default=[0.1, -0.25, 0.0, 0.0, 0.1],
+                        help="Distortion coefficients k1 k2 p1 p2 k3.")
+    parser.add_argument("--path-points", type=int, default=50, help="Number of points of a predicted path.")
+    args = parser.parse_args()
+
+    width, height = camera_measurements.camera_resolution_x, camera_measurements.camera_resolution_y
+    camera_matrix = np.array([[args.fx, 0, width / 2], [0, args.fy, height / 2], [0, 0, 1]])
+    dist_coeffs = np.array(args.coeffs)
+    undistorter = PointUndistorter(camera_matrix, dist_coeffs)
+    inverse_undistorter = PointUndistorter(camera_matrix, dist_coeffs, inverse_model=True)
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    point = np.array([width * 0.9, height * 0.1])
+    path = np.column_stack((np.linspace(0, width - 1, args.path_points), np.linspace(0, height - 1, args.path_points)))
+
+    # The maps only have to be computed once, so they are not part of the per frame time.
+    start_time = time.perf_counter()
+    map_x, map_y = cv2.initUndistortRectifyMap(camera_matrix, dist_coeffs, None, camera_matrix, (width, height),
+                                               cv2.CV_16SC2)
+    map_time = time.perf_counter() - start_time
+
+    def time_calls(function):
+        times = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        return np.mean(times) * 1e6, np.percentile(times, 99) * 1e6
+
+    results = {"remap full frame": time_calls(lambda: cv2.remap(frame, map_x, map_y, cv2.INTER_LINEAR)),
+               "undistortPoints ball position": time_calls(lambda: undistorter.undistort_point(*point)),
+               f"undistortPoints path of {args.path_points} points": time_calls(
+                   lambda: undistorter.undistort_points(path)),
+               "inverse model ball position": time_calls(lambda: inverse_undistorter.undistort_point(*point))}
+
+    # Distorting the undistorted points again should give back the original points.
+    undistorted = undistorter.undistort_points(path)
+    normalized = np.column_stack(((undistorted[:, 0] - camera_matrix[0, 2]) / args.fx,
+                                  (undistorted[:, 1] - camera_matrix[1, 2]) / args.fy, np.ones(len(path))))
+    distorted, _ = cv2.projectPoints(normalized, np.zeros(3), np.zeros(3), camera_matrix, dist_coeffs)
+    round_trip_error = np.linalg.norm(distorted.reshape(-1, 2) - path, axis=1)
+    # distort_points is used to draw the predictions on the frame and should match cv2.projectPoints.
+    distort_error = np.linalg.norm(undistorter.distort_points(undistorted) - distorted.reshape(-1, 2), axis=1)
+    correction = np.linalg.norm(undistorted - path, axis=1)
+
+    print(f"Frame: {width}x{height}, remap maps computed in {round(map_time * 1000, 2)} ms")
+    for name, (mean, p99) in results.items():
+        print(f"{name}: mean {round(mean, 2)} us, p99 {round(p99, 2)} us")
+    print(f"Correction along the path: mean {round(float(np.mean(correction)), 2)} px, "
+          f"max {round(float(np.max(correction)), 2)} px")
+    print(f"Round trip error: max {round(float(np.max(round_trip_error)), 4)} px, "
+          f"distort_points error: max {round(float(np.max(distort_error)), 4)} px")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+from typing import Optional
+
 import cv2 as cv
 import numpy as np
 
@@ -54,17 +56,32 @@ def pose_estimation(ids, corners, intrinsics, rgb_frame = None):
     print(np.linalg.norm(vecs[camera_measurements.id_aruco_playing_field_bottom][1] - vecs[camera_measurements.id_aruco_playing_field_top][1]))
 
 
-def detect_markers(rgb_frame: np.array) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
-    # Get ArUco dictionary
+def create_detector() -> cv.aruco.ArucoDetector:
+    """
+    Creates the detector for the markers on the table. Creating it is expensive, reuse it when detecting repeatedly.
+    :return:
+    """
     aruco_dict = cv.aruco.getPredefinedDictionary(cv.aruco.DICT_6X6_250)
     aruco_params = cv.aruco.DetectorParameters()
-    detector = cv.aruco.ArucoDetector(aruco_dict, aruco_params)
+    return cv.aruco.ArucoDetector(aruco_dict, aruco_params)
 
-    # Convert to grayscale
-    gray = cv.cvtColor(rgb_frame, cv.COLOR_BGR2GRAY)
+
+def detect_markers(rgb_frame: np.array, detector: Optional[cv.aruco.ArucoDetector] = None,
+                   require_all: bool = True) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Detects the markers on the table and rotates the corners of every marker into a common order.
+    :param rgb_frame: BGR frame.
+    :param detector: Detector returned by create_detector, a new one is created if None.
+    :param require_all: Raise a ValueError if any of the markers is missing.
+    :return: Corners, ids and rejected candidates.
+    """
+    if detector is None:
+        detector = create_detector()
 
     # Detect markers
     corners, ids, rejected = detector.detectMarkers(rgb_frame)
+    if ids is None:
+        ids = np.empty((0, 1), dtype=np.int32)
     # refactor corners area to so that it is easier to use
     tmp_corners = np.copy(corners)
 
@@ -88,7 +105,7 @@ def detect_markers(rgb_frame: np.array) -> tuple[np.ndarray, np.ndarray, np.ndar
         elif ids[ii] == camera_measurements.id_aruco_playing_field_bottom:
             stack.remove(camera_measurements.id_aruco_playing_field_bottom)
 
-    if stack:
+    if stack and require_all:
         raise ValueError("Missing ArUco markers: {}".format(stack))
 
     corners = tmp_corners
@@ -0,0 +1,125 @@
+import time
+from typing import Optional
+
+import cv2
+import imutils
+import numpy as np
+
+from camera.ball_detector import BallDetector
+from camera.tracking_settings import TrackingSettings
+
+
+class BackgroundSubtractionDetector(BallDetector):
+    """
+    Detects the foosball as the difference between the current frame and a running model of the empty playing field.
+    Unlike HSV thresholding it does not depend on hardcoded color ranges, so it keeps working when the lighting changes.
+    The background is updated once per frame with an exponential average that skips the foreground pixels, so the ball
+    and the players do not bleed into it.
+    """
+
+    def __init__(self, roi_corners: np.ndarray, frame_shape: tuple, settings: Optional[TrackingSettings] = None,
+                 roi: Optional[tuple] = None):
+        super().__init__(roi_corners, frame_shape, settings, roi)
+        # Weight of the current frame in the running background average.
+        self.learning_rate = self.settings.background_learning_rate
+        # Minimum difference with the background for a pixel to be foreground.
+        self.threshold = self.settings.background_threshold
+        # Contours outside this area range are not the ball.
+        self.min_area = self.settings.ball_min_area
+        self.max_area = self.settings.ball_max_area
+        # Running background of the region of interest rectangle. Initialized with the first frame, which should not
+        # have any obstructions on the playing field.
+        self.background: Optional[np.ndarray] = None
+        self.background_uint8: Optional[np.ndarray] = None
+        # Rows and columns of the background, blurred frame and foreground mask of the last get_mask call of the
+        # current frame, learned by finish_frame.
+        self.pending_update: Optional[tuple] = None
+
+    def set_region_of_interest(self, roi_corners: np.ndarray):
+        super().set_region_of_interest(roi_corners)
+        # The background of the old region of interest no longer lines up with the frames.
+        self.reset()
+
+    def reset(self):
+        """
+        Discards the background model, the next frame becomes the new background.
+        :return:
+        """
+        self.background = None
+        self.background_uint8 = None
+        self.pending_update = None
+
+    def __initialize_background(self, frame: np.ndarray):
+        """
+        Uses a frame as the background.
+        :param frame: Full BGR camera frame without obstructions on the playing field.
+        :return:
+        """
+        x, y, w, h = self.roi_rect
+        blurred = cv2.GaussianBlur(frame[y:y + h, x:x + w], (5, 5), 0)
+        self.background = blurred.astype(np.float32)
+        self.background_uint8 = blurred
+
+    def get_mask(self, frame: np.ndarray, rect: Optional[tuple] = None) -> np.ndarray:
+        if self.background is None:
+            self.__initialize_background(frame)
+        x, y, w, h = self.roi_rect if rect is None else rect
+        view = frame[y:y + h, x:x + w]
+        roi_x, roi_y, _, _ = self.roi_rect
+        # Views of the region of interest sized arrays that line up with the rectangle.
+        rows = slice(y - roi_y, y - roi_y + h)
+        cols = slice(x - roi_x, x - roi_x + w)
+        roi_mask = self.roi_mask[rows, cols]
+        background_uint8 = self.background_uint8[rows, cols]
+
+        blurred = cv2.GaussianBlur(view, (5, 5), 0)
+        diff = cv2.absdiff(blurred, background_uint8)
+        diff = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
+        _, mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.bitwise_and(mask, roi_mask)
+        mask = cv2.erode(mask, self.erode_kernel, iterations=1)
+        mask = cv2.dilate(mask, self.dilate_kernel, iterations=2)
+
+        # A search window followed by the full playing field fallback calls this twice for the same frame, only the
+        # last call is learned.
+        self.pending_update = (rows, cols, blurred, mask)
+        return mask
+
+    def finish_frame(self):
+        """
+        Learns the frame searched last into the background.
+        :return:
+        """
+        if self.pending_update is None:
+            return
+        start_time = time.perf_counter()
+        rows, cols, blurred, mask = self.pending_update
+        self.pending_update = None
+        # Update a contiguous copy and write it back, instead of relying on OpenCV to write into a strided view.
+        background = self.background[rows, cols].copy()
+        # Only learn the pixels that are not foreground.
+        cv2.accumulateWeighted(blurred, background, self.learning_rate, mask=cv2.bitwise_not(mask))
+        self.background[rows, cols] = background
+        self.background_uint8[rows, cols] = cv2.convertScaleAbs(background)
+        self._add_stage_time("background_update", time.perf_counter() - start_time)
+
+    def detect(self, frame: np.ndarray, rect: Optional[tuple] = None) -> list:
+        """
+        Finds the foreground contours that have the size of the ball.
+        :param frame: Full BGR camera frame.
+        :param rect: (x, y, w, h) in full frame pixel coordinates, the whole playing field by default.
+        :return: Contours in full frame pixel coordinates.
+        """
+        if rect is not None:
+            rect = self.clip_rect(rect)
+            if rect is None:
+                return []
+        start_time = time.perf_counter()
+        x, y, _, _ = self.roi_rect if rect is None else rect
+        mask = self.get_mask(frame, rect)
+        cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x, y))
+        cnts = imutils.grab_contours(cnts)
+        # The players and hands are also foreground, only keep the contours with the size of the ball.
+        cnts = [c for c in cnts if self.min_area <= cv2.contourArea(c) <= self.max_area]
+        self._add_stage_time("background", time.perf_counter() - start_time)
+        return cnts
@@ -0,0 +1,270 @@
+import time
+from typing import Optional
+
+import cv2
+import imutils
+import numpy as np
+
+from camera.color_lookup_table import ColorLookupTable
+from camera.tracking_settings import TrackingSettings
+
+
+class BallDetector:
+    """
+    Detects the foosball inside the playing field using HSV color thresholding.
+    """
+
+    def __init__(self, roi_corners: np.ndarray, frame_shape: tuple, settings: Optional[TrackingSettings] = None,
+                 roi: Optional[tuple] = None):
+        """
+        :param roi_corners: Corners of the playing field.
+        :param frame_shape: Shape of the frames that will be processed.
+        :param settings: Tracking settings.
+        :param roi: Precomputed (roi_rect, roi_mask) of the same corners and settings, e.g. from the calibration cache.
+        """
+        # Corners of the playing field polygon in full frame pixel coordinates.
+        self.roi_corners = np.array(roi_corners, dtype=np.int32)
+        # Shape of the frames that will be processed.
+        self.frame_shape = frame_shape
+        self.settings = settings if settings is not None else TrackingSettings()
+        # Define the lower and upper HSV boundaries of the foosball. Red wraps around hue 0 so two ranges are needed.
+        self.hsv_ranges = [((0, 167, 118), (10, 255, 255)),
+                           ((160, 142, 134), (255, 255, 255))]
+        # Lookup table compiled from the HSV ranges, replaces the HSV conversion when enabled.
+        self.color_lookup_table: Optional[ColorLookupTable] = None
+        if self.settings.segmentation == "LUT":
+            self.color_lookup_table = ColorLookupTable(self.hsv_ranges, self.settings.lut_bits)
+        # Kernels used to clean up the color mask.
+        self.erode_kernel = np.ones((3, 3), np.uint8)
+        self.dilate_kernel = np.ones((5, 5), np.uint8)
+        # Bounding rectangle (x, y, w, h) of the processed region and the playing field polygon mask inside it.
+        self.roi_rect: Optional[tuple] = None
+        self.roi_mask: Optional[np.ndarray] = None
+        if roi is not None:
+            self.roi_rect, self.roi_mask = roi
+        else:
+            self.__compute_region_of_interest()
+        # Number of cv2.pyrDown levels of the coarse detection stage, 0 detects at full resolution only.
+        self.pyramid_levels = self.settings.pyramid_levels
+        # Pixels added around every coarse candidate for the full resolution refinement patch.
+        self.refine_padding = 4 * (1 << self.pyramid_levels) + 10
+        # Total time in seconds and number of calls of every detection stage, reset by get_stage_timings.
+        self.stage_times = {}
+
+    def __compute_region_of_interest(self):
+        """
+        Computes the bounding rectangle and polygon mask of the playing field. The playing field does not move after
+        calibration so this only has to be done once instead of every frame.
+        :return:
+        """
+        frame_height, frame_width = self.frame_shape[:2]
+        if self.settings.crop_to_roi:
+            x, y, w, h = cv2.boundingRect(self.roi_corners)
+            # Clip the rectangle to the frame in case a corner was detected on the edge of the image.
+            x_end = min(x + w, frame_width)
+            y_end = min(y + h, frame_height)
+            x = max(x, 0)
+            y = max(y, 0)
+            self.roi_rect = (x, y, x_end - x, y_end - y)
+        else:
+            self.roi_rect = (0, 0, frame_width, frame_height)
+
+        x, y, w, h = self.roi_rect
+        full_mask = np.zeros((frame_height, frame_width), dtype=np.uint8)
+        cv2.fillPoly(full_mask, [self.roi_corners], 255)
+        # Copy so that the cropped mask is contiguous in memory.
+        self.roi_mask = full_mask[y:y + h, x:x + w].copy()
+
+    def set_region_of_interest(self, roi_corners: np.ndarray):
+        """
+        Moves the region of interest to new playing field corners, used when the calibration is updated.
+        :param roi_corners: Corners of the playing field polygon in full frame pixel coordinates.
+        :return:
+        """
+        self.roi_corners = np.array(roi_corners, dtype=np.int32)
+        self.__compute_region_of_interest()
+
+    def reset(self):
+        """
+        Discards the state kept between frames. Color thresholding does not keep any.
+        :return:
+        """
+        pass
+
+    def finish_frame(self):
+        """
+        Called once after a frame was searched, which may take several detect calls. Color thresholding does not learn
+        from the frames.
+        :return:
+        """
+        pass
+
+    def clip_rect(self, rect: tuple) -> Optional[tuple]:
+        """
+        Intersects a rectangle with the region of interest rectangle.
+        :param rect: (x, y, w, h) in full frame pixel coordinates.
+        :return: Intersection, or None if the rectangles do not overlap.
+        """
+        roi_x, roi_y, roi_w, roi_h = self.roi_rect
+        x = max(int(rect[0]), roi_x)
+        y = max(int(rect[1]), roi_y)
+        x_end = min(int(rect[0] + rect[2]), roi_x + roi_w)
+        y_end = min(int(rect[1] + rect[3]), roi_y + roi_h)
+        if x_end <= x or y_end <= y:
+            return None
+        return x, y, x_end - x, y_end - y
+
+    def get_mask(self, frame: np.ndarray, rect: Optional[tuple] = None) -> np.ndarray:
+        """
+        Returns the binary ball mask of the region of interest, or of a rectangle inside it.
+        :param frame: Full BGR camera frame.
+        :param rect: (x, y, w, h) inside the region of interest rectangle, the whole region of interest by default.
+        :return: Mask with the size of the rectangle.
+        """
+        x, y, w, h = self.roi_rect if rect is None else rect
+        # Slicing returns a view so no pixels are copied.
+        view = frame[y:y + h, x:x + w]
+        roi_x, roi_y, _, _ = self.roi_rect
+        roi_mask = self.roi_mask[y - roi_y:y - roi_y + h, x - roi_x:x - roi_x + w]
+
+        blurred = cv2.GaussianBlur(view, (5, 5), 0)
+
+        # Construct color mask, only keep the pixels inside the playing field, then erode and dilate to clean up
+        # extraneous contours
+        mask = self.segment(blurred)
+        mask = cv2.bitwise_and(mask, roi_mask)
+        mask = cv2.erode(mask, self.erode_kernel, iterations=1)
+        mask = cv2.dilate(mask, self.dilate_kernel, iterations=2)
+        return mask
+
+    def segment(self, blurred: np.ndarray) -> np.ndarray:
+        """
+        Classifies the pixels of a blurred BGR image as ball or background.
+        :param blurred: Blurred BGR image.
+        :return: Mask with 255 for ball pixels.
+        """
+        if self.color_lookup_table is not None:
+            return self.color_lookup_table.apply(blurred)
+        hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, self.hsv_ranges[0][0], self.hsv_ranges[0][1])
+        for lower, upper in self.hsv_ranges[1:]:
+            mask = cv2.bitwise_or(mask, cv2.inRange(hsv, lower, upper))
+        return mask
+
+    def detect(self, frame: np.ndarray, rect: Optional[tuple] = None) -> list:
+        """
+        Finds all ball contours in the playing field, or in a rectangle of the playing field.
+        :param frame: Full BGR camera frame.
+        :param rect: (x, y, w, h) in full frame pixel coordinates, the whole playing field by default.
+        :return: Contours in full frame pixel coordinates.
+        """
+        if rect is not None:
+            rect = self.clip_rect(rect)
+            if rect is None:
+                return []
+        if self.pyramid_levels:
+            return self.__detect_coarse_to_fine(frame, rect)
+        start_time = time.perf_counter()
+        cnts = self.__find_contours(frame, rect)
+        self._add_stage_time("full", time.perf_counter() - start_time)
+        return cnts
+
+    def __find_contours(self, frame: np.ndarray, rect: Optional[tuple]) -> list:
+        x, y, _, _ = self.roi_rect if rect is None else rect
+        mask = self.get_mask(frame, rect)
+        # The offset maps the contours from the cropped view back to full frame coordinates.
+        cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x, y))
+        return imutils.grab_contours(cnts)
+
+    def get_coarse_mask(self, frame: np.ndarray, rect: Optional[tuple] = None) -> np.ndarray:
+        """
+        Returns the binary ball mask of the region of interest at the resolution of the top pyramid level.
+        :param frame: Full BGR camera frame.
+        :param rect: (x, y, w, h) inside the region of interest rectangle, the whole region of interest by default.
+        :return: Mask with the size of the rectangle divided by 2 ** pyramid_levels.
+        """
+        x, y, w, h = self.roi_rect if rect is None else rect
+        roi_x, roi_y, _, _ = self.roi_rect
+        roi_mask = self.roi_mask[y - roi_y:y - roi_y + h, x - roi_x:x - roi_x + w]
+        small = frame[y:y + h, x:x + w]
+        # cv2.pyrDown blurs before downsampling so no extra blur is needed.
+        for _ in range(self.pyramid_levels):
+            small = cv2.pyrDown(small)
+        roi_mask = cv2.resize(roi_mask, (small.shape[1], small.shape[0]), interpolation=cv2.INTER_NEAREST)
+        mask = self.segment(small)
+        mask = cv2.bitwise_and(mask, roi_mask)
+        mask = cv2.erode(mask, self.erode_kernel, iterations=1)
+        mask = cv2.dilate(mask, self.dilate_kernel, iterations=1)
+        return mask
+
+    def __detect_coarse_to_fine(self, frame: np.ndarray, rect: Optional[tuple]) -> list:
+        """
+        Finds candidate blobs on a downscaled image, then finds the exact contours on small full resolution patches
+        around every candidate.
+        :param frame: Full BGR camera frame.
+        :param rect: (x, y, w, h) inside the region of interest rectangle, the whole region of interest by default.
+        :return: Contours in full frame pixel coordinates.
+        """
+        start_time = time.perf_counter()
+        x, y, _, _ = self.roi_rect if rect is None else rect
+        scale = 1 << self.pyramid_levels
+        mask = self.get_coarse_mask(frame, rect)
+        candidates = imutils.grab_contours(cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE))
+        refine_time = time.perf_counter()
+        self._add_stage_time("coarse", refine_time - start_time)
+
+        patches = []
+        for candidate in candidates:
+            c_x, c_y, c_w, c_h = cv2.boundingRect(candidate)
+            patch = self.clip_rect((x + c_x * scale - self.refine_padding, y + c_y * scale - self.refine_padding,
+                                    c_w * scale + 2 * self.refine_padding, c_h * scale + 2 * self.refine_padding))
+            if patch is not None:
+                patches.append(patch)
+
+        cnts = []
+        # Merge overlapping patches so that a blob is not found twice.
+        for patch in merge_overlapping_rects(patches):
+            cnts.extend(self.__find_contours(frame, patch))
+        self._add_stage_time("refine", time.perf_counter() - refine_time)
+        return cnts
+
+    def _add_stage_time(self, stage: str, seconds: float):
+        total, calls = self.stage_times.get(stage, (0, 0))
+        self.stage_times[stage] = (total + seconds, calls + 1)
+
+    def get_stage_timings(self) -> dict:
+        """
+        Returns the mean time of every detection stage since the last call and resets the timings.
+        :return: Stage name to mean time in ms.
+        """
+        timings = {stage: round(total / calls * 1000, 3) for stage, (total, calls) in self.stage_times.items()}
+        self.stage_times = {}
+        return timings
+
+
+def merge_overlapping_rects(rects: list) -> list:
+    """
+    Replaces overlapping rectangles by their bounding rectangle until no two rectangles overlap. A merged rectangle can
+    overlap rectangles that neither of its parts overlapped, so merging repeats until nothing changes.
+    :param rects: (x, y, w, h) rectangles.
+    :return: Rectangles that do not overlap each other.
+    """
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        for ii in range(len(rects)):
+            for jj in range(ii + 1, len(rects)):
+                rect, other = rects[ii], rects[jj]
+                if rect[0] < other[0] + other[2] and other[0] < rect[0] + rect[2] and \
+                        rect[1] < other[1] + other[3] and other[1] < rect[1] + rect[3]:
+                    x_start, y_start = min(rect[0], other[0]), min(rect[1], other[1])
+                    x_end = max(rect[0] + rect[2], other[0] + other[2])
+                    y_end = max(rect[1] + rect[3], other[1] + other[3])
+                    rects[ii] = (x_start, y_start, x_end - x_start, y_end - y_start)
+                    del rects[jj]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
@@ -1,37 +1,47 @@
-import os
 import time
+from math import sqrt
 from multiprocessing import Queue
 from typing import Optional, Tuple
 
 import numpy as np
 
 from camera.camera_measurements import CameraMeasurements
+from camera.kalman_filter import BallKalmanFilter
+from camera.prediction_parameters import PredictionParameters
+from camera.ring_buffer import RingBuffer
+from camera.tracking_settings import TrackingSettings
+from camera.trajectory_solver import solve_bounce_trajectory
+from camera.undistortion import PointUndistorter
 from other.events import CameraEvent
 
-BALL_POSITION_FILE = os.path.join(os.path.dirname(__file__), "data/ball_positions.txt")
-
 
 class BallPrediction:
     def __init__(self, x_pixels, y_pixels, rate, queue_from_camera: Queue, target_x_pixel, playing_field_top_left,
-                 ball_radius):
+                 ball_radius, settings: Optional[TrackingSettings] = None,
+                 parameters: Optional[PredictionParameters] = None,
+                 point_undistorter: Optional[PointUndistorter] = None):
         # Camera measurements
         self.camera_measurements = CameraMeasurements()
         # Total number of x pixels in the playing field.
         self.x_pixels = x_pixels
         # Total number of y pixels in the playing field.
         self.y_pixels = y_pixels
-        # Rate at which new ball positions are added. Should be 60fps.
+        # Rate at which new ball positions are added. Should be 60fps. Only used when the ball positions have no
+        # timestamps.
         self.rate = rate
-        # Damping factor. Rate at which the ball slows down.
-        self.damping = 0.85
-        # Threshold speed. Speed at which prediction of ball is no longer taking into account but rather the current
-        # ball position.
-        self.threshold = 70
-        # Restitution factor. Rate at which the ball bounces off the walls.
-        self.restitution = 0.75        # Buffer to store current ball pixels.
-        self.buffer = []
+        # Physics parameters of the trajectory: damping, threshold speed, restitution and time step. Shared with the
+        # batch predictor so that tuning and evaluation use the same values.
+        self.parameters = parameters if parameters is not None else PredictionParameters()
+        # Removes the lens distortion so that the ball moves on straight lines between straight walls. The ball
+        # positions, walls and goalie line are then kept in undistorted pixels, and the positions returned to the
+        # tracking loop are mapped back to the camera image.
+        self.point_undistorter = point_undistorter
+        # Number of frames kept of the ball positions and the predicted positions.
+        self.history_frames = 60
+        # Buffer to store current ball pixels, x, y and timestamp. The timestamp is NaN when it is not known.
+        self.buffer = RingBuffer(self.history_frames, 3)
         # Predicted ball pixels.
-        self.predicted_buffer = []
+        self.predicted_buffer = RingBuffer(self.history_frames, 1)
         # Queue used to send out
         self.queue_from_camera = queue_from_camera
         # X range threshold. Number of pixels apart from goalie for predicted path to be taken into account.
@@ -44,47 +54,110 @@ class BallPrediction:
 
         # Target x pixel position. Position of the goalie bar.
         self.target_x_pixel = target_x_pixel
+        # The walls and the goalie line are in undistorted pixels when the lens distortion is removed.
+        self.__undistort_playing_field()
         # Ball radius in pixels.
         self.ball_radius = ball_radius
-        # Time step in seconds.
-        self.time_step = 0.2
         self.predicted_path = None
+        settings = settings if settings is not None else TrackingSettings()
+        # Computes the trajectory in closed form or walks it in time steps.
+        self.solver = settings.prediction_solver
+        # Filters the position and velocity over all detections when enabled.
+        self.kalman_filter: Optional[BallKalmanFilter] = None
+        if settings.kalman_filter:
+            self.kalman_filter = BallKalmanFilter(self.playing_field_top, self.playing_field_bottom,
+                                                  self.parameters.restitution,
+                                                  self.parameters.y_restitution_factor, self.rate,
+                                                  settings.kalman_process_noise, settings.kalman_measurement_noise,
+                                                  settings.kalman_max_coast_frames)
+
+    def set_playing_field(self, x_pixels, y_pixels, target_x_pixel, playing_field_top_left):
+        """
+        Updates the playing field geometry, used when the calibration is updated.
+        :param x_pixels: Total number of x pixels in the playing field.
+        :param y_pixels: Total number of y pixels in the playing field.
+        :param target_x_pixel: Position of the goalie bar.
+        :param playing_field_top_left: Playing field top left pixel.
+        :return:
+        """
+        self.x_pixels = x_pixels
+        self.y_pixels = y_pixels
+        self.target_x_pixel = target_x_pixel
+        self.playing_field_top_left = playing_field_top_left
+        self.playing_field_top = self.playing_field_top_left[1]
+        self.playing_field_bottom = self.playing_field_top_left[1] + self.y_pixels
+        self.__undistort_playing_field()
+        if self.kalman_filter is not None:
+            self.kalman_filter.playing_field_top = self.playing_field_top
+            self.kalman_filter.playing_field_bottom = self.playing_field_bottom
 
-        if os.path.exists(BALL_POSITION_FILE):
-            os.remove(BALL_POSITION_FILE)
+    def add_new_empty(self, timestamp: Optional[float] = None):
+        """
+        Adds a frame in which the ball was not detected.
+        :param timestamp: Capture time of the frame in seconds.
+        :return:
+        """
+        self.buffer.append_empty()
+        if self.kalman_filter is not None:
+            self.kalman_filter.coast(timestamp)
 
-    def __convert_to_playing_field_pixel(self, x_pixel, y_pixel):
+    def add_new(self, x_pixel, y_pixel, timestamp: Optional[float] = None):
         """
-        Converts the pixel position of the ball to the pixel position of the ball relative to the playing field.
+        Adds a detected ball position.
         :param x_pixel:
         :param y_pixel:
+        :param timestamp: Capture time of the frame in seconds.
         :return:
         """
-        x_pixel = x_pixel - self.playing_field_top_left[0]
-        y_pixel = y_pixel - self.playing_field_top_left[1]
-        return x_pixel, y_pixel
+        if self.point_undistorter is not None:
+            x_pixel, y_pixel = self.point_undistorter.undistort_point(x_pixel, y_pixel)
+        self.buffer.append((x_pixel, y_pixel, np.nan if timestamp is None else timestamp))
+        if self.kalman_filter is not None:
+            self.kalman_filter.update(x_pixel, y_pixel, timestamp)
 
-    def ball_writer(self, x_pixel, y_pixel):
-        # Writes current ball position to file.
-        if x_pixel is None or y_pixel is None:
-            return
-        x_pixel, y_pixel = self.__convert_to_playing_field_pixel(x_pixel, y_pixel)
-        with open(BALL_POSITION_FILE, "w") as f:
-            f.write(f"{str(x_pixel)},{str(y_pixel)}\n")
-
-    def add_new_empty(self):
-        self.buffer.insert(0, None)
-        # Remove old ball positions.
-        if len(self.buffer) > 60:
-            self.buffer = self.buffer[:20]
-
-    def add_new(self, x_pixel, y_pixel):
-        self.buffer.insert(0, (x_pixel, y_pixel))
-        # Remove old ball positions.
-        if len(self.buffer) > 60:
-            self.buffer = self.buffer[:20]
-        # Write ball position to file
-        self.ball_writer(x_pixel, y_pixel)
+    def get_position(self, index: int) -> Optional[Tuple]:
+        """
+        Returns a ball position from the buffer.
+        :param index: 0 is the newest position.
+        :return: X pixel, Y pixel and timestamp or None, or None if the ball was not detected in that frame.
+        """
+        position = self.buffer[index]
+        if position is None:
+            return None
+        x_pixel, y_pixel, timestamp = position.tolist()
+        return x_pixel, y_pixel, None if np.isnan(timestamp) else timestamp
+
+    def get_extrapolated_position(self) -> Optional[Tuple]:
+        """
+        Extrapolates the ball position in the next frame from the last two ball positions.
+        :return: X pixel, Y pixel in the camera image and speed in pixels per frame, or None if the ball was not
+        detected last frame.
+        """
+        if not self.buffer or self.buffer[0] is None:
+            return None
+        curr_pos = self.get_position(0)
+        if len(self.buffer) < 2 or self.buffer[1] is None:
+            # No velocity is known so assume the ball is stationary.
+            return self.__to_camera_pixels(curr_pos[0], curr_pos[1]) + (0,)
+        prev_pos = self.get_position(1)
+        # Scale the change in position to one nominal frame, frames might have been skipped in between.
+        frames = self.get_time_delta(curr_pos, prev_pos) * self.rate
+        x_delta = (curr_pos[0] - prev_pos[0]) / frames
+        y_delta = (curr_pos[1] - prev_pos[1]) / frames
+        speed = sqrt(x_delta ** 2 + y_delta ** 2)
+        return self.__to_camera_pixels(curr_pos[0] + x_delta, curr_pos[1] + y_delta) + (speed,)
+
+    def get_time_delta(self, curr_pos: Tuple, prev_pos: Tuple) -> float:
+        """
+        Returns the time between two ball positions from their frame timestamps, or the nominal frame period if the
+        timestamps are missing.
+        :param curr_pos:
+        :param prev_pos:
+        :return: Time in seconds.
+        """
+        if curr_pos[2] is not None and prev_pos[2] is not None and curr_pos[2] > prev_pos[2]:
+            return curr_pos[2] - prev_pos[2]
+        return 1 / self.rate
 
     def _predict(self) -> Optional[Tuple]:
         """
@@ -94,8 +167,8 @@ class BallPrediction:
         self.predicted_path = None
         # If more than two points are in the buffer, predict the ball position.
         if len(self.buffer) >= 2:
-            curr_pos = self.buffer[0]
-            prev_pos = self.buffer[1]
+            curr_pos = self.get_position(0)
+            prev_pos = self.get_position(1)
 
             # If the current position is None, the ball was not detected during this frame.
             if curr_pos is None:
@@ -105,8 +178,18 @@ class BallPrediction:
             if curr_pos[0] > self.target_x_pixel:
                 return (curr_pos[1],)
 
+            if self.kalman_filter is not None:
+                # Use the filtered position and velocity instead of the last two detections.
+                state = self.kalman_filter.get_state()
+                if state is None:
+                    return (curr_pos[1],)
+                x_pixel, y_pixel, x_speed, y_speed = state
+                # The velocity is not trusted until it stands out from its uncertainty.
+                if self.kalman_filter.get_uncertainty()[1] * 2 > abs(x_speed):
+                    return (curr_pos[1],)
+                curr_pos = (x_pixel, y_pixel, curr_pos[2])
             # The ball was not detected during the previous frame. So move to the current position.
-            if prev_pos is None:
+            elif prev_pos is None:
                 return (curr_pos[1],)
 
             # If the ball is within the x range threshold, use the current ball position instead of predicting
@@ -115,106 +198,42 @@ class BallPrediction:
                 self.queue_from_camera.put_nowait((CameraEvent.QUICK_STRIKE, None))
                 return (curr_pos[1],)
 
-            # If change in position is less than the ball radius then ball is stationary and no change in position is
-            # needed.
-            if abs(curr_pos[0] - prev_pos[0]) < 2:
-                # print("Ball is stationary")
-                return None
-
-            # print("Curr pos: ", curr_pos)
-            # print("Prev pos: ", prev_pos)
-            # Calculate the speed of the ball.
-            x_speed = (curr_pos[0] - prev_pos[0]) / (1 / self.rate)
-            y_speed = (curr_pos[1] - prev_pos[1]) / (1 / self.rate)
+            if self.kalman_filter is not None:
+                # Same stationary threshold as for the detections, in pixels per nominal frame.
+                if abs(x_speed) / self.rate < 2:
+                    return None
+            else:
+                # If change in position is less than the ball radius then ball is stationary and no change in position
+                # is needed.
+                if abs(curr_pos[0] - prev_pos[0]) < 2:
+                    # print("Ball is stationary")
+                    return None
+
+                # print("Curr pos: ", curr_pos)
+                # print("Prev pos: ", prev_pos)
+                # Calculate the speed of the ball from the real time between the frames.
+                time_delta = self.get_time_delta(curr_pos, prev_pos)
+                x_speed = (curr_pos[0] - prev_pos[0]) / time_delta
+                y_speed = (curr_pos[1] - prev_pos[1]) / time_delta
 
             # If x speed is negative then ball is going the wrong way.
             if x_speed < 0:
                 return None
 
-            predicted_trajectory = []
-            x_pixel = curr_pos[0]
-            y_pixel = curr_pos[1]
-            predicted_trajectory.append((x_pixel, y_pixel))
-            iterations = 0
-            total_elapsed_time = 0
-            x_prime = x_pixel
-            y_prime = y_pixel
-            # If the speed is less than the threshold, use the current ball position instead of predicting trajectory.
-            while x_speed > self.threshold and x_prime != self.target_x_pixel:
-                iterations += 1
-                elapsed_time = 0
-                x_speed = x_speed * self.damping
-                y_speed = y_speed * self.damping
-                while elapsed_time != self.time_step:
-                    remaining_time = self.time_step - elapsed_time
-                    # Calculate the next position of the ball after the time step.
-                    x_prime = x_pixel + x_speed * remaining_time
-                    y_prime = y_pixel + y_speed * remaining_time
-
-                    # If the ball hits the top or bottom wall, bounce off the wall.
-                    if y_prime <= self.playing_field_top or y_prime >= self.playing_field_bottom:
-                        # Get the time step at which the ball hits the wall which is less than the default time step.
-                        if y_prime >= self.playing_field_bottom:
-                            # print("HIT BOTTOM WALL")
-                            time_step_prime = abs((y_pixel - self.playing_field_bottom) / y_speed)
-                            y_prime = self.playing_field_bottom - 1
-                        elif y_prime <= self.playing_field_top:
-                            # print("HIT TOP WALL")
-                            time_step_prime = abs((self.playing_field_top - y_pixel) / y_speed)
-                            y_prime = self.playing_field_top + 1
-                        else:
-                            raise ValueError("Ball is not hitting the top or bottom wall.")
-
-                        # Calculate the next position of the ball after the time step.
-                        x_prime = x_pixel + x_speed * time_step_prime
-
-                        # If x position is past the target position, then find time to reach target position.
-                        if x_prime >= self.target_x_pixel:
-                            time_step_prime = abs((self.target_x_pixel - x_pixel) / x_speed)
-                            y_prime = y_pixel + y_speed * time_step_prime
-                            x_prime = self.target_x_pixel
-                            predicted_trajectory.append((round(x_prime), round(y_prime)))
-                            elapsed_time += time_step_prime
-                            # print("BALL HIT TARGET", x_prime, y_prime, elapsed_time)
-                            # Break because the ball has reached the target position.
-                            break
-                        else:
-                            predicted_trajectory.append((round(x_prime), round(y_prime)))
-                            elapsed_time += time_step_prime
-                            # There is surely a more physics way of doing this but this works.
-                            # Update the Y speed of the ball after bouncing off the wall.
-                            # TODO test this. Multiplying by 1.3 because the ball bounces off the wall in a non linear
-                            # way.
-                            y_speed = -y_speed * self.restitution * 0.5
-                            # Update the X speed of the ball after bouncing off the wall.
-                            x_speed = x_speed * self.restitution
-                            # print("BALL HIT WALL AND DOES NOT HIT TARGET", x_prime, y_prime, elapsed_time)
-                    else:
-                        if x_prime >= self.target_x_pixel:
-                            time_step_prime = abs((self.target_x_pixel - x_pixel) / x_speed)
-                            y_prime = y_pixel + y_speed * time_step_prime
-                            x_prime = self.target_x_pixel
-                            predicted_trajectory.append((round(x_prime), round(y_prime)))
-                            elapsed_time += time_step_prime
-                            # print("BALL DOES NOT HIT WALL AND DOES HIT TARGET", x_prime, y_prime, elapsed_time)
-                            break
-                        else:
-                            predicted_trajectory.append((round(x_prime), round(y_prime)))
-                            elapsed_time += remaining_time
-                            # print("BALL DOES NOT HIT WALL AND DOES NOT HIT TARGET", x_prime, y_prime, elapsed_time)
-                    x_pixel = x_prime
-                    y_pixel = y_prime
-
-                total_elapsed_time += elapsed_time
-                # For X axis don't do bounce prediction assuming that it's going to hit a player or the goal before it
-                # hits the wall.
-
-                # Update the position of the ball for next iteration.
-                x_pixel = x_prime
-                y_pixel = y_prime
+            if self.solver == "ClosedForm":
+                solution = solve_bounce_trajectory(curr_pos[0], curr_pos[1], x_speed, y_speed, self.target_x_pixel,
+                                                   self.playing_field_top, self.playing_field_bottom, self.parameters)
+                if solution is None:
+                    return None
+                y_prime, total_elapsed_time, _, predicted_trajectory = solution
+            else:
+                solution = self._predict_iterative(curr_pos[0], curr_pos[1], x_speed, y_speed)
+                if solution is None:
+                    return None
+                y_prime, total_elapsed_time, predicted_trajectory = solution
 
-            # Elapsed time until ball was moving below the threshold or until it hit the target position.
-            if x_prime == self.target_x_pixel and total_elapsed_time < 0.6:
+            # Elapsed time until it hit the target position.
+            if total_elapsed_time < 0.6:
                 #if 0.15 < total_elapsed_time < 0.30:
                 #    self.queue_from_camera.put_nowait((CameraEvent.STRIKE, None))
                 if 0 < total_elapsed_time < 0.15 and abs(curr_pos[0] - self.target_x_pixel) < 800:
@@ -228,49 +247,173 @@ class BallPrediction:
         elif len(self.buffer) == 1:
             if self.buffer[0] is None:
                 return None
-            return (self.buffer[0][1],)
+            return (self.buffer[0][1].item(),)
         else:
             return None
 
-    def get_predicted(self, rate):
-        if rate > 40:
-            self.rate = rate
+    def _predict_iterative(self, x_pixel, y_pixel, x_speed, y_speed) -> Optional[Tuple]:
+        """
+        Walks the trajectory of the ball in time steps, bouncing it off the walls, until it reaches the target x pixel.
+        :return: Y pixel and time in seconds at which the ball reaches the target and the predicted trajectory, or None
+        if the ball slows down below the threshold before.
+        """
+        predicted_trajectory = []
+        # OpenCV only draws integer points, the positions from the buffer and the Kalman filter are floats.
+        predicted_trajectory.append((round(x_pixel), round(y_pixel)))
+        iterations = 0
+        total_elapsed_time = 0
+        x_prime = x_pixel
+        y_prime = y_pixel
+        # If the speed is less than the threshold, use the current ball position instead of predicting trajectory.
+        while x_speed > self.parameters.threshold and x_prime != self.target_x_pixel:
+            iterations += 1
+            elapsed_time = 0
+            x_speed = x_speed * self.parameters.damping
+            y_speed = y_speed * self.parameters.damping
+            while elapsed_time != self.parameters.time_step:
+                remaining_time = self.parameters.time_step - elapsed_time
+                # Calculate the next position of the ball after the time step.
+                x_prime = x_pixel + x_speed * remaining_time
+                y_prime = y_pixel + y_speed * remaining_time
+
+                # If the ball hits the top or bottom wall, bounce off the wall.
+                if y_prime <= self.playing_field_top or y_prime >= self.playing_field_bottom:
+                    # Get the time step at which the ball hits the wall which is less than the default time step.
+                    if y_prime >= self.playing_field_bottom:
+                        # print("HIT BOTTOM WALL")
+                        time_step_prime = abs((y_pixel - self.playing_field_bottom) / y_speed)
+                        y_prime = self.playing_field_bottom - 1
+                    elif y_prime <= self.playing_field_top:
+                        # print("HIT TOP WALL")
+                        time_step_prime = abs((self.playing_field_top - y_pixel) / y_speed)
+                        y_prime = self.playing_field_top + 1
+                    else:
+                        raise ValueError("Ball is not hitting the top or bottom wall.")
+
+                    # Calculate the next position of the ball after the time step.
+                    x_prime = x_pixel + x_speed * time_step_prime
+
+                    # If x position is past the target position, then find time to reach target position.
+                    if x_prime >= self.target_x_pixel:
+                        time_step_prime = abs((self.target_x_pixel - x_pixel) / x_speed)
+                        y_prime = y_pixel + y_speed * time_step_prime
+                        x_prime = self.target_x_pixel
+                        predicted_trajectory.append((round(x_prime), round(y_prime)))
+                        elapsed_time += time_step_prime
+                        # print("BALL HIT TARGET", x_prime, y_prime, elapsed_time)
+                        # Break because the ball has reached the target position.
+                        break
+                    else:
+                        predicted_trajectory.append((round(x_prime), round(y_prime)))
+                        elapsed_time += time_step_prime
+                        # There is surely a more physics way of doing this but this works.
+                        # Update the Y speed of the ball after bouncing off the wall.
+                        # TODO test this. Multiplying by 1.3 because the ball bounces off the wall in a non linear
+                        # way.
+                        y_speed = -y_speed * self.parameters.restitution * self.parameters.y_restitution_factor
+                        # Update the X speed of the ball after bouncing off the wall.
+                        x_speed = x_speed * self.parameters.restitution
+                        # print("BALL HIT WALL AND DOES NOT HIT TARGET", x_prime, y_prime, elapsed_time)
+                else:
+                    if x_prime >= self.target_x_pixel:
+                        time_step_prime = abs((self.target_x_pixel - x_pixel) / x_speed)
+                        y_prime = y_pixel + y_speed * time_step_prime
+                        x_prime = self.target_x_pixel
+                        predicted_trajectory.append((round(x_prime), round(y_prime)))
+                        elapsed_time += time_step_prime
+                        # print("BALL DOES NOT HIT WALL AND DOES HIT TARGET", x_prime, y_prime, elapsed_time)
+                        break
+                    else:
+                        predicted_trajectory.append((round(x_prime), round(y_prime)))
+                        elapsed_time += remaining_time
+                        # print("BALL DOES NOT HIT WALL AND DOES NOT HIT TARGET", x_prime, y_prime, elapsed_time)
+                x_pixel = x_prime
+                y_pixel = y_prime
+
+            total_elapsed_time += elapsed_time
+            # For X axis don't do bounce prediction assuming that it's going to hit a player or the goal before it
+            # hits the wall.
+
+            # Update the position of the ball for next iteration.
+            x_pixel = x_prime
+            y_pixel = y_prime
+
+        # Elapsed time until ball was moving below the threshold or until it hit the target position.
+        if x_prime == self.target_x_pixel:
+            return y_prime, total_elapsed_time, predicted_trajectory
+        return None
+
+    def get_predicted(self):
         out = self._predict()
         out_val = None
         if out is None:
             # Determine whether to send the current ball position.
-            ii = 1
-            curr_ball_pos = self.buffer[0]
+            curr_ball_pos = self.get_position(0)
             if curr_ball_pos is None:
                 return None
-            buffer_len = len(self.predicted_buffer)
-            tmp_out_val = None
             # Get last not None value sent to the motors.
-            while True:
-                if ii < 60 and buffer_len > ii:
-                    if self.predicted_buffer[ii] is not None:
-                        tmp_out_val = self.predicted_buffer[ii]
-                        break
-                else:
-                    break
-                ii += 1
+            values, valid = self.predicted_buffer.latest(self.history_frames)
+            sent = np.flatnonzero(valid[1:])
+            tmp_out_val = None if len(sent) == 0 else values[sent[0] + 1, 0]
 
             if tmp_out_val is None or abs(tmp_out_val - curr_ball_pos[1]) > self.ball_radius*2:
                 out_val = round(curr_ball_pos[1])
-                self.predicted_buffer.insert(0, out_val)
+                self.predicted_buffer.append((out_val,))
             else:
-                self.predicted_buffer.insert(0, None)
+                self.predicted_buffer.append_empty()
 
         else:
             out_val = round(out[0])
-            self.predicted_buffer.insert(0, out[0])
+            self.predicted_buffer.append((out[0],))
             if len(out) == 2:
                 self.predicted_path = out[1]
 
-        if len(self.predicted_buffer) > 100:
-            self.predicted_buffer = self.predicted_buffer[:50]
+        if out_val is not None and self.point_undistorter is not None:
+            # The goalie moves to the predicted position on the goalie line in the camera image.
+            out_val = self.__to_camera_pixels(self.target_x_pixel, out_val)[1]
         return out_val
 
-    def get_path(self) -> Optional[Tuple]:
-        return self.predicted_path
+    def get_path(self) -> Optional[list]:
+        """
+        :return: Points of the last predicted path in the camera image, or None if no trajectory was predicted.
+        """
+        if self.predicted_path is None or self.point_undistorter is None:
+            return self.predicted_path
+        path = self.point_undistorter.distort_points(np.array(self.predicted_path, dtype=np.float64))
+        return [(x_pixel, y_pixel) for x_pixel, y_pixel in np.round(path).astype(int).tolist()]
 
+    def get_uncertainty(self) -> Optional[Tuple[float, float]]:
+        """
+        Returns the uncertainty of the filtered ball state.
+        :return: Standard deviation of the position in pixels and of the speed in pixels per second, or None if the
+        Kalman filter is disabled or not tracking the ball.
+        """
+        if self.kalman_filter is None or self.kalman_filter.get_state() is None:
+            return None
+        return self.kalman_filter.get_uncertainty()
+
+    def __undistort_playing_field(self):
+        """
+        Moves the walls and the goalie line to undistorted pixels. The walls are averaged over both field corners and
+        the goalie line is measured at the vertical center of the field.
+        :return:
+        """
+        if self.point_undistorter is None:
+            return
+        left, top = self.playing_field_top_left
+        right = left + self.x_pixels
+        top_left, top_right, bottom_left, bottom_right, goalie = self.point_undistorter.undistort_points(np.array(
+            [(left, top), (right, top), (left, self.playing_field_bottom), (right, self.playing_field_bottom),
+             (self.target_x_pixel, (top + self.playing_field_bottom) / 2)], dtype=np.float64)).tolist()
+        self.playing_field_top = (top_left[1] + top_right[1]) / 2
+        self.playing_field_bottom = (bottom_left[1] + bottom_right[1]) / 2
+        self.target_x_pixel = goalie[0]
+
+    def __to_camera_pixels(self, x_pixel, y_pixel) -> Tuple[int, int]:
+        """
+        Maps a position of the prediction back to the camera image.
+        :return: Rounded x and y pixel in the camera image.
+        """
+        if self.point_undistorter is not None:
+            x_pixel, y_pixel = self.point_undistorter.distort_point(x_pixel, y_pixel)
+        return round(x_pixel), round(y_pixel)
@@ -0,0 +1,120 @@
+import secrets
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
+
+import numpy as np
+
+# Name of the shared memory block that the camera process publishes the latest ball state to.
+BALL_STATE_NAME = "foosball_ball_state"
+# Fields of the ball state. Positions are in pixels relative to the top left corner of the playing field and are NaN
+# when unknown.
+BALL_STATE_FIELDS = ("frame_number", "timestamp", "ball_x", "ball_y", "predicted_x", "predicted_y")
+# Header fields: sequence number and generation id.
+HEADER_FIELDS = 2
+
+
+class SharedBallState:
+    """
+    Single shared memory record holding the latest ball position, predicted position and frame number. The camera
+    process is the only writer. Readers never lock, they use the sequence number like a seqlock: it is odd while the
+    record is being written, and a read is only accepted if the sequence number is even and unchanged after copying
+    the record, so a reader can never see a half written record.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        # Only the owner unlinks the shared memory block.
+        self.owner = owner
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        self.sequence = header[0:1]
+        # Random id chosen when the record is created. A restarted camera process recreates the record under the same
+        # name, which readers that are still attached to the old record do not see, the id tells them apart.
+        self.generation_id = int(header[1])
+        self.values = np.ndarray((len(BALL_STATE_FIELDS),), dtype=np.float64, buffer=shm.buf, offset=header.nbytes)
+
+    @classmethod
+    def create(cls, name: str = BALL_STATE_NAME) -> "SharedBallState":
+        """
+        Allocates the record. Called by the camera process.
+        :param name: Name of the shared memory block.
+        :return:
+        """
+        size = (HEADER_FIELDS + len(BALL_STATE_FIELDS)) * 8
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a camera process that did not shut down cleanly.
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)[:] = (0, secrets.randbits(62))
+        state = cls(shm, owner=True)
+        state.sequence[0] = 0
+        state.values[:] = np.nan
+        return state
+
+    @classmethod
+    def attach(cls, name: str = BALL_STATE_NAME) -> "SharedBallState":
+        """
+        Attaches to the record created by the camera process.
+        :param name: Name of the shared memory block.
+        :return:
+        """
+        shm = shared_memory.SharedMemory(name=name)
+        # Attached blocks are registered with the resource tracker, which would unlink them when this process exits.
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    def publish(self, frame_number: int, timestamp: float, ball: Optional[tuple], predicted: Optional[tuple]):
+        """
+        Writes the latest state. The ball position is kept from the last frame it was detected in.
+        :param frame_number: Frame number of the camera.
+        :param timestamp: Capture time of the frame in seconds.
+        :param ball: Ball position (x, y), None if the ball was not detected this frame.
+        :param predicted: Predicted ball position (x, y), None if there is no prediction this frame.
+        :return:
+        """
+        # Odd sequence number while writing.
+        self.sequence[0] += 1
+        self.values[0] = frame_number
+        self.values[1] = timestamp
+        if ball is not None:
+            self.values[2:4] = ball
+        if predicted is not None:
+            self.values[4:6] = predicted
+        else:
+            self.values[4:6] = np.nan
+        self.sequence[0] += 1
+
+    def get_sequence(self) -> int:
+        """
+        Returns the sequence number, which grows with every published state.
+        :return:
+        """
+        return int(self.sequence[0])
+
+    def read(self, retries: int = 100) -> Optional[dict]:
+        """
+        Reads the latest state without locking.
+        :param retries: Number of attempts when the record is being written.
+        :return: Field name to value, or None if no consistent record could be read.
+        """
+        for _ in range(retries):
+            sequence = int(self.sequence[0])
+            if sequence % 2:
+                continue
+            values = self.values.copy()
+            if int(self.sequence[0]) == sequence:
+                if sequence == 0:
+                    # Nothing was published yet.
+                    return None
+                return dict(zip(BALL_STATE_FIELDS, values.tolist()))
+        return None
+
+    def close(self):
+        self.sequence = None
+        self.values = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,117 @@
+import os
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from camera.aruco import detect_markers
+
+# DATA FILES
+CALIBRATION_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/calibration_cache.npz")
+# Increased whenever the fields of the cache change, caches with another version are ignored.
+CALIBRATION_CACHE_VERSION = 2
+# Size (width, height) of the grayscale reference image used to check that the camera and table did not move.
+THUMBNAIL_SIZE = (96, 54)
+
+
+def make_thumbnail(frame: np.ndarray) -> np.ndarray:
+    """
+    Downscales a frame to a small grayscale image normalized to zero mean and unit variance, so that comparing two
+    thumbnails does not depend on the exposure of the camera.
+    :param frame: BGR frame.
+    :return:
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+    thumbnail -= thumbnail.mean()
+    thumbnail /= max(float(thumbnail.std()), 1e-6)
+    return thumbnail
+
+
+def detect_marker_corners(frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Detects the ArUco markers at full resolution.
+    :param frame: BGR frame.
+    :return: Ids of the detected markers, shape (markers,), and their corners, shape (markers, 4, 2).
+    """
+    corners, ids, _ = detect_markers(frame, require_all=False)
+    return ids.reshape(-1).astype(np.int32), np.array(corners, dtype=np.float32).reshape(-1, 4, 2)
+
+
+def save_calibration_cache(calibration: dict, path: str = CALIBRATION_CACHE_FILE):
+    """
+    Saves the calibration of the camera manager so that the next startup can skip the detection.
+    :param calibration: Dictionary with "corners", "goalie_x_pixel_position", "pixel_to_mm", "roi_rect", "roi_mask",
+    "crop_to_roi" and "frame".
+    :param path: Cache file.
+    :return:
+    """
+    frame = calibration["frame"]
+    marker_ids, marker_corners = detect_marker_corners(frame)
+    np.savez_compressed(path, version=CALIBRATION_CACHE_VERSION,
+                        corners=np.array(calibration["corners"], dtype=np.int32),
+                        goalie_x_pixel_position=calibration["goalie_x_pixel_position"],
+                        pixel_to_mm=np.array(calibration["pixel_to_mm"], dtype=np.float64),
+                        roi_rect=np.array(calibration["roi_rect"], dtype=np.int32),
+                        roi_mask=calibration["roi_mask"],
+                        crop_to_roi=calibration["crop_to_roi"],
+                        frame_shape=np.array(frame.shape),
+                        thumbnail=make_thumbnail(frame),
+                        marker_ids=marker_ids,
+                        marker_corners=marker_corners)
+
+
+def load_calibration_cache(path: str = CALIBRATION_CACHE_FILE) -> Optional[dict]:
+    """
+    Loads a calibration saved by save_calibration_cache.
+    :param path: Cache file.
+    :return: Calibration dictionary with the thumbnail instead of the frame, or None if there is no usable cache.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if int(data["version"]) != CALIBRATION_CACHE_VERSION:
+                return None
+            return {"corners": data["corners"],
+                    "goalie_x_pixel_position": int(data["goalie_x_pixel_position"]),
+                    "pixel_to_mm": tuple(float(value) for value in data["pixel_to_mm"]),
+                    "roi_rect": tuple(int(value) for value in data["roi_rect"]),
+                    "roi_mask": data["roi_mask"],
+                    "crop_to_roi": bool(data["crop_to_roi"]),
+                    "frame_shape": tuple(int(value) for value in data["frame_shape"]),
+                    "thumbnail": data["thumbnail"],
+                    "marker_ids": data["marker_ids"],
+                    "marker_corners": data["marker_corners"]}
+    except (OSError, KeyError, ValueError):
+        print("Failed to load the calibration cache, detecting the calibration.")
+        return None
+
+
+def is_calibration_valid(calibration: dict, frame: np.ndarray, min_correlation: float = 0.9,
+                         max_shift: float = 2.0) -> bool:
+    """
+    Checks that the cached calibration still matches the camera. A thumbnail correlation quickly rejects a different
+    scene, but a bump of a few pixels barely changes it, so the ArUco markers of the current frame are compared with
+    the cached ones at full resolution as well.
+    :param calibration: Calibration returned by load_calibration_cache.
+    :param frame: Current BGR frame.
+    :param min_correlation: Minimum normalized correlation, between -1 and 1, of the thumbnails.
+    :param max_shift: Maximum distance in pixels between a cached and a current marker corner.
+    :return:
+    """
+    if calibration["frame_shape"] != frame.shape:
+        return False
+    correlation = float(np.mean(calibration["thumbnail"] * make_thumbnail(frame)))
+    if correlation < min_correlation:
+        return False
+    marker_ids, marker_corners = detect_marker_corners(frame)
+    cached_ids = calibration["marker_ids"].tolist()
+    common = [(index, cached_ids.index(marker_id)) for index, marker_id in enumerate(marker_ids.tolist())
+              if marker_id in cached_ids]
+    # Without two markers to compare, e.g. when a hand covers them, a shift cannot be ruled out.
+    if len(common) < 2:
+        return False
+    current, cached = (np.array(indices) for indices in zip(*common))
+    shifts = np.linalg.norm(marker_corners[current] - calibration["marker_corners"][cached], axis=2)
+    return float(np.max(shifts)) <= max_shift
@@ -2,6 +2,7 @@ import json
 import multiprocessing
 import os
 import queue
+import threading
 import time
 from collections import deque
 from typing import Optional, Iterable, Literal
@@ -11,17 +12,28 @@ import cv2
 import imutils
 import numpy as np
 from camera.aruco import detect_markers, get_pixel_to_mm, draw_markers, pose_estimation
-import pyrealsense2 as rs
 
+from camera.background_detector import BackgroundSubtractionDetector
+from camera.ball_detector import BallDetector
+from camera.ball_state import SharedBallState
+from camera.candidate_scorer import CandidateScorer
+from camera.calibration_cache import load_calibration_cache, save_calibration_cache, is_calibration_valid
 from camera.camera_measurements import CameraMeasurements
+from camera.frame_grabber import FrameGrabber
+from camera.frame_journal import FrameJournal
+from camera.frame_renderer import FieldOverlay, FrameAnnotation, start_renderer_process
+from camera.frame_ring import SharedFrameRing
+from camera.recalibration_service import RecalibrationService
+from camera.search_window_tracker import SearchWindowTracker
+from camera.homography import FieldHomography
+from camera.frame_source import FrameSource, RealsenseFrameSource, CORNERS_FILE, GOALIE_X_POS_FILE, \
+    WARMUP_FRAMES, sort_field_corners
+from camera.tracking_settings import TrackingSettings
+from camera.undistortion import PointUndistorter
 from camera.video_writer import VideoWriter
 from other.events import CameraEvent
 from camera.ball_prediction import BallPrediction
 
-# DATA FILES
-CORNERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/corners.json")
-GOALIE_X_POS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/goalie_x_pos.json")
-
 
 class CameraManager:
     """
@@ -29,7 +41,8 @@ class CameraManager:
     """
 
     def __init__(self, stop_flag: multiprocessing.Event = None, queue_to_camera: multiprocessing.Queue = None,
-                 queue_from_camera: multiprocessing.Queue = None):
+                 queue_from_camera: multiprocessing.Queue = None, tracking_settings: TrackingSettings = None,
+                 frame_source: FrameSource = None):
         self.pixel_bottom_left_corner: Optional[tuple] = None
         self.pixel_top_left_corner: Optional[tuple] = None
         self.pixel_top_right_corner: Optional[tuple] = None
@@ -38,19 +51,75 @@ class CameraManager:
         self.pixel_to_mm_x, self.pixel_to_mm_y = (None, None)
         self.goalie_x_pixel_position = None
 
-        # Start the camera pipe
-        self.pipe: Optional[rs.pipeline] = None
         # Load camera measurements
         self.camera_measurements = CameraMeasurements()
-        # Start the Realsense camera pipe
-        self.__start_pipe()
+        self.tracking_settings = tracking_settings if tracking_settings is not None else TrackingSettings()
+        # Calibration saved by the previous run, checked against the first frame before it is used.
+        cached_calibration = None
+        if self.tracking_settings.calibration_cache:
+            cached_calibration = load_calibration_cache()
+        # Source of the frames, the Realsense camera unless a recording is replayed.
+        if frame_source is None:
+            # The cache is validated with a correlation that does not depend on exposure and with the ArUco markers,
+            # whose detection thresholds adaptively, so the camera does not have to finish adjusting to the lighting
+            # before the first frame is used.
+            warmup_frames = WARMUP_FRAMES
+            if cached_calibration is not None:
+                warmup_frames = self.tracking_settings.calibration_cache_warmup_frames
+            frame_source = RealsenseFrameSource(self.camera_measurements, warmup_frames)
+        self.frame_source: FrameSource = frame_source
+        self.frame_source.start()
         # Read an RGB frame from the camera
         self.rgb_frame = self.read_color_frame()
-        # Detect the field corners
-        self.__detect_field_corners()
-        self.__detect_goalie()
-        # Calculate the pixel to mm ratio
-        self.__calculate_pixel_to_mm()
+        # Precomputed region of interest of the ball detector, only known when the cache is used.
+        roi = None
+        # Use the saved calibration of the frame source if there is one, otherwise detect it.
+        calibration = self.frame_source.get_calibration()
+        if calibration is not None:
+            self.__set_field_corners(np.array(calibration["corners"]))
+            self.goalie_x_pixel_position = calibration["goalie_x_pixel_position"]
+            self.__calculate_pixel_to_mm()
+        elif cached_calibration is not None and is_calibration_valid(
+                cached_calibration, self.rgb_frame, self.tracking_settings.calibration_cache_min_correlation,
+                self.tracking_settings.calibration_cache_max_shift):
+            self.__set_field_corners(cached_calibration["corners"])
+            self.goalie_x_pixel_position = cached_calibration["goalie_x_pixel_position"]
+            self.pixel_to_mm_x, self.pixel_to_mm_y = cached_calibration["pixel_to_mm"]
+            if cached_calibration["crop_to_roi"] == self.tracking_settings.crop_to_roi:
+                roi = (cached_calibration["roi_rect"], cached_calibration["roi_mask"])
+        else:
+            if cached_calibration is not None:
+                print("Calibration cache does not match the camera image, detecting the calibration.")
+                # Finish the warmup that was skipped for the cache before detecting.
+                for _ in range(WARMUP_FRAMES - self.tracking_settings.calibration_cache_warmup_frames):
+                    self.rgb_frame = self.read_color_frame()
+            # Detect the field corners
+            self.__detect_field_corners()
+            self.__detect_goalie()
+            # Calculate the pixel to mm ratio
+            self.__calculate_pixel_to_mm()
+        # Corrects the lens distortion of positions before they are converted to mm. The intrinsics are read once.
+        self.point_undistorter: Optional[PointUndistorter] = None
+        if self.tracking_settings.undistort_points:
+            self.point_undistorter = PointUndistorter.from_intrinsics(self.get_intrinsics())
+            if self.point_undistorter is None and calibration is not None:
+                # Recordings do not have intrinsics, their calibration file stores the distortion of the camera.
+                self.point_undistorter = PointUndistorter.from_calibration(calibration)
+        # Maps undistorted pixels to playing field mm.
+        self.field_homography = self.__create_field_homography()
+        # The playing field does not move after calibration, so the region of interest is computed once.
+        roi_corners = np.array([self.pixel_bottom_left_corner, self.pixel_top_left_corner,
+                                self.pixel_top_right_corner, self.pixel_bottom_right_corner])
+        if self.tracking_settings.detector == "Background":
+            self.ball_detector: BallDetector = BackgroundSubtractionDetector(roi_corners, self.rgb_frame.shape,
+                                                                             self.tracking_settings, roi)
+        else:
+            self.ball_detector: BallDetector = BallDetector(roi_corners, self.rgb_frame.shape, self.tracking_settings,
+                                                            roi)
+        # Only calibrations of the camera are cached, not the saved calibrations of replayed recordings.
+        self.updates_calibration_cache = calibration is None and self.tracking_settings.calibration_cache
+        if self.updates_calibration_cache and roi is None and self.goalie_x_pixel_position is not None:
+            self.save_calibration_cache()
         self.stop_flag: multiprocessing.Event = stop_flag
         self.queue_to_camera: Optional[multiprocessing.Queue] = queue_to_camera
         self.queue_from_camera: Optional[multiprocessing.Queue] = queue_from_camera
@@ -58,8 +127,27 @@ class CameraManager:
         playing_fields_y_pixels = self.pixel_bottom_left_corner[1] - self.pixel_top_left_corner[1]
         self.ball_prediction = BallPrediction(playing_fields_x_pixels, playing_fields_y_pixels,
                                               self.camera_measurements.camera_fps, self.queue_from_camera,
-                                              self.goalie_x_pixel_position, self.pixel_top_left_corner, 15)
-        self.video_writer = VideoWriter()
+                                              self.goalie_x_pixel_position, self.pixel_top_left_corner, 15,
+                                              self.tracking_settings, point_undistorter=self.point_undistorter)
+        # Rates every contour so that frames with reflections or other red objects are not discarded.
+        self.candidate_scorer: Optional[CandidateScorer] = None
+        if self.tracking_settings.candidate_scoring:
+            self.candidate_scorer = CandidateScorer(self.ball_detector.hsv_ranges, self.tracking_settings)
+        # Only searches around the last ball position when enabled.
+        self.search_window_tracker: Optional[SearchWindowTracker] = None
+        if self.tracking_settings.search_window:
+            self.search_window_tracker = SearchWindowTracker(self.ball_detector, self.ball_prediction,
+                                                             self.tracking_settings)
+        # Shared memory ring the frames are published to, so that other processes can read them without copies.
+        self.frame_ring: Optional[SharedFrameRing] = None
+        if self.tracking_settings.publish_frames:
+            self.frame_ring = SharedFrameRing.create(self.rgb_frame.shape, self.tracking_settings.frame_ring_slots)
+        # Latest ball state shared with the web backend and other readers.
+        self.ball_state = SharedBallState.create()
+        self.video_writer: Optional[VideoWriter] = None
+        self.frame_journal: Optional[FrameJournal] = None
+        # Corrects the calibration with the ArUco markers while tracking.
+        self.recalibration_service: Optional[RecalibrationService] = None
 
     def draw_aruco_markers(self):
         # Draw the aruco markers
@@ -71,9 +159,12 @@ class CameraManager:
         while True:
             if self.stop_flag.is_set():
                 try:  # Try to close the pipe
-                    self.pipe.stop()
+                    self.frame_source.stop()
                 except:
                     pass
+                if self.frame_ring is not None:
+                    self.frame_ring.close()
+                self.ball_state.close()
                 return
             try:
                 data = self.queue_to_camera.get_nowait()
@@ -103,17 +194,6 @@ class CameraManager:
         higher_hsv = np.array((target_object_rgb[0] + 50, target_object_rgb[1] + 50, target_object_rgb[2] + 50))
         return lower_hsv, higher_hsv
 
-    def draw_predicted_path(self, frame, path):
-        if not path:
-            return
-        for ii, p in enumerate(path):
-            if ii == len(path) - 1:
-                cv2.putText(frame, f"Point {str(ii + 1)} {str(p)}", p, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
-                break
-            cv2.line(frame, p, path[ii + 1], (0, 0, 255), 2)
-            cv2.putText(frame, f"Point {str(ii + 1)} {str(p)}", p, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
-        cv2.circle(frame, (path[0][0], path[0][1]), 10, (0, 255, 255), -1)
-
     def start_ball_tracking(self, mode: Literal["Speed", "Display"] = "Speed"):
 
         if mode == "Speed":
@@ -121,109 +201,121 @@ class CameraManager:
         elif mode == "Display":
             mode = 2
 
-        # Define the lower and upper HSV boundaries of the foosball and initialize
-        # the list of center points
-        mask1_lower = (0, 167, 118)
-        mask1_upper = (10, 255, 255)
-        mask2_lower = (160, 142, 134)
-        mask2_upper = (255, 255, 255)
-
-
         # Initialize variables and loop to continuously get and process video
         fps = 0
         fps_time = time.time()
         # Detect aruco markers
         # self.corners, self.ids, self.rejected = (None, None, None)
-        old_path = None
+        # The playing field should be clear when tracking starts, so detectors that learn the background start over.
+        self.ball_detector.reset()
+        # Record on a background thread so that encoding does not slow down tracking.
+        if self.tracking_settings.record_video:
+            self.video_writer = VideoWriter(camera_fps=self.camera_measurements.camera_fps,
+                                            frame_width=self.rgb_frame.shape[1], frame_height=self.rgb_frame.shape[0],
+                                            queue_size=self.tracking_settings.video_queue_size,
+                                            drop_policy=self.tracking_settings.video_drop_policy,
+                                            keep_every_nth=self.tracking_settings.video_keep_every_nth)
+        # Record lossless frames for regression tests of the detector.
+        if self.tracking_settings.journal_path is not None:
+            self.frame_journal = FrameJournal.create(self.tracking_settings.journal_path,
+                                                     self.tracking_settings.journal_capacity, self.rgb_frame.shape)
+            self.save_calibration(self.tracking_settings.journal_path + ".calibration.json")
+        # Draw and display the frames in a separate process so that displaying does not slow down tracking.
+        renderer_process, queue_to_renderer = (None, None)
+        if mode == 2:
+            renderer_process, queue_to_renderer = self.__start_renderer()
+        if self.tracking_settings.recalibration_interval > 0:
+            self.recalibration_service = RecalibrationService(
+                [self.pixel_bottom_left_corner, self.pixel_top_left_corner, self.pixel_top_right_corner,
+                 self.pixel_bottom_right_corner], self.goalie_x_pixel_position, self.tracking_settings,
+                lambda corners: self.__create_field_homography(sort_field_corners(corners)))
+            self.recalibration_service.start()
+        # Capture frames on a separate thread so that the newest frame is always processed. Replays at max speed run in
+        # lockstep so that no frame is dropped.
+        frame_grabber = FrameGrabber(self.frame_source.read_with_timestamp, self.rgb_frame.shape,
+                                     lockstep=not self.frame_source.is_realtime())
+        frame_grabber.start()
+        frame = np.empty(self.rgb_frame.shape, dtype=np.uint8)
         # Calculate ratio of pixels to mm
         while True:
             if self.stop_flag.is_set():
-                self.video_writer.close()
+                self.__stop_ball_tracking(frame_grabber, renderer_process, queue_to_renderer)
                 return
             # Get the RealSense frame to be processed by OpenCV
             whole_loop_run_time = time.time()
             start_time = time.time()
-            frame = self.read_color_frame()
-            self.video_writer.add_frame(frame)
+            out = frame_grabber.read(frame)
+            if out is None:
+                # The frame source has no more frames.
+                self.__stop_ball_tracking(frame_grabber, renderer_process, queue_to_renderer)
+                return
+            # The frame number counts dropped frames too, so gaps in the journal show where frames were dropped.
+            timestamp, frame_number = out
+            if self.recalibration_service is not None:
+                # Corrected calibrations are applied between frames, so a frame is never processed with a mix of both.
+                calibration = self.recalibration_service.take_pending_calibration()
+                if calibration is not None:
+                    self.__apply_calibration(calibration, frame, queue_to_renderer)
+                self.recalibration_service.offer_frame(frame)
+            if self.video_writer is not None:
+                self.video_writer.add_frame(frame, timestamp)
+            journal_index = None
+            if self.frame_journal is not None:
+                journal_index = self.frame_journal.append(frame, timestamp, frame_number)
+            slot, sequence = (None, None)
+            if self.frame_ring is not None:
+                # Only the slot index is sent, readers take the frame from shared memory.
+                slot, sequence = self.frame_ring.write(frame)
+                self.queue_from_camera.put((CameraEvent.CURRENT_FRAME, {"name": self.frame_ring.shm.name,
+                                                                        "ring_id": self.frame_ring.ring_id,
+                                                                        "slot": slot, "sequence": sequence}))
             fps += 1
             start_time = time.time()
             if time.time() - fps_time > 1:
                 self.queue_from_camera.put((CameraEvent.FPS, fps))
+                self.queue_from_camera.put((CameraEvent.DROPPED_FRAMES, frame_grabber.get_dropped_frames()))
+                self.queue_from_camera.put((CameraEvent.DETECTION_TIMINGS, self.ball_detector.get_stage_timings()))
                 fps = 0
                 fps_time = time.time()
 
-            # Get the region of interest, and only look for contours there in order to minimize computing necessity
-            region_of_interest_mask = np.zeros(frame.shape, dtype=np.uint8)
-            roi_corners = np.array([self.pixel_bottom_left_corner, self.pixel_top_left_corner,
-                                    self.pixel_top_right_corner, self.pixel_bottom_right_corner])
-            cv2.fillPoly(region_of_interest_mask, [roi_corners], (255, 255, 255))
-            region_of_interest_frame = cv2.bitwise_and(frame, region_of_interest_mask)
-
-            # Resize and blur the frame, then convert to HSV
-            blurred = cv2.GaussianBlur(region_of_interest_frame, (5, 5), 0)
-            hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
-
-            # Construct color mask, then erode and dilate to clean up extraneous
-            # contours
-            mask1 = cv2.inRange(hsv, mask1_lower, mask1_upper)
-            mask2 = cv2.inRange(hsv, mask2_lower, mask2_upper)
-            mask = cv2.bitwise_or(mask1, mask2)
-            # cv2.imshow("region of interest", mask.copy())
-            kernel = np.ones((3, 3), np.uint8)
-            mask = cv2.erode(mask, kernel, iterations=1)
-            kernel = np.ones((5, 5), np.uint8)
-            mask = cv2.dilate(mask, kernel, iterations=2)
-
-            # Find all contours in the mask and initialize the center
-
-            cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            cnts = imutils.grab_contours(cnts)
-
-            if mode == 2:
-                cv2.line(frame, self.pixel_bottom_left_corner, self.pixel_top_left_corner, (0, 0, 255), 1)
-                cv2.putText(frame, "Bottom Left", self.pixel_bottom_left_corner, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255),
-                            1)
-                cv2.line(frame, self.pixel_top_left_corner, self.pixel_top_right_corner, (0, 0, 255), 1)
-                cv2.putText(frame, "Top Left", self.pixel_top_left_corner, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
-                cv2.line(frame, self.pixel_top_right_corner, self.pixel_bottom_right_corner, (0, 0, 255), 1)
-                cv2.putText(frame, "Top Right", self.pixel_top_right_corner, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
-                cv2.line(frame, self.pixel_bottom_right_corner, self.pixel_bottom_left_corner, (0, 0, 255), 1)
-                cv2.putText(frame, "Bottom Right", self.pixel_bottom_right_corner, cv2.FONT_HERSHEY_SIMPLEX, 0.5,
-                            (0, 0, 255), 1)
-
-                # Draw the goalie line
-                cv2.line(frame, (self.goalie_x_pixel_position, self.pixel_top_right_corner[1]),
-                         (self.goalie_x_pixel_position, self.pixel_bottom_right_corner[1]), (0, 0, 255), 2)
-
-                cv2.line(frame, (self.goalie_x_pixel_position - self.camera_measurements.strike_zone_pixels, self.pixel_top_right_corner[1]),(self.goalie_x_pixel_position - self.camera_measurements.strike_zone_pixels, self.pixel_bottom_right_corner[1]), (0, 0, 255), 2)
+            # Only look for contours in the region of interest in order to minimize computing necessity
+            if self.search_window_tracker is not None:
+                cnts = self.search_window_tracker.detect(frame)
+            else:
+                cnts = self.ball_detector.detect(frame)
+            self.ball_detector.finish_frame()
 
             # Initialize the best contour to none, then search for the best one
-            if len(cnts) == 1:
+            ball_center, ball_radius = (None, None)
+            best_contour, confidence = (None, 0.0)
+            if self.candidate_scorer is not None:
+                best_contour, ball_center, confidence = self.candidate_scorer.select(
+                    cnts, frame, self.ball_prediction.get_extrapolated_position())
+            elif len(cnts) == 1:
                 best_contour = cnts[0]
-                center, radius = cv2.minEnclosingCircle(best_contour)
-                center = tuple(map(int, center))
-                radius = int(radius)
-                cv2.circle(frame, center, radius, (0, 0, 255), 2)
                 M = cv2.moments(best_contour)
                 ball_center = (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
-                self.ball_prediction.add_new(ball_center[0], ball_center[1])
+                confidence = 1.0
+            if best_contour is not None:
+                self.ball_prediction.add_new(ball_center[0], ball_center[1], timestamp)
+                if journal_index is not None:
+                    self.frame_journal.set_ball_position(journal_index, ball_center[0], ball_center[1])
 
                 # Send the current ball position to the frontend.
                 self.queue_from_camera.put((CameraEvent.CURRENT_BALL_POS, {"pixel": (ball_center[0], ball_center[1]),
                                                                            "mm": self.convert_pixels_to_mm_playing_field(
-                                                                               ball_center[0], ball_center[1])}))
+                                                                               ball_center[0], ball_center[1]),
+                                                                           "confidence": round(confidence, 3)}))
                 if mode == 2:
-                    # Draw the y ball position on the goalie line.
-                    cv2.circle(frame, (self.goalie_x_pixel_position, ball_center[1]), 10, (255, 0, 0), -1)
-                    cv2.putText(frame, "Actual", (self.goalie_x_pixel_position, ball_center[1]), cv2.FONT_HERSHEY_SIMPLEX,
-                                0.5, (255, 0, 0), 1)
+                    _, radius = cv2.minEnclosingCircle(best_contour)
+                    ball_radius = int(radius)
             else:
-                self.ball_prediction.add_new_empty()
+                self.ball_prediction.add_new_empty(timestamp)
             opencv_time = round(time.time() - start_time, 4)
 
             # Predict the ball positions
             start_time = time.time()
-            pred = self.ball_prediction.get_predicted(fps)
+            pred = self.ball_prediction.get_predicted()
             time_for_prediction = 0
 
             if pred is not None:
@@ -232,80 +324,170 @@ class CameraManager:
                                                       "mm": self.convert_pixels_to_mm_playing_field(
                                                           self.goalie_x_pixel_position, pred)}))
                 time_for_prediction = round(time.time() - start_time, 4)
-                if mode == 2:
-                    cv2.circle(frame, (self.goalie_x_pixel_position, pred), 10, (0, 255, 0), -1)
-                    cv2.putText(frame, "Prediction", (self.goalie_x_pixel_position, pred), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
-                                (255, 0, 0), 1)
+
+            # Publish the state relative to the top left corner of the playing field.
+            self.ball_state.publish(
+                frame_number, timestamp,
+                None if ball_center is None else (ball_center[0] - self.pixel_top_left_corner[0],
+                                                  ball_center[1] - self.pixel_top_left_corner[1]),
+                None if pred is None else (self.goalie_x_pixel_position - self.pixel_top_left_corner[0],
+                                           pred - self.pixel_top_left_corner[1]))
 
             if time.time() - whole_loop_run_time > 0.021:
                 # print("Time for opencv", opencv_time)
                 pass
 
             if mode == 2:
-                path = self.ball_prediction.get_path()
-                if path:
-                  old_path = path
-                self.draw_predicted_path(frame, old_path)
-
-                 # Display the current frame
-                # self.queue_from_camera.put((CameraEvent.CURRENT_FRAME, frame))
-                cv2.imshow("Frame", frame)
-                key = cv2.waitKey(1) & 0xFF
+                # Hand the drawing over to the renderer, drop the frame if the renderer is behind.
+                try:
+                    queue_to_renderer.put_nowait(FrameAnnotation(slot, sequence, ball_center, ball_radius, pred,
+                                                                 self.ball_prediction.get_path()))
+                except queue.Full:
+                    pass
 
-    def __start_pipe(self):
+    def __start_renderer(self) -> tuple:
+        """
+        Starts the process that draws the overlay and displays the frames.
+        :return: Renderer process and the queue to send it frame annotations.
+        """
+        if self.frame_ring is None:
+            # The renderer reads the frames from the frame ring.
+            self.frame_ring = SharedFrameRing.create(self.rgb_frame.shape, self.tracking_settings.frame_ring_slots)
+        overlay = self.__get_field_overlay()
+        queue_to_renderer = multiprocessing.Queue(maxsize=4)
+        renderer_process = multiprocessing.Process(target=start_renderer_process,
+                                                   args=(queue_to_renderer, self.frame_ring.shm.name, overlay),
+                                                   daemon=True)
+        renderer_process.start()
+        return renderer_process, queue_to_renderer
+
+    def __get_field_overlay(self) -> FieldOverlay:
+        return FieldOverlay(tuple(map(int, self.pixel_bottom_left_corner)),
+                            tuple(map(int, self.pixel_top_left_corner)),
+                            tuple(map(int, self.pixel_top_right_corner)),
+                            tuple(map(int, self.pixel_bottom_right_corner)), int(self.goalie_x_pixel_position),
+                            self.camera_measurements.strike_zone_pixels)
+
+    def __apply_calibration(self, calibration: dict, frame: np.ndarray,
+                            queue_to_renderer: Optional[multiprocessing.Queue]):
         """
-        Starts realsense pipeline and returns it. When a pipe is started, it takes a few frames to for the camera to adjust
-        to lighting conditions. Wait until 40 frames have been captured before returning the pipe.
+        Switches the detector, the prediction and the renderer to a corrected calibration.
+        :param calibration: Dictionary with "corners", "goalie_x_pixel_position" and "field_homography".
+        :param frame: Current BGR frame, which matches the corrected calibration.
+        :param queue_to_renderer: Queue of the renderer process, None if nothing is displayed.
         :return:
         """
-        config = rs.config()
-        config.enable_stream(rs.stream.color, self.camera_measurements.camera_resolution_x,
-                             self.camera_measurements.camera_resolution_y, rs.format.bgr8,
-                             self.camera_measurements.camera_fps)
-        pipe = rs.pipeline()
-        pipe.start(config)
-        total_frames = 0
-        while True:
-            frames = pipe.wait_for_frames()
-            color_frame = frames.get_color_frame()
-            if not color_frame:
-                continue
-            if total_frames < 60:
-                total_frames += 1
-                continue
-            else:
-                break
-        self.pipe = pipe
+        self.__set_field_corners(calibration["corners"])
+        self.goalie_x_pixel_position = calibration["goalie_x_pixel_position"]
+        self.__calculate_pixel_to_mm()
+        # Built by the recalibration thread, its lookup grid takes longer than a frame to compute.
+        field_homography = calibration.get("field_homography")
+        self.field_homography = field_homography if field_homography is not None else self.__create_field_homography()
+        self.ball_detector.set_region_of_interest(np.array([self.pixel_bottom_left_corner, self.pixel_top_left_corner,
+                                                            self.pixel_top_right_corner,
+                                                            self.pixel_bottom_right_corner]))
+        self.ball_prediction.set_playing_field(self.pixel_top_right_corner[0] - self.pixel_top_left_corner[0],
+                                               self.pixel_bottom_left_corner[1] - self.pixel_top_left_corner[1],
+                                               self.goalie_x_pixel_position, self.pixel_top_left_corner)
+        if self.updates_calibration_cache:
+            # Otherwise the next startup would load the calibration from before the table or camera moved. Saved on a
+            # thread because compressing the cache takes longer than a frame, the frame buffer is reused.
+            threading.Thread(target=self.save_calibration_cache, args=(frame.copy(),)).start()
+        if queue_to_renderer is not None:
+            try:
+                # Unlike a frame annotation the overlay is not replaced by the next message, so wait for room.
+                queue_to_renderer.put(self.__get_field_overlay(), timeout=0.1)
+            except queue.Full:
+                pass
+
+    def __stop_ball_tracking(self, frame_grabber: FrameGrabber, renderer_process: Optional[multiprocessing.Process],
+                             queue_to_renderer: Optional[multiprocessing.Queue]):
+        frame_grabber.stop()
+        if self.recalibration_service is not None:
+            self.recalibration_service.stop()
+            self.recalibration_service = None
+        if self.video_writer is not None:
+            self.video_writer.close()
+            self.video_writer = None
+        if self.frame_journal is not None:
+            self.frame_journal.close()
+            self.frame_journal = None
+        if renderer_process is not None:
+            try:
+                queue_to_renderer.put(None, timeout=1)
+            except queue.Full:
+                pass
+            renderer_process.join(timeout=1)
+            if renderer_process.is_alive():
+                renderer_process.terminate()
 
-    def read_color_frame(self) -> np.ndarray:
+    def read_color_frame(self) -> Optional[np.ndarray]:
         """
         Wait until color frame is available and return it.
-        :param pipe:
-        :return:
+        :return: BGR frame, or None when the frame source has no more frames.
         """
-        while True:
-            frames = self.pipe.wait_for_frames()
-            color_frame = frames.get_color_frame()
-            if not color_frame:
-                continue
-            else:
-                return np.asanyarray(color_frame.get_data())
+        return self.frame_source.read()
 
     def get_intrinsics(self):
-        return self.pipe.get_active_profile().get_stream(rs.stream.color).as_video_stream_profile().get_intrinsics()
+        return self.frame_source.get_intrinsics()
+
+    def save_calibration(self, path: str):
+        """
+        Saves the field corners, goalie position and lens distortion so that a recording can be replayed with
+        ReplayFrameSource.
+        :param path: Calibration file, <recording>.calibration.json by default for replays.
+        :return:
+        """
+        corners = [self.pixel_bottom_left_corner, self.pixel_top_left_corner, self.pixel_top_right_corner,
+                   self.pixel_bottom_right_corner]
+        calibration = {"corners": [[int(corner[0]), int(corner[1])] for corner in corners],
+                       "goalie_x_pixel_position": int(self.goalie_x_pixel_position)}
+        if self.point_undistorter is not None:
+            calibration["undistortion"] = self.point_undistorter.to_calibration()
+        with open(path, "w") as f:
+            json.dump(calibration, f)
+
+    def save_calibration_cache(self, frame: Optional[np.ndarray] = None):
+        """
+        Saves the calibration, the region of interest and a reference image of the current frame to the calibration
+        cache, which the next startup uses instead of detecting the calibration.
+        :param frame: BGR frame that matches the calibration, the first frame by default.
+        :return:
+        """
+        save_calibration_cache({"corners": [self.pixel_bottom_left_corner, self.pixel_top_left_corner,
+                                            self.pixel_top_right_corner, self.pixel_bottom_right_corner],
+                                "goalie_x_pixel_position": self.goalie_x_pixel_position,
+                                "pixel_to_mm": (self.pixel_to_mm_x, self.pixel_to_mm_y),
+                                "roi_rect": self.ball_detector.roi_rect,
+                                "roi_mask": self.ball_detector.roi_mask,
+                                "crop_to_roi": self.tracking_settings.crop_to_roi,
+                                "frame": self.rgb_frame if frame is None else frame})
 
     def pose_estimation(self):
         pose_estimation(self.ids, self.corners, self.get_intrinsics(), self.rgb_frame)
 
     def convert_pixels_to_mm_playing_field(self, x_pixel, y_pixel):
+        if self.point_undistorter is not None:
+            x_pixel, y_pixel = self.point_undistorter.undistort_point(x_pixel, y_pixel)
+        x_mm, y_mm = self.field_homography.pixel_to_mm(x_pixel, y_pixel)
         # TODO motors should not take these in the wrong order
-        x_mm = round((self.camera_measurements.camera_resolution_x - x_pixel - (
-                self.camera_measurements.camera_resolution_x - self.pixel_bottom_right_corner[0])) / self.pixel_to_mm_x,
-                     2)
-        y_mm = round((self.camera_measurements.camera_resolution_y - y_pixel - (
-                self.camera_measurements.camera_resolution_y - self.pixel_bottom_right_corner[1])) / self.pixel_to_mm_y,
-                     2)
-        return y_mm, x_mm
+        return round(y_mm, 2), round(x_mm, 2)
+
+    def __create_field_homography(self, corners: Optional[Iterable] = None) -> FieldHomography:
+        """
+        Creates the homography from undistorted pixels to playing field mm.
+        :param corners: Bottom left, top left, top right and bottom right field corners, the current ones by default.
+        :return:
+        """
+        frame_shape = self.rgb_frame.shape if self.tracking_settings.homography_lookup_grid else None
+        if corners is None:
+            corners = [self.pixel_bottom_left_corner, self.pixel_top_left_corner, self.pixel_top_right_corner,
+                       self.pixel_bottom_right_corner]
+        corners = np.array(corners, dtype=np.float64)
+        if self.point_undistorter is not None:
+            corners = self.point_undistorter.undistort_points(corners)
+        return FieldHomography.from_field_corners(*corners, camera_measurements=self.camera_measurements,
+                                                  frame_shape=frame_shape)
 
     def __detect_goalie(self):
         frame = self.read_color_frame()
@@ -392,29 +574,7 @@ class CameraManager:
         # Purple
         cv2.circle(frame, box[3], 10, (221, 160, 221), -1)
 
-        # Label the different box vertices.
-
-        # Sort based on y coordinate
-        box = sorted(box, key=lambda x: x[1])
-
-        # Upper values
-        top_vertices = box[:2]
-        bottom_vertices = box[2:]
-
-        # Sort based on x coordinate.
-        if top_vertices[0][0] > top_vertices[1][0]:
-            self.pixel_top_left_corner = top_vertices[1]
-            self.pixel_top_right_corner = top_vertices[0]
-        else:
-            self.pixel_top_left_corner = top_vertices[0]
-            self.pixel_top_right_corner = top_vertices[1]
-
-        if bottom_vertices[0][0] > bottom_vertices[1][0]:
-            self.pixel_bottom_left_corner = bottom_vertices[1]
-            self.pixel_bottom_right_corner = bottom_vertices[0]
-        else:
-            self.pixel_bottom_left_corner = bottom_vertices[0]
-            self.pixel_bottom_right_corner = bottom_vertices[1]
+        self.__set_field_corners(box)
 
         # Draw the contours on the original image
         # cv2.drawContours(frame, [box], -1, (0, 255, 0), 3)
@@ -424,6 +584,15 @@ class CameraManager:
         #cv2.waitKey(0)
         #cv2.destroyAllWindows()
 
+    def __set_field_corners(self, box: np.ndarray):
+        """
+        Labels the four vertices of the playing field box.
+        :param box: Four corners of the playing field in any order.
+        :return:
+        """
+        (self.pixel_bottom_left_corner, self.pixel_top_left_corner, self.pixel_top_right_corner,
+         self.pixel_bottom_right_corner) = sort_field_corners(box)
+
     def __calculate_pixel_to_mm(self):
         self.pixel_to_mm_x = (self.pixel_bottom_right_corner[0] - self.pixel_bottom_left_corner[
             0]) / self.camera_measurements.mm_playing_field_x
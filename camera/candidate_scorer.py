@@ -0,0 +1,86 @@
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from camera.tracking_settings import TrackingSettings
+
+
+class CandidateScorer:
+    """
+    Picks the ball out of several contours instead of discarding frames with more than one. Every contour is rated on
+    its area, its circularity, its distance from the extrapolated ball position and how close its color is to the ball
+    color. The ratings are computed for all contours at once and multiplied into a confidence between 0 and 1. A single
+    contour is always accepted like without scoring, the confidence only decides between several contours.
+    """
+
+    def __init__(self, hsv_ranges: list, settings: Optional[TrackingSettings] = None):
+        """
+        :param hsv_ranges: (lower, upper) HSV ranges of the ball color.
+        :param settings: Tracking settings.
+        """
+        self.settings = settings if settings is not None else TrackingSettings()
+        # Lower and upper bounds of the ball color ranges, shape (ranges, 3).
+        self.hsv_lower = np.array([lower for lower, _ in hsv_ranges], dtype=np.float32)
+        self.hsv_upper = np.array([upper for _, upper in hsv_ranges], dtype=np.float32)
+        # Most likely ball area, the geometric center of the accepted area range.
+        self.expected_area = np.sqrt(self.settings.ball_min_area * self.settings.ball_max_area)
+        # Standard deviation of the log area ratio, the accepted area range lies within two of them.
+        self.area_sigma = max(np.log(self.settings.ball_max_area / self.expected_area) / 2, 1e-6)
+        # Distance in pixels from the extrapolated position at which the distance rating drops to 0.6 when the ball
+        # is not moving, grows with the ball speed like the search window.
+        self.distance_scale = self.settings.search_window_min_size
+        # Summed HSV distance outside the ball color ranges at which the color rating drops to 0.6.
+        self.color_scale = 30
+        # Offsets of the pixels around the centroid that are averaged for the color rating.
+        offsets = np.arange(-1, 2)
+        self.patch_y, self.patch_x = (offset.ravel() for offset in np.meshgrid(offsets, offsets, indexing="ij"))
+
+    def select(self, cnts: List[np.ndarray], frame: np.ndarray,
+               extrapolated_position: Optional[Tuple] = None) -> Tuple[Optional[np.ndarray], Optional[tuple], float]:
+        """
+        Rates the contours and returns the best one.
+        :param cnts: Contours in full frame pixel coordinates.
+        :param frame: BGR frame the contours were found in.
+        :param extrapolated_position: (x, y, speed) returned by BallPrediction.get_extrapolated_position, or None.
+        :return: Best contour, its centroid and its confidence. None if there are several contours and none of them
+        reaches the minimum confidence.
+        """
+        if len(cnts) == 0:
+            return None, None, 0.0
+        moments = [cv2.moments(contour) for contour in cnts]
+        areas = np.array([moment["m00"] for moment in moments])
+        valid = areas > 0
+        if not np.any(valid):
+            return None, None, 0.0
+        safe_areas = np.where(valid, areas, 1)
+        centers_x = np.array([moment["m10"] for moment in moments]) / safe_areas
+        centers_y = np.array([moment["m01"] for moment in moments]) / safe_areas
+        perimeters = np.array([cv2.arcLength(contour, True) for contour in cnts])
+
+        area_scores = np.exp(-0.5 * (np.log(safe_areas / self.expected_area) / self.area_sigma) ** 2)
+        circularities = np.clip(4 * np.pi * areas / np.maximum(perimeters, 1e-6) ** 2, 0, 1)
+        scores = area_scores * circularities * self.__color_scores(frame, centers_x, centers_y)
+        if extrapolated_position is not None:
+            x, y, speed = extrapolated_position
+            scale = self.distance_scale + speed * self.settings.search_window_speed_factor
+            distances = np.hypot(centers_x - x, centers_y - y)
+            scores = scores * np.exp(-0.5 * (distances / scale) ** 2)
+        scores = np.where(valid, scores, 0)
+
+        best = int(np.argmax(scores))
+        confidence = float(scores[best])
+        if np.count_nonzero(valid) > 1 and confidence < self.settings.candidate_min_confidence:
+            return None, None, confidence
+        return cnts[best], (int(centers_x[best]), int(centers_y[best])), confidence
+
+    def __color_scores(self, frame: np.ndarray, centers_x: np.ndarray, centers_y: np.ndarray) -> np.ndarray:
+        # Average a small patch around every centroid and convert all of them to HSV in one call.
+        xs = np.clip(centers_x.astype(int)[:, None] + self.patch_x, 0, frame.shape[1] - 1)
+        ys = np.clip(centers_y.astype(int)[:, None] + self.patch_y, 0, frame.shape[0] - 1)
+        colors = frame[ys, xs].mean(axis=1).astype(np.uint8).reshape(-1, 1, 3)
+        hsv = cv2.cvtColor(colors, cv2.COLOR_BGR2HSV).reshape(-1, 1, 3).astype(np.float32)
+        # Distance outside of every range, 0 inside it, and the closest range per candidate.
+        outside = np.maximum(self.hsv_lower - hsv, 0) + np.maximum(hsv - self.hsv_upper, 0)
+        distances = outside.sum(axis=2).min(axis=1)
+        return np.exp(-0.5 * (distances / self.color_scale) ** 2)
@@ -0,0 +1,64 @@
+import sys
+
+import cv2
+import numpy as np
+
+
+class ColorLookupTable:
+    """
+    Compiles HSV color ranges into a quantized BGR lookup table, so that a frame can be segmented with a single table
+    lookup per pixel instead of an HSV conversion followed by one inRange call per range.
+    """
+
+    def __init__(self, hsv_ranges: list, bits: int = 6):
+        if not 1 <= bits <= 8:
+            raise ValueError(f"Lookup table bits must be between 1 and 8, got {bits}.")
+        if sys.byteorder != "little":
+            raise ValueError("Color lookup table requires a little endian machine.")
+        # HSV (lower, upper) ranges that are classified as the ball.
+        self.hsv_ranges = hsv_ranges
+        # Number of bits kept from every color channel.
+        self.bits = bits
+        self.shift = 8 - bits
+        # Maps every channel value to its quantization bin.
+        self.quantization_table = (np.arange(256) >> self.shift).astype(np.uint8)
+        self.table = self.__compile()
+
+    def __compile(self) -> np.ndarray:
+        """
+        Builds the table. Every quantized BGR color is converted to HSV once and classified with the HSV ranges.
+        The table is indexed by the quantized channels packed as b | g << 8 | r << 16, the same layout a BGRA pixel
+        has when it is read as a little endian uint32.
+        :return:
+        """
+        levels = 1 << self.bits
+        # Use the center of every quantization bin as its color.
+        bin_centers = ((np.arange(levels) << self.shift) + ((1 << self.shift) >> 1)).astype(np.uint8)
+        b, g, r = np.meshgrid(bin_centers, bin_centers, bin_centers, indexing="ij")
+        bgr = np.stack((b.ravel(), g.ravel(), r.ravel()), axis=-1).reshape((1, -1, 3))
+        hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+
+        mask = np.zeros(levels ** 3, dtype=np.uint8)
+        for lower, upper in self.hsv_ranges:
+            mask |= cv2.inRange(hsv, lower, upper).ravel()
+
+        indices = np.arange(levels, dtype=np.uint32)
+        b_index, g_index, r_index = np.meshgrid(indices, indices << 8, indices << 16, indexing="ij")
+        table = np.zeros(((levels - 1) << 16) + ((levels - 1) << 8) + levels, dtype=np.uint8)
+        table[(b_index | g_index | r_index).ravel()] = mask
+        return table
+
+    def apply(self, bgr: np.ndarray) -> np.ndarray:
+        """
+        Classifies every pixel of a BGR image.
+        :param bgr: BGR image.
+        :return: Mask with 255 where the pixel color is in one of the HSV ranges, 0 elsewhere.
+        """
+        if self.shift:
+            bgr = cv2.LUT(bgr, self.quantization_table)
+        # Adding the alpha channel gives every pixel four bytes, which can be read as a single uint32 index.
+        bgra = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA)
+        indices = bgra.view(np.uint32).reshape(bgra.shape[:2])
+        # Remove the alpha byte.
+        np.bitwise_and(indices, 0x00FFFFFF, out=indices)
+        return np.take(self.table, indices)
@@ -0,0 +1,112 @@
+import threading
+import time
+from typing import Optional, Tuple
+
+import cv2
+
+from camera.frame_ring import FRAME_RING_NAME, SharedFrameRing
+
+
+class FrameBroadcaster:
+    """
+    Reads the newest frames from the shared frame ring of the camera process, scales them down and encodes them to JPEG
+    once, on a background thread. The same encoded buffer is handed to every connected client. Clients always wait for
+    the newest frame, so a slow client skips frames instead of queueing them, and the camera process does not do any
+    work beyond publishing the frame to the ring.
+    """
+
+    def __init__(self, width: int = 640, fps: float = 15, quality: int = 80, ring_name: str = FRAME_RING_NAME):
+        """
+        :param width: Width of the encoded frames, the height follows from the aspect ratio of the camera frames.
+        :param fps: Maximum number of frames encoded per second.
+        :param quality: JPEG quality, 0 - 100.
+        :param ring_name: Name of the shared frame ring.
+        """
+        self.width = width
+        self.fps = fps
+        self.quality = quality
+        self.ring_name = ring_name
+        # Sequence number and JPEG data of the latest encoded frame, guarded by the condition.
+        self.sequence = 0
+        self.jpeg: Optional[bytes] = None
+        self.condition = threading.Condition()
+        # Number of connected clients, frames are only encoded while at least one client is connected.
+        self.clients = 0
+        self.thread: Optional[threading.Thread] = None
+
+    def add_client(self):
+        with self.condition:
+            self.clients += 1
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.__run, daemon=True)
+                self.thread.start()
+
+    def remove_client(self):
+        with self.condition:
+            self.clients -= 1
+
+    def wait_for_frame(self, last_sequence: int, timeout: float = 1.0) -> Tuple[int, Optional[bytes]]:
+        """
+        Blocks until a frame newer than last_sequence is encoded.
+        :param last_sequence: Sequence number of the last frame the client received.
+        :param timeout: Maximum time to wait in seconds.
+        :return: Sequence number and JPEG data of the newest frame, None if no newer frame was encoded in time.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.sequence > last_sequence, timeout):
+                return last_sequence, None
+            return self.sequence, self.jpeg
+
+    def __run(self):
+        ring: Optional[SharedFrameRing] = None
+        last_ring_sequence = 0
+        last_frame_time = time.monotonic()
+        while True:
+            with self.condition:
+                if self.clients <= 0:
+                    self.thread = None
+                    break
+            start = time.monotonic()
+            if ring is None:
+                try:
+                    ring = SharedFrameRing.attach(self.ring_name)
+                except FileNotFoundError:
+                    # The camera process is not publishing frames.
+                    time.sleep(1)
+                    continue
+                last_ring_sequence = 0
+                last_frame_time = start
+
+            ring_sequence, frame = ring.read_latest()
+            if frame is not None and ring_sequence != last_ring_sequence:
+                jpeg = self.__encode(frame)
+                # Discard the frame if the camera process overwrote the slot while it was being encoded.
+                if jpeg is not None and ring.is_valid(ring_sequence % ring.slots, ring_sequence):
+                    last_ring_sequence = ring_sequence
+                    last_frame_time = start
+                    with self.condition:
+                        self.sequence += 1
+                        self.jpeg = jpeg
+                        self.condition.notify_all()
+            elif start - last_frame_time > 1:
+                # No new frame for a while, the camera process may have restarted and recreated the ring.
+                # The view of the frame has to be dropped before the ring can be closed.
+                frame = None
+                ring.close()
+                ring = None
+                continue
+
+            frame = None
+            time.sleep(max(0.0, 1 / self.fps - (time.monotonic() - start)))
+
+        if ring is not None:
+            ring.close()
+
+    def __encode(self, frame) -> Optional[bytes]:
+        height, width = frame.shape[:2]
+        if self.width < width:
+            frame = cv2.resize(frame, (self.width, round(height * self.width / width)), interpolation=cv2.INTER_AREA)
+        success, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not success:
+            return None
+        return jpeg.tobytes()
@@ -0,0 +1,102 @@
+import threading
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+
+class FrameGrabber:
+    """
+    Pulls frames from the camera on its own thread into a preallocated double buffer so that the tracking loop always
+    processes the newest frame instead of a stale one. In lockstep mode no frame is dropped, the capture thread waits
+    until the tracking loop read the previous frame, so that replays process the same frames on every run.
+    """
+
+    def __init__(self, read_frame: Callable[[], Optional[Tuple[np.ndarray, float]]], frame_shape: tuple,
+                 lockstep: bool = False):
+        # Blocking function that returns the next camera frame and its timestamp.
+        self.read_frame = read_frame
+        # Hands every frame to the tracking loop instead of only the newest one.
+        self.lockstep = lockstep
+        # Double buffer. The capture thread writes into the back buffer and then swaps it with the front buffer.
+        self.buffers = [np.empty(frame_shape, dtype=np.uint8), np.empty(frame_shape, dtype=np.uint8)]
+        # Timestamps in seconds of the frames in the buffers.
+        self.timestamps = [0.0, 0.0]
+        self.front = 0
+        # Number of frames captured since the grabber was started.
+        self.frame_number = 0
+        # Frame number of the last frame handed to the tracking loop.
+        self.last_read_frame_number = 0
+        # Frames that were captured but overwritten before the tracking loop read them.
+        self.dropped_frames = 0
+        # Exception raised by the capture thread, re-raised in the tracking loop.
+        self.error: Optional[Exception] = None
+        # Set when the frame source has no more frames.
+        self.finished = False
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.__capture_loop, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=1)
+
+    def __capture_loop(self):
+        try:
+            while not self.stop_event.is_set():
+                out = self.read_frame()
+                if out is None:
+                    with self.condition:
+                        self.finished = True
+                        self.condition.notify()
+                    return
+                frame, timestamp = out
+                if self.lockstep:
+                    with self.condition:
+                        while self.frame_number != self.last_read_frame_number and not self.stop_event.is_set():
+                            self.condition.wait(timeout=0.1)
+                back = 1 - self.front
+                # The tracking loop only copies the front buffer, so the back buffer can be written without the lock.
+                np.copyto(self.buffers[back], frame)
+                self.timestamps[back] = timestamp
+                with self.condition:
+                    self.front = back
+                    self.frame_number += 1
+                    self.condition.notify()
+        except Exception as e:
+            with self.condition:
+                self.error = e
+                self.condition.notify()
+
+    def read(self, out: np.ndarray) -> Optional[Tuple[float, int]]:
+        """
+        Waits until a frame newer than the last one read is available and copies it into out.
+        :param out: Preallocated array owned by the caller.
+        :return: Timestamp of the frame in seconds and its number counted from the start of the frame source, or None
+        when the frame source has no more frames.
+        """
+        with self.condition:
+            while self.frame_number == self.last_read_frame_number:
+                if self.error is not None:
+                    raise self.error
+                if self.finished:
+                    return None
+                self.condition.wait(timeout=1)
+            np.copyto(out, self.buffers[self.front])
+            self.dropped_frames += self.frame_number - self.last_read_frame_number - 1
+            self.last_read_frame_number = self.frame_number
+            # Wakes the capture thread in lockstep mode.
+            self.condition.notify()
+            return self.timestamps[self.front], self.frame_number
+
+    def get_dropped_frames(self) -> int:
+        """
+        Returns the number of dropped frames since the last call and resets the counter.
+        :return:
+        """
+        with self.condition:
+            dropped_frames = self.dropped_frames
+            self.dropped_frames = 0
+        return dropped_frames
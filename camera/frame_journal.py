@@ -0,0 +1,143 @@
+from typing import Optional
+
+import numpy as np
+
+# Identifies frame journal files.
+JOURNAL_MAGIC = b"FOOSJRNL"
+JOURNAL_VERSION = 1
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", np.uint32), ("capacity", np.uint32), ("height", np.uint32),
+                         ("width", np.uint32), ("channels", np.uint32), ("count", np.uint64), ("reserved", "S28")])
+# One index record per frame. The ball position is NaN when the ball was not detected.
+INDEX_DTYPE = np.dtype([("frame_number", np.int64), ("timestamp", np.float64), ("ball_x", np.float32),
+                        ("ball_y", np.float32)])
+# Frames start on a page boundary.
+PAGE_SIZE = 4096
+
+
+class FrameJournal:
+    """
+    Lossless recording of raw BGR frames. Frames are appended to a preallocated memory mapped file together with a
+    fixed size index holding the frame number, capture timestamp and detected ball position of every frame, so any
+    frame can be accessed in O(1) without decoding the rest of the file.
+    """
+
+    def __init__(self, path: str, mode: str):
+        self.path = path
+        header = np.memmap(path, dtype=HEADER_DTYPE, mode=mode, shape=(1,))
+        self.__load(header, mode)
+
+    def __load(self, header: np.memmap, mode: str):
+        if header["magic"][0] != JOURNAL_MAGIC:
+            raise ValueError(f"{self.path} is not a frame journal.")
+        if header["version"][0] != JOURNAL_VERSION:
+            raise ValueError(f"Unsupported frame journal version {header['version'][0]}.")
+        self.header = header
+        self.capacity = int(header["capacity"][0])
+        self.frame_shape = (int(header["height"][0]), int(header["width"][0]), int(header["channels"][0]))
+        index_offset = HEADER_DTYPE.itemsize
+        self.index = np.memmap(self.path, dtype=INDEX_DTYPE, mode=mode, offset=index_offset, shape=(self.capacity,))
+        frames_offset = get_frames_offset(self.capacity)
+        self.frames = np.memmap(self.path, dtype=np.uint8, mode=mode, offset=frames_offset,
+                                shape=(self.capacity,) + self.frame_shape)
+
+    @classmethod
+    def create(cls, path: str, capacity: int, frame_shape: tuple) -> "FrameJournal":
+        """
+        Creates a journal file with room for capacity frames.
+        :param path: Path of the journal file.
+        :param capacity: Maximum number of frames.
+        :param frame_shape: Shape of the frames, (height, width, channels).
+        :return:
+        """
+        size = get_frames_offset(capacity) + capacity * int(np.prod(frame_shape))
+        # Allocate the whole file up front so that appending never has to grow it.
+        np.memmap(path, dtype=np.uint8, mode="w+", shape=(size,)).flush()
+        header = np.memmap(path, dtype=HEADER_DTYPE, mode="r+", shape=(1,))
+        header[0] = (JOURNAL_MAGIC, JOURNAL_VERSION, capacity) + tuple(frame_shape) + (0, b"")
+        journal = cls.__new__(cls)
+        journal.path = path
+        journal.__load(header, "r+")
+        return journal
+
+    @classmethod
+    def open(cls, path: str, mode: str = "r") -> "FrameJournal":
+        """
+        Opens an existing journal.
+        :param path: Path of the journal file.
+        :param mode: "r" to read, "r+" to keep appending.
+        :return:
+        """
+        return cls(path, mode)
+
+    def __len__(self) -> int:
+        return int(self.header["count"][0])
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        """
+        Returns a frame without reading the rest of the file.
+        :param index: Position of the frame in the journal.
+        :return: View of the frame.
+        """
+        if not 0 <= index < len(self):
+            raise IndexError(f"Frame {index} is not in the journal.")
+        return self.frames[index]
+
+    def get_record(self, index: int) -> np.void:
+        """
+        Returns the frame number, timestamp and ball position of a frame.
+        :param index: Position of the frame in the journal.
+        :return:
+        """
+        if not 0 <= index < len(self):
+            raise IndexError(f"Frame {index} is not in the journal.")
+        return self.index[index]
+
+    def get_records(self) -> np.ndarray:
+        """
+        Returns the index records of all frames in the journal.
+        :return:
+        """
+        return self.index[:len(self)]
+
+    def append(self, frame: np.ndarray, timestamp: float, frame_number: Optional[int] = None) -> Optional[int]:
+        """
+        Appends a frame to the journal.
+        :param frame: BGR frame with the shape of the journal.
+        :param timestamp: Capture time of the frame in seconds.
+        :param frame_number: Frame number of the camera, the position in the journal by default.
+        :return: Position of the frame, or None if the journal is full.
+        """
+        index = len(self)
+        if index >= self.capacity:
+            return None
+        np.copyto(self.frames[index], frame)
+        self.index[index] = (index if frame_number is None else frame_number, timestamp, np.nan, np.nan)
+        # Only count the frame once it is written so that readers never see a partial frame.
+        self.header["count"][0] = index + 1
+        return index
+
+    def set_ball_position(self, index: int, x_pixel: float, y_pixel: float):
+        self.index["ball_x"][index] = x_pixel
+        self.index["ball_y"][index] = y_pixel
+
+    def flush(self):
+        self.frames.flush()
+        self.index.flush()
+        self.header.flush()
+
+    def close(self):
+        if self.header.mode != "r":
+            self.flush()
+        self.frames = None
+        self.index = None
+        self.header = None
+
+
+def get_frames_offset(capacity: int) -> int:
+    """
+    Returns the offset of the first frame in a journal file.
+    :param capacity: Maximum number of frames in the journal.
+    :return:
+    """
+    index_end = HEADER_DTYPE.itemsize + capacity * INDEX_DTYPE.itemsize
+    return (index_end + PAGE_SIZE - 1) // PAGE_SIZE * PAGE_SIZE
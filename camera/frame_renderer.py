@@ -0,0 +1,137 @@
+import multiprocessing
+import queue
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from camera.frame_ring import SharedFrameRing
+
+
+class FieldOverlay(NamedTuple):
+    """Static part of the overlay, only changes when the camera is recalibrated."""
+    bottom_left: tuple
+    top_left: tuple
+    top_right: tuple
+    bottom_right: tuple
+    goalie_x_pixel_position: int
+    strike_zone_pixels: int
+
+
+class FrameAnnotation(NamedTuple):
+    """Per frame record of what the tracking loop found, drawn over the frame in the frame ring slot."""
+    slot: int
+    sequence: int
+    # Center and radius of the ball contour, None if the ball was not detected.
+    ball_center: Optional[tuple]
+    ball_radius: Optional[int]
+    # Predicted y pixel position of the ball on the goalie line.
+    predicted_y: Optional[int]
+    # Predicted trajectory of the ball.
+    path: Optional[list]
+
+
+def draw_predicted_path(frame, path):
+    if not path:
+        return
+    for ii, p in enumerate(path):
+        if ii == len(path) - 1:
+            cv2.putText(frame, f"Point {str(ii + 1)} {str(p)}", p, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+            break
+        cv2.line(frame, p, path[ii + 1], (0, 0, 255), 2)
+        cv2.putText(frame, f"Point {str(ii + 1)} {str(p)}", p, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+    cv2.circle(frame, (path[0][0], path[0][1]), 10, (0, 255, 255), -1)
+
+
+def draw_field_overlay(frame, overlay: FieldOverlay):
+    cv2.line(frame, overlay.bottom_left, overlay.top_left, (0, 0, 255), 1)
+    cv2.putText(frame, "Bottom Left", overlay.bottom_left, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    cv2.line(frame, overlay.top_left, overlay.top_right, (0, 0, 255), 1)
+    cv2.putText(frame, "Top Left", overlay.top_left, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    cv2.line(frame, overlay.top_right, overlay.bottom_right, (0, 0, 255), 1)
+    cv2.putText(frame, "Top Right", overlay.top_right, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    cv2.line(frame, overlay.bottom_right, overlay.bottom_left, (0, 0, 255), 1)
+    cv2.putText(frame, "Bottom Right", overlay.bottom_right, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+
+    # Draw the goalie line
+    cv2.line(frame, (overlay.goalie_x_pixel_position, overlay.top_right[1]),
+             (overlay.goalie_x_pixel_position, overlay.bottom_right[1]), (0, 0, 255), 2)
+    # Draw the strike zone line
+    strike_zone_x = overlay.goalie_x_pixel_position - overlay.strike_zone_pixels
+    cv2.line(frame, (strike_zone_x, overlay.top_right[1]), (strike_zone_x, overlay.bottom_right[1]), (0, 0, 255), 2)
+
+
+class FrameRenderer:
+    """
+    Draws the tracking overlay and displays the frames in its own process, so that drawing and cv2.imshow do not add
+    latency to the tracking loop. The tracking loop sends a FrameAnnotation per frame and the renderer takes the frame
+    itself from the shared memory frame ring.
+    """
+
+    def __init__(self, queue_to_renderer: multiprocessing.Queue, ring_name: str, overlay: FieldOverlay):
+        self.queue_to_renderer = queue_to_renderer
+        self.frame_ring = SharedFrameRing.attach(ring_name)
+        self.overlay = overlay
+        # The frame is copied before drawing so that other readers of the ring see the frame without overlay.
+        self.frame = np.empty(self.frame_ring.frame_shape, dtype=np.uint8)
+        # Last predicted path, kept on screen until a new one is predicted.
+        self.old_path = None
+
+    def event_loop(self):
+        while True:
+            message = self.queue_to_renderer.get()
+            annotation = None
+            # Skip to the newest annotation if the renderer fell behind.
+            while True:
+                if message is None:
+                    # Ball tracking stopped.
+                    self.frame_ring.close()
+                    cv2.destroyAllWindows()
+                    return
+                if isinstance(message, FieldOverlay):
+                    self.overlay = message
+                else:
+                    annotation = message
+                try:
+                    message = self.queue_to_renderer.get_nowait()
+                except queue.Empty:
+                    break
+            if annotation is not None:
+                self.render(annotation)
+
+    def render(self, annotation: FrameAnnotation):
+        frame = self.frame_ring.read(annotation.slot, annotation.sequence)
+        if frame is None:
+            return
+        np.copyto(self.frame, frame)
+        if not self.frame_ring.is_valid(annotation.slot, annotation.sequence):
+            # Overwritten by the camera process while copying.
+            return
+        frame = self.frame
+        overlay = self.overlay
+        draw_field_overlay(frame, overlay)
+
+        if annotation.ball_center is not None:
+            cv2.circle(frame, annotation.ball_center, annotation.ball_radius, (0, 0, 255), 2)
+            # Draw the y ball position on the goalie line.
+            cv2.circle(frame, (overlay.goalie_x_pixel_position, annotation.ball_center[1]), 10, (255, 0, 0), -1)
+            cv2.putText(frame, "Actual", (overlay.goalie_x_pixel_position, annotation.ball_center[1]),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
+
+        if annotation.predicted_y is not None:
+            cv2.circle(frame, (overlay.goalie_x_pixel_position, annotation.predicted_y), 10, (0, 255, 0), -1)
+            cv2.putText(frame, "Prediction", (overlay.goalie_x_pixel_position, annotation.predicted_y),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
+
+        if annotation.path:
+            self.old_path = annotation.path
+        draw_predicted_path(frame, self.old_path)
+
+        # Display the current frame
+        cv2.imshow("Frame", frame)
+        cv2.waitKey(1)
+
+
+def start_renderer_process(queue_to_renderer: multiprocessing.Queue, ring_name: str, overlay: FieldOverlay):
+    renderer = FrameRenderer(queue_to_renderer, ring_name, overlay)
+    renderer.event_loop()
@@ -0,0 +1,122 @@
+import secrets
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Name of the shared memory block that the camera process publishes its frames to.
+FRAME_RING_NAME = "foosball_frame_ring"
+# Header fields: number of slots, frame height, frame width, frame channels, ring id and sequence number of the latest
+# frame.
+HEADER_FIELDS = 6
+
+
+class SharedFrameRing:
+    """
+    Ring of preallocated frame slots in shared memory, used to hand frames from the camera process to other processes
+    without pickling them through a queue. The camera process writes a frame into the next slot and only sends the
+    slot index and sequence number. Readers access the slot without copying and check the sequence number afterwards
+    to detect whether the producer overwrote the slot while it was being read. The producer never waits for readers.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        # Only the owner unlinks the shared memory block.
+        self.owner = owner
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        self.slots, height, width, channels = (int(value) for value in header[:4])
+        self.frame_shape = (height, width, channels)
+        # Random id chosen when the ring is created. A restarted camera process recreates the ring under the same name
+        # and starts counting the sequence numbers from 1 again, the id tells readers that they hold the old ring.
+        self.ring_id = int(header[4])
+        # Sequence number of the latest frame written to the ring.
+        self.latest_sequence = header[5:6]
+        # Sequence number of the frame stored in every slot, 0 while the slot is being written.
+        self.slot_sequences = np.ndarray((self.slots,), dtype=np.int64, buffer=shm.buf, offset=header.nbytes)
+        self.frames = np.ndarray((self.slots,) + self.frame_shape, dtype=np.uint8, buffer=shm.buf,
+                                 offset=header.nbytes + self.slot_sequences.nbytes)
+
+    @classmethod
+    def create(cls, frame_shape: tuple, slots: int = 4, name: str = FRAME_RING_NAME) -> "SharedFrameRing":
+        """
+        Allocates the ring. Called by the process that writes the frames.
+        :param frame_shape: Shape of the frames, (height, width, channels).
+        :param slots: Number of frames kept in the ring.
+        :param name: Name of the shared memory block.
+        :return:
+        """
+        size = (HEADER_FIELDS + slots) * np.dtype(np.int64).itemsize + slots * int(np.prod(frame_shape))
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a camera process that did not shut down cleanly.
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = (slots,) + tuple(frame_shape) + (secrets.randbits(62), 0)
+        ring = cls(shm, owner=True)
+        ring.slot_sequences[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name: str = FRAME_RING_NAME) -> "SharedFrameRing":
+        """
+        Attaches to a ring created by another process.
+        :param name: Name of the shared memory block.
+        :return:
+        """
+        shm = shared_memory.SharedMemory(name=name)
+        # Attached blocks are registered with the resource tracker, which would unlink them when this process exits.
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    def write(self, frame: np.ndarray) -> Tuple[int, int]:
+        """
+        Copies a frame into the next slot.
+        :param frame: BGR frame with the shape of the ring.
+        :return: Slot index and sequence number of the frame.
+        """
+        sequence = int(self.latest_sequence[0]) + 1
+        slot = sequence % self.slots
+        # Mark the slot as being written so that readers of the old frame discard it.
+        self.slot_sequences[slot] = 0
+        np.copyto(self.frames[slot], frame)
+        self.slot_sequences[slot] = sequence
+        self.latest_sequence[0] = sequence
+        return slot, sequence
+
+    def read(self, slot: int, sequence: int) -> Optional[np.ndarray]:
+        """
+        Returns the frame in a slot without copying it. Call is_valid after using the frame to make sure it was not
+        overwritten in the meantime.
+        :param slot: Slot index sent by the producer.
+        :param sequence: Sequence number sent by the producer.
+        :return: View of the frame, or None if the slot already holds a newer frame.
+        """
+        if not self.is_valid(slot, sequence):
+            return None
+        return self.frames[slot]
+
+    def read_latest(self) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Returns the latest frame without copying it.
+        :return: Sequence number and view of the frame, or None if no frame was written yet.
+        """
+        sequence = int(self.latest_sequence[0])
+        if sequence == 0:
+            return sequence, None
+        return sequence, self.read(sequence % self.slots, sequence)
+
+    def is_valid(self, slot: int, sequence: int) -> bool:
+        return int(self.slot_sequences[slot]) == sequence
+
+    def close(self):
+        # Drop the views before closing, the shared memory block can not be closed while they exist.
+        self.latest_sequence = None
+        self.slot_sequences = None
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
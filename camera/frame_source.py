@@ -0,0 +1,280 @@
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Optional, Literal, Tuple
+
+import cv2
+import numpy as np
+
+from camera.camera_measurements import CameraMeasurements
+from camera.frame_journal import FrameJournal
+from camera.video_writer import load_timestamps
+
+try:
+    import pyrealsense2 as rs
+except ImportError:
+    # Allows replaying recordings on machines without the RealSense SDK.
+    rs = None
+
+# DATA FILES
+CORNERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/corners.json")
+GOALIE_X_POS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/goalie_x_pos.json")
+# Number of frames the camera needs to adjust to the lighting conditions after it is started.
+WARMUP_FRAMES = 60
+
+
+def sort_field_corners(box) -> Tuple[tuple, tuple, tuple, tuple]:
+    """
+    Labels the four vertices of the playing field box.
+    :param box: Four corners of the playing field in any order.
+    :return: Bottom left, top left, top right and bottom right corners.
+    """
+    # Sort based on y coordinate
+    box = sorted(box, key=lambda x: x[1])
+
+    # Upper values
+    top_vertices = box[:2]
+    bottom_vertices = box[2:]
+
+    # Sort based on x coordinate.
+    top_left, top_right = sorted(top_vertices, key=lambda x: x[0])
+    bottom_left, bottom_right = sorted(bottom_vertices, key=lambda x: x[0])
+    return bottom_left, top_left, top_right, bottom_right
+
+
+def load_calibration(calibration_file: Optional[str] = None) -> dict:
+    """
+    Loads a calibration saved by CameraManager.save_calibration. Falls back on the last saved corner and goalie values.
+    :param calibration_file: Calibration file, e.g. <recording>.calibration.json. None to use the saved values.
+    :return: Dictionary with "corners" and "goalie_x_pixel_position".
+    """
+    if calibration_file is not None and os.path.exists(calibration_file):
+        with open(calibration_file, "r") as f:
+            return json.load(f)
+    with open(CORNERS_FILE, "r") as f:
+        corners = json.load(f)
+    with open(GOALIE_X_POS_FILE, "r") as f:
+        goalie_x_pixel_position = json.load(f)["goalie_x_pixel_position"]
+    return {"corners": corners, "goalie_x_pixel_position": goalie_x_pixel_position}
+
+
+class FrameSource(ABC):
+    """
+    Interface for everything that produces BGR frames for the tracking loop.
+    """
+
+    @abstractmethod
+    def start(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def read(self) -> Optional[np.ndarray]:
+        """
+        Blocks until the next frame is available and returns it.
+        :return: BGR frame, or None when the source has no more frames.
+        """
+        raise NotImplementedError
+
+    def read_with_timestamp(self) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        Blocks until the next frame is available and returns it with its capture time.
+        :return: BGR frame and capture time in seconds, or None when the source has no more frames.
+        """
+        frame = self.read()
+        if frame is None:
+            return None
+        return frame, time.monotonic()
+
+    @abstractmethod
+    def stop(self):
+        raise NotImplementedError
+
+    def get_intrinsics(self):
+        """
+        Returns the camera intrinsics, or None if they are not known.
+        :return:
+        """
+        return None
+
+    def is_realtime(self) -> bool:
+        """
+        Returns whether frames arrive at their own pace like from a camera, so that frames the tracking loop is too
+        slow for have to be dropped. Otherwise every frame is processed.
+        :return:
+        """
+        return True
+
+    def get_calibration(self) -> Optional[dict]:
+        """
+        Returns saved calibration that should be used instead of live corner and goalie detection.
+        :return: Dictionary with "corners" and "goalie_x_pixel_position", or None to run live detection.
+        """
+        return None
+
+
+class RealsenseFrameSource(FrameSource):
+    """
+    Reads color frames from the Intel RealSense D435.
+    """
+
+    def __init__(self, camera_measurements: Optional[CameraMeasurements] = None, warmup_frames: int = WARMUP_FRAMES):
+        if rs is None:
+            raise ImportError("pyrealsense2 is required to read frames from the RealSense camera.")
+        self.camera_measurements = camera_measurements if camera_measurements is not None else CameraMeasurements()
+        # Number of frames to discard while the camera adjusts to the lighting conditions.
+        self.warmup_frames = warmup_frames
+        self.pipe: Optional[rs.pipeline] = None
+
+    def start(self):
+        """
+        Starts realsense pipeline. When a pipe is started, it takes a few frames to for the camera to adjust
+        to lighting conditions. Wait until the warmup frames have been captured before returning.
+        :return:
+        """
+        config = rs.config()
+        config.enable_stream(rs.stream.color, self.camera_measurements.camera_resolution_x,
+                             self.camera_measurements.camera_resolution_y, rs.format.bgr8,
+                             self.camera_measurements.camera_fps)
+        pipe = rs.pipeline()
+        pipe.start(config)
+        total_frames = 0
+        while True:
+            frames = pipe.wait_for_frames()
+            color_frame = frames.get_color_frame()
+            if not color_frame:
+                continue
+            if total_frames < self.warmup_frames:
+                total_frames += 1
+                continue
+            else:
+                break
+        self.pipe = pipe
+
+    def read(self) -> np.ndarray:
+        """
+        Wait until color frame is available and return it.
+        :return:
+        """
+        return self.read_with_timestamp()[0]
+
+    def read_with_timestamp(self) -> Tuple[np.ndarray, float]:
+        """
+        Wait until color frame is available and return it with the hardware timestamp of the frame.
+        :return: BGR frame and timestamp in seconds.
+        """
+        while True:
+            frames = self.pipe.wait_for_frames()
+            color_frame = frames.get_color_frame()
+            if not color_frame:
+                continue
+            else:
+                # Realsense timestamps are in milliseconds.
+                return np.asanyarray(color_frame.get_data()), color_frame.get_timestamp() / 1000
+
+    def stop(self):
+        self.pipe.stop()
+
+    def get_intrinsics(self):
+        return self.pipe.get_active_profile().get_stream(rs.stream.color).as_video_stream_profile().get_intrinsics()
+
+
+class ReplayFrameSource(FrameSource):
+    """
+    Replays a recording instead of reading from the camera. Supports videos written by VideoWriter (outpy.avi), frame
+    journals (.journal) and raw frame dumps saved with numpy as an array of shape (frames, height, width, 3). Videos and
+    journals are replayed with their recorded capture timestamps when available.
+    """
+
+    def __init__(self, path: str, calibration_file: Optional[str] = None,
+                 speed: Literal["Recorded", "Max"] = "Recorded", fps: Optional[float] = None):
+        self.path = path
+        # Calibration saved next to the recording, defaults to <recording>.calibration.json.
+        self.calibration_file = calibration_file if calibration_file is not None else path + ".calibration.json"
+        # Replay at the recorded frame rate or as fast as frames can be read.
+        self.speed = speed
+        self.fps = fps
+        self.capture: Optional[cv2.VideoCapture] = None
+        self.journal: Optional[FrameJournal] = None
+        self.frames: Optional[np.ndarray] = None
+        self.frame_index = 0
+        self.start_time = None
+        # Capture timestamps recorded by VideoWriter, relative to the first frame.
+        self.timestamps: Optional[list] = None
+
+    def start(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Recording {self.path} does not exist.")
+        if self.path.endswith(".journal"):
+            self.journal = FrameJournal.open(self.path)
+            self.frames = self.journal.frames[:len(self.journal)]
+            timestamps = self.journal.get_records()["timestamp"]
+            if len(timestamps):
+                self.timestamps = list(timestamps - timestamps[0])
+            if self.fps is None:
+                self.fps = CameraMeasurements().camera_fps
+        elif self.path.endswith(".npy"):
+            # Memory map so that large dumps are not loaded into memory at once.
+            self.frames = np.load(self.path, mmap_mode="r")
+            if self.fps is None:
+                self.fps = CameraMeasurements().camera_fps
+        else:
+            self.capture = cv2.VideoCapture(self.path)
+            if not self.capture.isOpened():
+                raise ValueError(f"Failed to open recording {self.path}.")
+            if self.fps is None:
+                self.fps = self.capture.get(cv2.CAP_PROP_FPS) or CameraMeasurements().camera_fps
+            timestamps = load_timestamps(self.path)
+            if timestamps:
+                self.timestamps = [timestamp - timestamps[0] for timestamp in timestamps]
+        self.frame_index = 0
+        self.start_time = time.perf_counter()
+
+    def read(self) -> Optional[np.ndarray]:
+        out = self.read_with_timestamp()
+        return None if out is None else out[0]
+
+    def read_with_timestamp(self) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        Returns the next frame of the recording with the time it was recorded at, so that replaying at max speed
+        gives the same velocities as replaying at the recorded speed.
+        :return: BGR frame and recording time in seconds, or None at the end of the recording.
+        """
+        if self.frames is not None:
+            if self.frame_index >= len(self.frames):
+                return None
+            frame = np.asarray(self.frames[self.frame_index])
+        else:
+            success, frame = self.capture.read()
+            if not success:
+                return None
+        if self.timestamps is not None and self.frame_index < len(self.timestamps):
+            timestamp = self.timestamps[self.frame_index]
+        else:
+            timestamp = self.frame_index / self.fps
+        self.frame_index += 1
+
+        if self.speed == "Recorded":
+            # Wait until the frame would have been captured by the camera.
+            delay = timestamp - (time.perf_counter() - self.start_time)
+            if delay > 0:
+                time.sleep(delay)
+        return frame, timestamp
+
+    def is_realtime(self) -> bool:
+        # Replaying at max speed processes every frame, so that runs on the same recording are reproducible.
+        return self.speed == "Recorded"
+
+    def stop(self):
+        if self.capture is not None:
+            self.capture.release()
+        if self.journal is not None:
+            self.frames = None
+            self.journal.close()
+
+    def get_calibration(self) -> dict:
+        """
+        Loads the calibration of the recording. Falls back on the last saved corner and goalie values.
+        :return:
+        """
+        return load_calibration(self.calibration_file)
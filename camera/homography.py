@@ -0,0 +1,87 @@
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from camera.camera_measurements import CameraMeasurements
+
+
+class FieldHomography:
+    """
+    Maps pixels to playing field millimeters with a homography, which unlike independent x and y scale factors takes
+    the perspective of the camera into account. Field coordinates are measured from the bottom right corner of the
+    playing field, x towards the left and y towards the top of the image.
+    """
+
+    def __init__(self, pixel_points: np.ndarray, mm_points: np.ndarray, frame_shape: Optional[tuple] = None):
+        """
+        :param pixel_points: At least four pixel positions, e.g. the field corners or ArUco marker corners.
+        :param mm_points: Field positions in mm of the pixel positions.
+        :param frame_shape: Shape of the frames, precomputes a lookup grid with the field position of every pixel.
+        """
+        pixel_points = np.asarray(pixel_points, dtype=np.float32).reshape(-1, 2)
+        mm_points = np.asarray(mm_points, dtype=np.float32).reshape(-1, 2)
+        if len(pixel_points) == 4:
+            self.matrix = cv2.getPerspectiveTransform(pixel_points, mm_points)
+        else:
+            # Least squares fit when more points than the minimum are known.
+            self.matrix, _ = cv2.findHomography(pixel_points, mm_points)
+        self.inverse_matrix = np.linalg.inv(self.matrix)
+        # Field position in mm of every pixel, indexed [y, x].
+        self.lookup_grid: Optional[np.ndarray] = None
+        if frame_shape is not None:
+            height, width = frame_shape[:2]
+            xs, ys = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+            self.lookup_grid = self.pixels_to_mm(np.dstack((xs, ys))).astype(np.float32)
+
+    @classmethod
+    def from_field_corners(cls, bottom_left, top_left, top_right, bottom_right,
+                           camera_measurements: Optional[CameraMeasurements] = None,
+                           frame_shape: Optional[tuple] = None) -> "FieldHomography":
+        """
+        Creates the homography from the pixel positions of the four playing field corners.
+        :param frame_shape: Shape of the frames, precomputes the lookup grid if given.
+        :return:
+        """
+        camera_measurements = camera_measurements if camera_measurements is not None else CameraMeasurements()
+        field_x = camera_measurements.mm_playing_field_x
+        field_y = camera_measurements.mm_playing_field_y
+        return cls(np.array([bottom_left, top_left, top_right, bottom_right]),
+                   np.array([(field_x, 0), (field_x, field_y), (0, field_y), (0, 0)]), frame_shape)
+
+    def pixels_to_mm(self, points: np.ndarray) -> np.ndarray:
+        """
+        Converts an array of pixel positions to field positions in one call.
+        :param points: Array of shape (..., 2) with x and y pixels.
+        :return: Array of the same shape with x and y mm.
+        """
+        points = np.asarray(points, dtype=np.float64)
+        return self.__transform(points, self.matrix)
+
+    def mm_to_pixels(self, points: np.ndarray) -> np.ndarray:
+        """
+        Converts an array of field positions to pixel positions in one call.
+        :param points: Array of shape (..., 2) with x and y mm.
+        :return: Array of the same shape with x and y pixels.
+        """
+        points = np.asarray(points, dtype=np.float64)
+        return self.__transform(points, self.inverse_matrix)
+
+    def pixel_to_mm(self, x_pixel, y_pixel) -> Tuple[float, float]:
+        """
+        Converts a single pixel position, with a lookup in the grid if it was precomputed.
+        :return: X and y mm.
+        """
+        if self.lookup_grid is not None:
+            x, y = int(round(x_pixel)), int(round(y_pixel))
+            if 0 <= y < self.lookup_grid.shape[0] and 0 <= x < self.lookup_grid.shape[1]:
+                x_mm, y_mm = self.lookup_grid[y, x]
+                return float(x_mm), float(y_mm)
+        x_mm, y_mm = self.pixels_to_mm(np.array([x_pixel, y_pixel]))
+        return float(x_mm), float(y_mm)
+
+    @staticmethod
+    def __transform(points: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+        # Equivalent to cv2.perspectiveTransform, but works on any number of leading dimensions.
+        projected = points @ matrix[:, :2].T + matrix[:, 2]
+        return projected[..., :2] / projected[..., 2:]
@@ -0,0 +1,171 @@
+from math import sqrt
+from typing import Optional, Tuple
+
+
+class AxisKalmanFilter:
+    """
+    Constant velocity Kalman filter of one axis. The state is the position and velocity and the covariance is kept as
+    three scalars, which is a lot faster in Python than NumPy matrices for a 2x2 state.
+    """
+
+    def __init__(self, process_noise: float, measurement_noise: float):
+        """
+        :param process_noise: Standard deviation of the unmodelled acceleration in pixels per second squared.
+        :param measurement_noise: Standard deviation of the measured position in pixels.
+        """
+        self.process_variance = process_noise ** 2
+        self.measurement_variance = measurement_noise ** 2
+        self.position = 0.0
+        self.velocity = 0.0
+        # Covariance [[p00, p01], [p01, p11]] of the position and velocity.
+        self.p00, self.p01, self.p11 = (0.0, 0.0, 0.0)
+
+    def reset(self, position: float, velocity_variance: float):
+        self.position = position
+        self.velocity = 0.0
+        self.p00, self.p01, self.p11 = (self.measurement_variance, 0.0, velocity_variance)
+
+    def predict(self, dt: float):
+        self.position += self.velocity * dt
+        q = self.process_variance
+        self.p00 += dt * (2 * self.p01 + dt * self.p11) + q * dt ** 3 / 3
+        self.p01 += dt * self.p11 + q * dt ** 2 / 2
+        self.p11 += q * dt
+
+    def update(self, measurement: float):
+        s = self.p00 + self.measurement_variance
+        k0 = self.p00 / s
+        k1 = self.p01 / s
+        residual = measurement - self.position
+        self.position += k0 * residual
+        self.velocity += k1 * residual
+        self.p11 -= k1 * self.p01
+        self.p00 -= k0 * self.p00
+        self.p01 -= k0 * self.p01
+
+    def reflect(self, wall: float, restitution: float):
+        """
+        Bounces the state off a wall at the given position.
+        :param wall: Position of the wall.
+        :param restitution: Fraction of the speed kept by the bounce.
+        :return:
+        """
+        lost_speed = abs(self.velocity) * (1 - restitution)
+        self.position = 2 * wall - self.position
+        self.velocity = -self.velocity * restitution
+        self.p01 = self.p01 * restitution
+        # The bounce is not exactly known, so the speed that was lost is added as uncertainty.
+        self.p11 = self.p11 * restitution ** 2 + lost_speed ** 2
+
+    def scale_velocity(self, factor: float):
+        """
+        Slows the state down without reflecting it, e.g. along a wall the ball bounces off.
+        :param factor: Fraction of the speed kept.
+        :return:
+        """
+        lost_speed = abs(self.velocity) * (1 - factor)
+        self.velocity = self.velocity * factor
+        self.p01 = self.p01 * factor
+        self.p11 = self.p11 * factor ** 2 + lost_speed ** 2
+
+
+class BallKalmanFilter:
+    """
+    Tracks the ball position and velocity in pixels with a constant velocity Kalman filter per axis. Frames without a
+    detection are coasted on the predicted state, and the y axis bounces off the top and bottom walls of the playing
+    field like in the trajectory solvers. The filtered velocity is fitted over all previous detections, so a single noisy centroid no longer decides
+    the predicted trajectory.
+    """
+
+    def __init__(self, playing_field_top: float, playing_field_bottom: float, restitution: float,
+                 y_restitution_factor: float, rate: float, process_noise: float = 500, measurement_noise: float = 2,
+                 max_coast_frames: int = 10):
+        """
+        :param playing_field_top: Y pixel of the top wall.
+        :param playing_field_bottom: Y pixel of the bottom wall.
+        :param restitution: Fraction of the speed kept when the ball bounces off a wall.
+        :param y_restitution_factor: Additional fraction of the y speed kept when the ball bounces off a wall.
+        :param rate: Frame rate, used when frames have no timestamps.
+        :param process_noise: Standard deviation of the unmodelled acceleration in pixels per second squared.
+        :param measurement_noise: Standard deviation of the detected ball position in pixels.
+        :param max_coast_frames: Number of frames without a detection after which the ball is considered lost.
+        """
+        self.playing_field_top = playing_field_top
+        self.playing_field_bottom = playing_field_bottom
+        self.restitution = restitution
+        self.y_restitution_factor = y_restitution_factor
+        self.rate = rate
+        self.max_coast_frames = max_coast_frames
+        self.x = AxisKalmanFilter(process_noise, measurement_noise)
+        self.y = AxisKalmanFilter(process_noise, measurement_noise)
+        # Variance of the velocity of a new track, the ball can be moving at any speed up to about 50 pixels per frame
+        # when it is first detected.
+        self.initial_velocity_variance = (50 * rate) ** 2
+        # Number of detections since the track started, 0 when no ball is tracked.
+        self.updates = 0
+        self.coasted_frames = 0
+        self.timestamp: Optional[float] = None
+
+    def update(self, x_pixel: float, y_pixel: float, timestamp: Optional[float] = None):
+        """
+        Adds a detected ball position.
+        :param timestamp: Capture time of the frame in seconds.
+        :return:
+        """
+        if self.updates == 0:
+            self.x.reset(x_pixel, self.initial_velocity_variance)
+            self.y.reset(y_pixel, self.initial_velocity_variance)
+        else:
+            self.__predict(timestamp)
+            self.x.update(x_pixel)
+            self.y.update(y_pixel)
+        self.timestamp = timestamp
+        self.updates += 1
+        self.coasted_frames = 0
+
+    def coast(self, timestamp: Optional[float] = None):
+        """
+        Advances the state through a frame without a detection.
+        :param timestamp: Capture time of the frame in seconds.
+        :return:
+        """
+        if self.updates == 0:
+            return
+        self.coasted_frames += 1
+        if self.coasted_frames > self.max_coast_frames:
+            # The ball is lost, the next detection starts a new track.
+            self.updates = 0
+            return
+        self.__predict(timestamp)
+        self.timestamp = timestamp
+
+    def get_state(self) -> Optional[Tuple[float, float, float, float]]:
+        """
+        :return: X pixel, Y pixel, x speed and y speed in pixels per second, or None if the velocity is not known yet.
+        """
+        if self.updates < 2:
+            return None
+        return self.x.position, self.y.position, self.x.velocity, self.y.velocity
+
+    def get_uncertainty(self) -> Tuple[float, float]:
+        """
+        :return: Standard deviation of the position in pixels and of the speed in pixels per second.
+        """
+        return sqrt(max(self.x.p00, self.y.p00)), sqrt(max(self.x.p11, self.y.p11))
+
+    def __predict(self, timestamp: Optional[float]):
+        if timestamp is not None and self.timestamp is not None and timestamp > self.timestamp:
+            dt = timestamp - self.timestamp
+        else:
+            dt = 1 / self.rate
+        self.x.predict(dt)
+        self.y.predict(dt)
+        if self.y.position < self.playing_field_top:
+            self.__bounce(self.playing_field_top)
+        elif self.y.position > self.playing_field_bottom:
+            self.__bounce(self.playing_field_bottom)
+
+    def __bounce(self, wall: float):
+        # Same bounce model as the trajectory solvers.
+        self.y.reflect(wall, self.restitution * self.y_restitution_factor)
+        self.x.scale_velocity(self.restitution)
@@ -0,0 +1,29 @@
+import pydantic
+
+"""
+File stores the physics parameters of the ball trajectory prediction, shared by the live predictor and the batch
+predictor used for offline evaluation.
+"""
+
+parameters = {"DAMPING": 0.85,
+              "THRESHOLD": 70,
+              "RESTITUTION": 0.75,
+              "Y_RESTITUTION_FACTOR": 0.5,
+              "TIME_STEP": 0.2,
+              "MAX_BOUNCES": 20}
+
+
+class PredictionParameters(pydantic.BaseModel):
+    """Class to hold ball trajectory prediction parameters."""
+    # Damping factor. Fraction of the speed the ball keeps per time step.
+    damping: float = parameters["DAMPING"]
+    # Threshold speed in pixels per second. Below it the ball is considered stopped and no trajectory is predicted.
+    threshold: float = parameters["THRESHOLD"]
+    # Restitution factor. Fraction of the speed the ball keeps when it bounces off the walls.
+    restitution: float = parameters["RESTITUTION"]
+    # Additional factor applied to the y speed after a wall bounce, the ball bounces off the wall in a non linear way.
+    y_restitution_factor: float = parameters["Y_RESTITUTION_FACTOR"]
+    # Time step in seconds of the damping.
+    time_step: float = parameters["TIME_STEP"]
+    # Number of wall bounces after which the ball is considered stuck.
+    max_bounces: int = parameters["MAX_BOUNCES"]
@@ -0,0 +1,52 @@
+import argparse
+import cProfile
+import multiprocessing
+import pstats
+import queue
+import threading
+
+from camera.camera_manager import CameraManager
+from camera.frame_source import ReplayFrameSource
+from camera.tracking_settings import TrackingSettings
+
+"""
+Profiles start_ball_tracking headless by replaying a recording instead of reading from the camera.
+
+USAGE: python -m camera.profile_tracking outpy.avi --speed Max
+"""
+
+
+def drain_queue(messages: queue.Queue):
+    while True:
+        messages.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile ball tracking on a recording.")
+    parser.add_argument("recording", help="outpy.avi style recording or .npy raw frame dump.")
+    parser.add_argument("--calibration", default=None, help="Calibration file, <recording>.calibration.json by "
+                                                            "default.")
+    parser.add_argument("--speed", choices=["Recorded", "Max"], default="Max")
+    parser.add_argument("--top", type=int, default=25, help="Number of functions to print.")
+    args = parser.parse_args()
+
+    frame_source = ReplayFrameSource(args.recording, args.calibration, args.speed)
+    # Nobody consumes the messages of the tracking loop, so discard them on a thread to keep the queue from growing.
+    queue_from_camera = queue.Queue()
+    threading.Thread(target=drain_queue, args=(queue_from_camera,), daemon=True).start()
+    # Do not record, the replayed recording would be overwritten. Publishing frames, recalibration and the calibration
+    # cache are not part of the tracking loop and are disabled so they do not show up in the profile.
+    settings = TrackingSettings(record_video=False, publish_frames=False, recalibration_interval=0,
+                                calibration_cache=False)
+    camera_manager = CameraManager(multiprocessing.Event(), queue.Queue(), queue_from_camera, settings, frame_source)
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    camera_manager.start_ball_tracking(mode="Speed")
+    profiler.disable()
+
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.top)
+
+
+if __name__ == "__main__":
+    main()
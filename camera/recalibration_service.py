@@ -0,0 +1,161 @@
+import queue
+import threading
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+from camera.aruco import create_detector, detect_markers
+from camera.tracking_settings import TrackingSettings
+
+
+class RecalibrationService:
+    """
+    Corrects the field calibration while tracking when the table or the camera is bumped. Every few seconds the ArUco
+    markers are detected on a few downscaled frames on a background thread, and their corners are averaged over the
+    frames. The first detection is the reference for the current calibration. When the markers of a later detection
+    moved, the field corners and goalie position are moved by the same transform and handed to the tracking loop, which
+    applies them between two frames.
+    """
+
+    def __init__(self, field_corners: np.ndarray, goalie_x_pixel_position: int,
+                 settings: Optional[TrackingSettings] = None,
+                 create_field_homography: Optional[Callable[[np.ndarray], object]] = None):
+        """
+        :param field_corners: Corners of the playing field that match the markers at the time of the first detection.
+        :param goalie_x_pixel_position: Goalie position that matches the markers at the time of the first detection.
+        :param settings: Tracking settings.
+        :param create_field_homography: Creates the field homography of corrected field corners. Called on the
+        detection thread, so that building its lookup grid does not stall the tracking loop.
+        """
+        self.settings = settings if settings is not None else TrackingSettings()
+        self.create_field_homography = create_field_homography
+        # Created once, creating a detector for every frame is expensive.
+        self.detector = create_detector()
+        self.field_corners = np.array(field_corners, dtype=np.float32)
+        self.goalie_x_pixel_position = goalie_x_pixel_position
+        # Averaged full resolution corners of every marker id of the first detection.
+        self.reference_markers: Optional[dict] = None
+        # Field corners of the last calibration handed to the tracking loop.
+        self.applied_corners = self.field_corners
+        # Number of frames the detection thread still needs, the tracking loop only hands over frames while it is set.
+        # Written by both threads, guarded by the lock.
+        self.requested_frames = 0
+        self.frame_queue = queue.Queue(maxsize=1)
+        # Calibration waiting to be applied by the tracking loop, guarded by the lock.
+        self.pending_calibration: Optional[dict] = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+
+    def offer_frame(self, frame: np.ndarray):
+        """
+        Called by the tracking loop for every frame. Only downscales and copies the frame when the detection thread
+        needs one.
+        :param frame: BGR frame.
+        :return:
+        """
+        # Reading without the lock only decides whether the frame is downscaled, the lock is taken for the hand over.
+        if self.requested_frames <= 0:
+            return
+        small_frame = cv2.resize(frame, None, fx=self.settings.recalibration_scale,
+                                 fy=self.settings.recalibration_scale, interpolation=cv2.INTER_AREA)
+        with self.lock:
+            if self.requested_frames <= 0:
+                return
+            try:
+                self.frame_queue.put_nowait(small_frame)
+                self.requested_frames -= 1
+            except queue.Full:
+                pass
+
+    def take_pending_calibration(self) -> Optional[dict]:
+        """
+        Returns the calibration that should be applied, if any.
+        :return: Dictionary with "corners", "goalie_x_pixel_position" and "field_homography" if the service creates it,
+        or None if the calibration did not change.
+        """
+        with self.lock:
+            calibration = self.pending_calibration
+            self.pending_calibration = None
+        return calibration
+
+    def __run(self):
+        # The first detection is made right away so that the reference matches the calibration.
+        while not self.stopped.is_set():
+            markers = self.__detect_averaged_markers()
+            if markers is not None:
+                if self.reference_markers is None:
+                    # A transform needs at least two markers. Otherwise, e.g. when a hand covers the markers, the
+                    # reference is detected again at the next interval.
+                    if len(markers) >= 2:
+                        self.reference_markers = markers
+                    else:
+                        print("Recalibration: not enough ArUco markers detected for the reference.")
+                else:
+                    self.__update_calibration(markers)
+            self.stopped.wait(self.settings.recalibration_interval)
+
+    def __detect_averaged_markers(self) -> Optional[dict]:
+        """
+        Detects the markers on recalibration_frames frames and averages the corners of every marker.
+        :return: Full resolution corners of every marker id that was detected in at least half of the frames.
+        """
+        detections = {}
+        with self.lock:
+            # Drop a frame left over from a detection that timed out.
+            try:
+                self.frame_queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.requested_frames = self.settings.recalibration_frames
+        for _ in range(self.settings.recalibration_frames):
+            try:
+                small_frame = self.frame_queue.get(timeout=1)
+            except queue.Empty:
+                # Tracking stopped or is stalled.
+                with self.lock:
+                    self.requested_frames = 0
+                return None
+            corners, ids, _ = detect_markers(small_frame, self.detector, require_all=False)
+            for ii in range(len(ids)):
+                detections.setdefault(int(ids[ii][0]), []).append(corners[ii].reshape(4, 2))
+        markers = {}
+        for marker_id, marker_corners in detections.items():
+            if 2 * len(marker_corners) >= self.settings.recalibration_frames:
+                markers[marker_id] = np.mean(marker_corners, axis=0) / self.settings.recalibration_scale
+        return markers
+
+    def __update_calibration(self, markers: dict):
+        common_ids = [marker_id for marker_id in markers if marker_id in self.reference_markers]
+        if len(common_ids) < 2:
+            print("Recalibration: not enough ArUco markers detected.")
+            return
+        reference_points = np.concatenate([self.reference_markers[marker_id] for marker_id in common_ids])
+        points = np.concatenate([markers[marker_id] for marker_id in common_ids])
+        # Rotation, uniform scale and translation of the image since the reference detection.
+        transform, _ = cv2.estimateAffinePartial2D(reference_points, points)
+        if transform is None:
+            return
+        corners = cv2.transform(self.field_corners.reshape(-1, 1, 2), transform).reshape(-1, 2)
+        if np.max(np.linalg.norm(corners - self.applied_corners, axis=1)) < self.settings.recalibration_min_shift:
+            return
+        self.applied_corners = corners
+        # Move the goalie with the field, measured at the vertical center of the field.
+        goalie = np.array([[[self.goalie_x_pixel_position, np.mean(self.field_corners[:, 1])]]], dtype=np.float32)
+        goalie_x_pixel_position = int(round(float(cv2.transform(goalie, transform)[0, 0, 0])))
+        print("Recalibration: field moved, updating the calibration.")
+        calibration = {"corners": np.round(corners).astype(int), "goalie_x_pixel_position": goalie_x_pixel_position}
+        if self.create_field_homography is not None:
+            calibration["field_homography"] = self.create_field_homography(calibration["corners"])
+        with self.lock:
+            self.pending_calibration = calibration
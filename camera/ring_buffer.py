@@ -0,0 +1,77 @@
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed capacity history of samples, newest first, backed by preallocated NumPy arrays. Every sample is written
+    twice, at its slot and at its slot plus the capacity, so that the newest n samples are always one contiguous slice
+    and can be returned as views. Appending is O(1) and never allocates, the oldest sample is overwritten when the
+    buffer is full.
+    """
+
+    def __init__(self, capacity: int, fields: int):
+        """
+        :param capacity: Maximum number of samples kept.
+        :param fields: Number of values of every sample.
+        """
+        self.capacity = capacity
+        self.values = np.full((2 * capacity, fields), np.nan)
+        # False for the samples that were added as empty, e.g. frames without a detected ball.
+        self.valid = np.zeros(2 * capacity, dtype=bool)
+        # Index of the newest sample, the older samples follow it.
+        self.start = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> Optional[np.ndarray]:
+        """
+        :param index: 0 is the newest sample.
+        :return: View of the sample values, or None if the sample is empty.
+        """
+        if not 0 <= index < self.count:
+            raise IndexError("RingBuffer index out of range")
+        if not self.valid[self.start + index]:
+            return None
+        return self.values[self.start + index]
+
+    def append(self, values: Sequence[float]):
+        self.__push(values, True)
+
+    def append_empty(self):
+        self.__push(np.nan, False)
+
+    def latest(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the newest n samples without copying them.
+        :param n: Number of samples, limited to the number of samples in the buffer.
+        :return: Views of the values and valid flags, newest first.
+        """
+        n = min(n, self.count)
+        return self.values[self.start:self.start + n], self.valid[self.start:self.start + n]
+
+    def latest_valid(self, n: int) -> np.ndarray:
+        """
+        Returns the newest run of consecutive valid samples without copying them, e.g. for fitting the velocity of
+        the ball since it was last lost.
+        :param n: Maximum number of samples.
+        :return: View of the values of up to n samples, newest first. Empty if the newest sample is empty.
+        """
+        values, valid = self.latest(n)
+        run = len(valid) if valid.all() else int(np.argmin(valid))
+        return values[:run]
+
+    def clear(self):
+        self.valid[:] = False
+        self.count = 0
+
+    def __push(self, values, valid: bool):
+        self.start = (self.start - 1) % self.capacity
+        self.values[self.start] = values
+        self.values[self.start + self.capacity] = values
+        self.valid[self.start] = valid
+        self.valid[self.start + self.capacity] = valid
+        self.count = min(self.count + 1, self.capacity)
@@ -0,0 +1,55 @@
+from typing import Optional
+
+import numpy as np
+
+from camera.ball_detector import BallDetector
+from camera.ball_prediction import BallPrediction
+from camera.tracking_settings import TrackingSettings
+
+
+class SearchWindowTracker:
+    """
+    Searches for the ball in a small window around the position extrapolated from the last ball positions. The window
+    grows with the speed of the ball, and the whole playing field is searched whenever the window misses the ball.
+    """
+
+    def __init__(self, ball_detector: BallDetector, ball_prediction: BallPrediction,
+                 settings: Optional[TrackingSettings] = None):
+        self.ball_detector = ball_detector
+        self.ball_prediction = ball_prediction
+        settings = settings if settings is not None else TrackingSettings()
+        # Half the width of the search window when the ball is not moving.
+        self.min_window_size = settings.search_window_min_size
+        # Growth of the search window with the speed of the ball.
+        self.speed_factor = settings.search_window_speed_factor
+        # Number of frames where the ball was found in the search window and where the whole field was searched.
+        self.window_frames = 0
+        self.full_frames = 0
+
+    def get_search_window(self) -> Optional[tuple]:
+        """
+        Returns the search window around the extrapolated ball position.
+        :return: (x, y, w, h) in full frame pixel coordinates, or None if the ball position is unknown.
+        """
+        extrapolated = self.ball_prediction.get_extrapolated_position()
+        if extrapolated is None:
+            return None
+        x_pixel, y_pixel, speed = extrapolated
+        half_size = int(self.min_window_size + self.speed_factor * speed)
+        return x_pixel - half_size, y_pixel - half_size, 2 * half_size, 2 * half_size
+
+    def detect(self, frame: np.ndarray) -> list:
+        """
+        Finds the ball contours, in the search window if possible and in the whole playing field otherwise.
+        :param frame: Full BGR camera frame.
+        :return: Contours in full frame pixel coordinates.
+        """
+        window = self.get_search_window()
+        if window is not None:
+            cnts = self.ball_detector.detect(frame, window)
+            if len(cnts) == 1:
+                self.window_frames += 1
+                return cnts
+        # The ball was missed or is ambiguous, fall back on searching the whole playing field.
+        self.full_frames += 1
+        return self.ball_detector.detect(frame)
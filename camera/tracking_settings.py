@@ -0,0 +1,125 @@
+from typing import Literal, Optional
+
+import pydantic
+
+"""
+File stores the settings that select how the ball tracking loop processes frames.
+"""
+
+settings = {"CROP_TO_ROI": True,
+            "RECORD_VIDEO": True,
+            "SEGMENTATION": "HSV",
+            "LUT_BITS": 6,
+            "SEARCH_WINDOW": False,
+            "SEARCH_WINDOW_MIN_SIZE": 30,
+            "SEARCH_WINDOW_SPEED_FACTOR": 1.5,
+            "DETECTOR": "HSV",
+            "BACKGROUND_LEARNING_RATE": 0.02,
+            "BACKGROUND_THRESHOLD": 30,
+            "BALL_MIN_AREA": 100,
+            "BALL_MAX_AREA": 2000,
+            "PUBLISH_FRAMES": True,
+            "FRAME_RING_SLOTS": 4,
+            "PYRAMID_LEVELS": 0,
+            "VIDEO_QUEUE_SIZE": 30,
+            "VIDEO_DROP_POLICY": "DropOldest",
+            "VIDEO_KEEP_EVERY_NTH": 1,
+            "JOURNAL_PATH": None,
+            "JOURNAL_CAPACITY": 1800,
+            "CALIBRATION_CACHE": True,
+            "CALIBRATION_CACHE_WARMUP_FRAMES": 5,
+            "CALIBRATION_CACHE_MIN_CORRELATION": 0.9,
+            "CALIBRATION_CACHE_MAX_SHIFT": 2.0,
+            "RECALIBRATION_INTERVAL": 10,
+            "RECALIBRATION_SCALE": 0.5,
+            "RECALIBRATION_FRAMES": 5,
+            "RECALIBRATION_MIN_SHIFT": 2.0,
+            "HOMOGRAPHY_LOOKUP_GRID": False,
+            "UNDISTORT_POINTS": False,
+            "CANDIDATE_SCORING": True,
+            "CANDIDATE_MIN_CONFIDENCE": 0.1,
+            "KALMAN_FILTER": False,
+            "KALMAN_PROCESS_NOISE": 500,
+            "KALMAN_MEASUREMENT_NOISE": 2,
+            "KALMAN_MAX_COAST_FRAMES": 10,
+            "PREDICTION_SOLVER": "Iterative"}
+
+
+class TrackingSettings(pydantic.BaseModel):
+    """Class to hold ball tracking settings."""
+    # Only process the bounding rectangle of the playing field instead of the whole frame.
+    crop_to_roi: bool = settings["CROP_TO_ROI"]
+    # Record the camera frames to outpy.avi while tracking.
+    record_video: bool = settings["RECORD_VIDEO"]
+    # Record lossless raw frames with their timestamps and ball positions to this frame journal file.
+    journal_path: Optional[str] = settings["JOURNAL_PATH"]
+    # Maximum number of frames in the frame journal, every frame takes width * height * 3 bytes.
+    journal_capacity: int = settings["JOURNAL_CAPACITY"]
+    # Number of frames the recorder can fall behind before frames are dropped.
+    video_queue_size: int = settings["VIDEO_QUEUE_SIZE"]
+    # Frame the recorder drops when it is behind.
+    video_drop_policy: Literal["DropOldest", "DropNewest"] = settings["VIDEO_DROP_POLICY"]
+    # Only record every nth frame.
+    video_keep_every_nth: int = settings["VIDEO_KEEP_EVERY_NTH"]
+    # Segment the ball with HSV thresholding or with a BGR lookup table compiled from the same HSV ranges.
+    segmentation: Literal["HSV", "LUT"] = settings["SEGMENTATION"]
+    # Number of bits kept from every color channel by the lookup table.
+    lut_bits: int = settings["LUT_BITS"]
+    # Only search a window around the extrapolated ball position instead of the whole playing field.
+    search_window: bool = settings["SEARCH_WINDOW"]
+    # Half the width of the search window in pixels when the ball is not moving.
+    search_window_min_size: int = settings["SEARCH_WINDOW_MIN_SIZE"]
+    # Pixels added to half the width of the search window per pixel per frame of ball speed.
+    search_window_speed_factor: float = settings["SEARCH_WINDOW_SPEED_FACTOR"]
+    # Detect the ball with color thresholding or with background subtraction.
+    detector: Literal["HSV", "Background"] = settings["DETECTOR"]
+    # Weight of the current frame in the running background average.
+    background_learning_rate: float = settings["BACKGROUND_LEARNING_RATE"]
+    # Minimum grayscale difference with the background for a pixel to be foreground.
+    background_threshold: int = settings["BACKGROUND_THRESHOLD"]
+    # Contour area range in pixels of the ball.
+    ball_min_area: int = settings["BALL_MIN_AREA"]
+    ball_max_area: int = settings["BALL_MAX_AREA"]
+    # Publish every frame to the shared memory frame ring for the frontend and other readers.
+    publish_frames: bool = settings["PUBLISH_FRAMES"]
+    # Number of frames kept in the shared memory frame ring.
+    frame_ring_slots: int = settings["FRAME_RING_SLOTS"]
+    # Find ball candidates on an image downscaled by 2 ** pyramid_levels before refining them at full resolution.
+    # 0 disables the coarse stage, 1 is half resolution and 2 is quarter resolution.
+    pyramid_levels: int = settings["PYRAMID_LEVELS"]
+    # Load the field calibration from the calibration cache at startup instead of detecting it.
+    calibration_cache: bool = settings["CALIBRATION_CACHE"]
+    # Number of camera warmup frames when a calibration cache exists, instead of the full warmup.
+    calibration_cache_warmup_frames: int = settings["CALIBRATION_CACHE_WARMUP_FRAMES"]
+    # Minimum correlation between the cached reference image and the first frame for the cache to be used.
+    calibration_cache_min_correlation: float = settings["CALIBRATION_CACHE_MIN_CORRELATION"]
+    # Maximum distance in pixels between the cached and the current ArUco marker corners for the cache to be used.
+    calibration_cache_max_shift: float = settings["CALIBRATION_CACHE_MAX_SHIFT"]
+    # Seconds between background ArUco marker detections that correct the calibration when the table or camera moved,
+    # 0 disables the recalibration.
+    recalibration_interval: float = settings["RECALIBRATION_INTERVAL"]
+    # Scale of the frames the markers are detected on.
+    recalibration_scale: float = settings["RECALIBRATION_SCALE"]
+    # Number of frames the marker corners are averaged over.
+    recalibration_frames: int = settings["RECALIBRATION_FRAMES"]
+    # Minimum movement in pixels of a field corner for the calibration to be updated.
+    recalibration_min_shift: float = settings["RECALIBRATION_MIN_SHIFT"]
+    # Precompute the field position of every pixel, so that converting a single point is a lookup.
+    homography_lookup_grid: bool = settings["HOMOGRAPHY_LOOKUP_GRID"]
+    # Correct the lens distortion of the ball and predicted positions before converting them to mm.
+    undistort_points: bool = settings["UNDISTORT_POINTS"]
+    # Pick the most likely ball out of several contours instead of only accepting frames with exactly one contour.
+    candidate_scoring: bool = settings["CANDIDATE_SCORING"]
+    # Minimum confidence, between 0 and 1, of the best of several contours for it to be accepted as the ball. A single
+    # contour is always accepted.
+    candidate_min_confidence: float = settings["CANDIDATE_MIN_CONFIDENCE"]
+    # Predict the trajectory from the position and velocity of a Kalman filter instead of the last two detections.
+    kalman_filter: bool = settings["KALMAN_FILTER"]
+    # Standard deviation of the unmodelled ball acceleration in pixels per second squared.
+    kalman_process_noise: float = settings["KALMAN_PROCESS_NOISE"]
+    # Standard deviation of the detected ball position in pixels.
+    kalman_measurement_noise: float = settings["KALMAN_MEASUREMENT_NOISE"]
+    # Number of frames without a detection the filter coasts through before the ball is considered lost.
+    kalman_max_coast_frames: int = settings["KALMAN_MAX_COAST_FRAMES"]
+    # Compute where the ball reaches the goalie in closed form, or walk the trajectory in time steps.
+    prediction_solver: Literal["ClosedForm", "Iterative"] = settings["PREDICTION_SOLVER"]
@@ -0,0 +1,130 @@
+from math import log
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from camera.prediction_parameters import PredictionParameters
+
+
+def solve_bounce_trajectory(x_pixel: float, y_pixel: float, x_speed: float, y_speed: float, target_x_pixel: float,
+                            playing_field_top: float, playing_field_bottom: float,
+                            parameters: Optional[PredictionParameters] = None
+                            ) -> Optional[Tuple[float, float, int, List[Tuple[int, int]]]]:
+    """
+    Computes where the ball crosses the target x pixel in closed form instead of walking the trajectory in time steps.
+    The speed decays continuously as exp(-k * t) with k = -ln(damping) / time_step, which loses the same fraction of
+    speed per time step as the iterative model. A ball moving at speed v then covers v * (1 - exp(-k * t)) / k pixels in
+    t seconds, so the time to the next wall and to the target follow from a logarithm. Every wall bounce starts a new
+    segment with the bounce rule of the iterative model, so the number of iterations is the number of bounces.
+    :param x_pixel: Current position of the ball.
+    :param y_pixel:
+    :param x_speed: Current speed of the ball in pixels per second, positive towards the target.
+    :param y_speed:
+    :param target_x_pixel: Position of the goalie bar.
+    :param playing_field_top: Y pixel of the top wall.
+    :param playing_field_bottom: Y pixel of the bottom wall.
+    :param parameters: Physics parameters of the prediction.
+    :return: Y pixel and time in seconds at which the ball reaches the target, number of bounces and the bounce and
+    arrival points. None if the ball stops before it reaches the target.
+    """
+    parameters = parameters if parameters is not None else PredictionParameters()
+    # Decay rate of the speed per second.
+    k = -log(parameters.damping) / parameters.time_step
+    elapsed_time = 0.0
+    path = [(round(x_pixel), round(y_pixel))]
+    for bounces in range(parameters.max_bounces + 1):
+        if x_speed <= parameters.threshold:
+            return None
+        # Distances are divided by the current speed, giving the "damped time" (1 - exp(-k * t)) / k they take.
+        # The ball stops when the speed reaches the threshold, which limits the damped time it can still travel.
+        max_damped_time = (1 - parameters.threshold / x_speed) / k
+        target_damped_time = (target_x_pixel - x_pixel) / x_speed
+        # A ball that is already past the wall bounces right away.
+        if y_speed > 0:
+            wall = playing_field_bottom
+            wall_damped_time = max((wall - y_pixel) / y_speed, 0.0)
+        elif y_speed < 0:
+            wall = playing_field_top
+            wall_damped_time = max((wall - y_pixel) / y_speed, 0.0)
+        else:
+            wall = None
+            wall_damped_time = float("inf")
+
+        if target_damped_time <= wall_damped_time:
+            if target_damped_time > max_damped_time:
+                return None
+            elapsed_time += -log(1 - k * target_damped_time) / k
+            y_arrival = y_pixel + y_speed * target_damped_time
+            path.append((round(target_x_pixel), round(y_arrival)))
+            return y_arrival, elapsed_time, bounces, path
+        if wall_damped_time > max_damped_time:
+            return None
+
+        # Move to the wall, damp the speed for the time it took and bounce like the iterative model.
+        decay = 1 - k * wall_damped_time
+        elapsed_time += -log(decay) / k
+        x_pixel += x_speed * wall_damped_time
+        y_pixel = wall
+        x_speed = x_speed * decay * parameters.restitution
+        y_speed = -y_speed * decay * parameters.restitution * parameters.y_restitution_factor
+        path.append((round(x_pixel), round(y_pixel)))
+    return None
+
+
+def predict_batch(states: np.ndarray, target_x_pixel: float, playing_field_top: float, playing_field_bottom: float,
+                  parameters: Optional[PredictionParameters] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorized version of solve_bounce_trajectory for many ball states at once, without side effects. Every iteration
+    advances all balls that are still moving by one wall bounce, so the number of iterations is the largest number of
+    bounces instead of the number of states.
+    :param states: Array of shape (n, 4) with x pixel, y pixel, x speed and y speed in pixels per second.
+    :param target_x_pixel: Position of the goalie bar.
+    :param playing_field_top: Y pixel of the top wall.
+    :param playing_field_bottom: Y pixel of the bottom wall.
+    :param parameters: Physics parameters of the prediction, the same as those of the live predictor.
+    :return: Arrival y pixel, arrival time in seconds and number of bounces of every state. The arrival y and time are
+    NaN and the bounces -1 for balls that stop before they reach the target.
+    """
+    parameters = parameters if parameters is not None else PredictionParameters()
+    k = -np.log(parameters.damping) / parameters.time_step
+    states = np.asarray(states, dtype=np.float64)
+    x_pixel, y_pixel, x_speed, y_speed = (states[:, column].copy() for column in range(4))
+    count = len(states)
+    elapsed_time = np.zeros(count)
+    arrival_y = np.full(count, np.nan)
+    arrival_time = np.full(count, np.nan)
+    bounces = np.full(count, -1, dtype=np.int64)
+    # Balls that are still moving towards the target.
+    active = np.arange(count)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for bounce in range(parameters.max_bounces + 1):
+            active = active[x_speed[active] > parameters.threshold]
+            if len(active) == 0:
+                break
+            vx, vy = x_speed[active], y_speed[active]
+            max_damped_time = (1 - parameters.threshold / vx) / k
+            target_damped_time = (target_x_pixel - x_pixel[active]) / vx
+            wall = np.where(vy > 0, playing_field_bottom, playing_field_top)
+            wall_damped_time = np.where(vy != 0, np.maximum((wall - y_pixel[active]) / vy, 0.0), np.inf)
+
+            # Balls that reach the target before the next wall.
+            arrives = (target_damped_time <= wall_damped_time) & (target_damped_time <= max_damped_time)
+            arrived = active[arrives]
+            arrival_y[arrived] = y_pixel[arrived] + vy[arrives] * target_damped_time[arrives]
+            arrival_time[arrived] = elapsed_time[arrived] - np.log(1 - k * target_damped_time[arrives]) / k
+            bounces[arrived] = bounce
+
+            # Balls that reach the next wall before the target and before they stop.
+            bounces_off_wall = (wall_damped_time < target_damped_time) & (wall_damped_time <= max_damped_time)
+            bouncing = active[bounces_off_wall]
+            wall_time = wall_damped_time[bounces_off_wall]
+            decay = 1 - k * wall_time
+            elapsed_time[bouncing] -= np.log(decay) / k
+            x_pixel[bouncing] += x_speed[bouncing] * wall_time
+            y_pixel[bouncing] = wall[bounces_off_wall]
+            # Same order of operations as solve_bounce_trajectory, so that both give the same results.
+            x_speed[bouncing] = x_speed[bouncing] * decay * parameters.restitution
+            y_speed[bouncing] = -y_speed[bouncing] * decay * parameters.restitution * parameters.y_restitution_factor
+            active = bouncing
+    return arrival_y, arrival_time, bounces
@@ -1,23 +1,112 @@
+import os
+import queue
+import threading
+from typing import Literal, Optional
+
 import cv2
 import numpy as np
 
 
 class VideoWriter:
-    def __init__(self):
-        # Default resolutions of the frame are obtained.The default resolutions are system dependent.
-        # We convert the resolutions from float to integer.
-        frame_width = 960
-        frame_height = 540
-
-        # Define the codec and create VideoWriter object.The output is stored in 'outpy.avi' file.
-        self.out = cv2.VideoWriter('outpy.avi', cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'), 23,
+    """
+    Records frames to an MJPEG video on a background thread so that encoding and disk writes never add latency to
+    ball tracking. Frames are copied into a bounded pool of preallocated buffers, when the writer falls behind frames
+    are dropped instead of blocking the caller. The capture timestamp of every written frame is stored in a sidecar
+    file, <video>.timestamps.csv.
+    """
+
+    def __init__(self, path: str = "outpy.avi", camera_fps: float = 60, frame_width: int = 960,
+                 frame_height: int = 540, queue_size: int = 30,
+                 drop_policy: Literal["DropOldest", "DropNewest"] = "DropOldest", keep_every_nth: int = 1):
+        self.path = path
+        # Only record every nth frame, the output frame rate is lowered to match.
+        self.keep_every_nth = max(1, keep_every_nth)
+        # Which frame to drop when the queue is full.
+        self.drop_policy = drop_policy
+        self.fps = camera_fps / self.keep_every_nth
+
+        # Define the codec and create VideoWriter object.
+        self.out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'), self.fps,
                                    (frame_width, frame_height))
+        self.timestamps_file = open(path + ".timestamps.csv", "w")
+        self.timestamps_file.write("frame,timestamp\n")
+        # Buffers that are free to copy a frame into.
+        self.free_buffers = queue.Queue()
+        for _ in range(queue_size):
+            self.free_buffers.put(np.empty((frame_height, frame_width, 3), dtype=np.uint8))
+        # Frames waiting to be written, as (buffer, timestamp).
+        self.pending_frames = queue.Queue()
+        # Number of frames passed to add_frame, written and dropped.
         self.ii = 0
+        self.written_frames = 0
+        self.dropped_frames = 0
+        self.thread = threading.Thread(target=self.__write_loop, daemon=True)
+        self.thread.start()
 
-    def add_frame(self, frame):
+    def add_frame(self, frame: np.ndarray, timestamp: Optional[float] = None):
+        """
+        Queues a frame to be written. Never blocks.
+        :param frame: BGR frame.
+        :param timestamp: Capture time of the frame in seconds.
+        :return:
+        """
         self.ii += 1
+        if (self.ii - 1) % self.keep_every_nth:
+            return
+        try:
+            buffer = self.free_buffers.get_nowait()
+        except queue.Empty:
+            if self.drop_policy == "DropNewest":
+                self.dropped_frames += 1
+                return
+            try:
+                # Reuse the buffer of the oldest frame that was not written yet.
+                buffer, _ = self.pending_frames.get_nowait()
+                self.dropped_frames += 1
+            except queue.Empty:
+                # The write thread holds every buffer.
+                self.dropped_frames += 1
+                return
+        np.copyto(buffer, frame)
+        self.pending_frames.put((buffer, timestamp))
 
-        self.out.write(frame)
+    def __write_loop(self):
+        while True:
+            item = self.pending_frames.get()
+            if item is None:
+                return
+            buffer, timestamp = item
+            self.out.write(buffer)
+            self.timestamps_file.write(f"{self.written_frames},{'' if timestamp is None else timestamp}\n")
+            self.written_frames += 1
+            self.free_buffers.put(buffer)
 
     def close(self):
+        """
+        Writes the queued frames and closes the video.
+        :return:
+        """
+        self.pending_frames.put(None)
+        self.thread.join()
         self.out.release()
+        self.timestamps_file.close()
+
+
+def load_timestamps(path: str) -> Optional[list]:
+    """
+    Loads the timestamps written next to a video by VideoWriter.
+    :param path: Path of the video.
+    :return: Timestamp in seconds of every frame, or None if the video has no timestamps.
+    """
+    timestamps_path = path + ".timestamps.csv"
+    if not os.path.exists(timestamps_path):
+        return None
+    timestamps = []
+    with open(timestamps_path, "r") as f:
+        f.readline()
+        for line in f:
+            values = line.strip().split(",")
+            if len(values) < 2 or values[1] == "":
+                return None
+            timestamps.append(float(values[1]))
+    return timestamps
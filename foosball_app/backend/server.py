@@ -1,10 +1,14 @@
+import math
 import queue
+import time
 from typing import Optional
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS, cross_origin
 import os
 
+from camera.ball_state import SharedBallState
+from camera.frame_broadcaster import FrameBroadcaster
 from other.events import FlaskAppEvent
 
 import json
@@ -13,19 +17,39 @@ app = Flask(__name__)
 app.queue_to_flask: Optional[queue.Queue] = None
 app.queue_from_flask: Optional[queue.Queue] = None
 PATH_TO_CORNERS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),"camera", "data", 'corners.json')
-BALL_POSITIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))),"camera", "data", 'ball_positions.txt')
+# Latest ball state published by the camera process, attached on the first request.
+ball_state: Optional[SharedBallState] = None
+# Last sequence number of the ball state and the time it changed, used to notice when the camera process stopped.
+ball_state_progress = {"sequence": None, "time": None}
+# Board dimensions calculated from the corners file, recalculated when the file is modified.
+board_dim_cache = {"mtime": None, "dim": None}
 cors = CORS(app)
 app.config['CORS_HEADERS'] = 'Content-Type'
+# Default and maximum number of updates per second sent by the stream endpoint.
+app.config['STREAM_RATE'] = 30
+app.config['MAX_STREAM_RATE'] = 120
+# Width, maximum frame rate and JPEG quality of the live camera stream.
+app.config['MJPEG_WIDTH'] = 640
+app.config['MJPEG_FPS'] = 15
+app.config['MJPEG_QUALITY'] = 80
+# Seconds without a new ball state after which the ball state is attached again, in case the camera process restarted.
+app.config['BALL_STATE_STALL_TIMEOUT'] = 1
+# Encodes the camera frames once for all clients of the live camera stream, created on the first request.
+frame_broadcaster: Optional[FrameBroadcaster] = None
 
 
 def calc_board_dim():
-    with open(PATH_TO_CORNERS) as f:
-        data = json.load(f)
+    mtime = os.path.getmtime(PATH_TO_CORNERS)
+    if board_dim_cache["mtime"] != mtime:
+        with open(PATH_TO_CORNERS) as f:
+            data = json.load(f)
 
-    length = data[2][1] - data[0][1]
-    width = data[2][0] - data[0][0]
+        length = data[2][1] - data[0][1]
+        width = data[2][0] - data[0][0]
+        board_dim_cache["dim"] = (length, width)
+        board_dim_cache["mtime"] = mtime
 
-    return length, width
+    return board_dim_cache["dim"]
 
 
 def calculate_coord(length, width, source_point):
@@ -37,15 +61,46 @@ def calculate_coord(length, width, source_point):
     return tgt_point
 
 
-def get_ball_coords():
-    if not os.path.exists(BALL_POSITIONS):
+def get_ball_state() -> Optional[dict]:
+    global ball_state
+    now = time.monotonic()
+    if ball_state is not None:
+        sequence = ball_state.get_sequence()
+        if sequence != ball_state_progress["sequence"]:
+            ball_state_progress.update(sequence=sequence, time=now)
+        elif now - ball_state_progress["time"] > app.config['BALL_STATE_STALL_TIMEOUT']:
+            # A restarted camera process recreates the record, the one still attached is no longer written to.
+            ball_state = reattach_ball_state(ball_state)
+            ball_state_progress.update(time=now)
+    if ball_state is None:
+        try:
+            ball_state = SharedBallState.attach()
+        except FileNotFoundError:
+            # The camera process is not running.
+            return None
+        ball_state_progress.update(sequence=ball_state.get_sequence(), time=now)
+    return ball_state.read()
+
+
+def reattach_ball_state(current: SharedBallState) -> Optional[SharedBallState]:
+    try:
+        attached = SharedBallState.attach()
+    except FileNotFoundError:
+        # The camera process stopped and removed the record.
+        current.close()
         return None
+    if attached.generation_id == current.generation_id:
+        attached.close()
+        return current
+    current.close()
+    return attached
+
 
-    with open(BALL_POSITIONS, 'r') as f:
-        line = f.readline().strip()
-        values = line.split(",")
-        first_two_values = [float(values[0]), float(values[1])]
-    return first_two_values
+def get_ball_coords():
+    state = get_ball_state()
+    if state is None or math.isnan(state["ball_x"]):
+        return None
+    return [state["ball_x"], state["ball_y"]]
 
 
 @app.route('/')
@@ -91,5 +146,65 @@ def coordinates():
         return jsonify({'x': 0, 'y': 0})
 
 
+@app.route('/api/stream')
+@cross_origin()
+def stream():
+    """
+    Streams ball and prediction updates as Server-Sent Events, so that dashboards do not have to poll.
+    The rate query parameter sets the maximum number of updates per second.
+    """
+    rate = request.args.get('rate', app.config['STREAM_RATE'], type=float)
+    rate = min(max(rate, 1), app.config['MAX_STREAM_RATE'])
+
+    def generate():
+        last_frame_number = None
+        while True:
+            state = get_ball_state()
+            # Only send an update when the camera published a new frame.
+            if state is not None and state["frame_number"] != last_frame_number:
+                last_frame_number = state["frame_number"]
+                length, width = calc_board_dim()
+                update = {'frame_number': int(state["frame_number"]), 'x': 0, 'y': 0, 'predicted': None}
+                if not math.isnan(state["ball_x"]):
+                    target_coord = calculate_coord(length, width, (state["ball_x"], state["ball_y"]))
+                    update['x'], update['y'] = round(target_coord[0]), round(target_coord[1])
+                if not math.isnan(state["predicted_x"]):
+                    predicted_coord = calculate_coord(length, width, (state["predicted_x"], state["predicted_y"]))
+                    update['predicted'] = {'x': round(predicted_coord[0]), 'y': round(predicted_coord[1])}
+                yield f"data: {json.dumps(update)}\n\n"
+            time.sleep(1 / rate)
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/api/video')
+@cross_origin()
+def video():
+    """
+    Streams the camera frames as MJPEG. Every frame is encoded once and shared by all clients, a client that can not
+    keep up skips frames.
+    """
+    global frame_broadcaster
+    if frame_broadcaster is None:
+        frame_broadcaster = FrameBroadcaster(app.config['MJPEG_WIDTH'], app.config['MJPEG_FPS'],
+                                             app.config['MJPEG_QUALITY'])
+
+    def generate():
+        frame_broadcaster.add_client()
+        try:
+            sequence = 0
+            while True:
+                sequence, jpeg = frame_broadcaster.wait_for_frame(sequence)
+                if jpeg is None:
+                    continue
+                yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: " + str(len(jpeg)).encode() +
+                       b"\r\n\r\n" + jpeg + b"\r\n")
+        finally:
+            # Called when the client disconnects and the generator is closed.
+            frame_broadcaster.remove_client()
+
+    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
 if __name__ == '__main__':
     app.run(debug=False, host="0.0.0.0")
@@ -82,21 +82,18 @@ const App = () => {
 
   
   useEffect(() => {
-    const intervalId = setInterval(() => {
-      axios.get('http://127.0.0.1:5000/api/coordinates')
-        .then(response => setCoordinates(response.data))
-        .catch(error => console.error(error));
-    setCircleX(coordinates.x);
-    setCircleY(coordinates.y);
-    console.log(coordinates);
-    console.log(circleX);
-    console.log(circleY);
-    }, 200);
+    // The backend pushes ball updates as Server-Sent Events instead of being polled.
+    const eventSource = new EventSource('http://127.0.0.1:5000/api/stream');
+    eventSource.onmessage = (event) => {
+      const update = JSON.parse(event.data);
+      setCoordinates({x: update.x, y: update.y});
+    };
+    eventSource.onerror = (error) => console.error(error);
 
     return () => {
-      clearInterval(intervalId);
+      eventSource.close();
     }
-  }, [coordinates]);
+  }, []);
 
   
 
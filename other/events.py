@@ -16,6 +16,8 @@ class FrontendEvent(Enum):
     MOVE_TO_START_POS = 11
     TEST_LATENCY = 12
     CURRENT_FRAME = 13
+    DROPPED_FRAMES = 14
+    DETECTION_TIMINGS = 15
 
 
 
@@ -45,6 +47,8 @@ class CameraEvent(Enum):
     TEST_STRIKE = 7
     CURRENT_FRAME = 8
     QUICK_STRIKE = 9
+    DROPPED_FRAMES = 10
+    DETECTION_TIMINGS = 11
 
 
 class LinearMotorEvent(Enum):
@@ -109,6 +109,10 @@ class ProcessManager:
                 self.queue_to_tkinter_frontend.put_nowait((FrontendEvent.ERROR, data))
             elif event == CameraEvent.FPS:
                 self.queue_to_tkinter_frontend.put_nowait((FrontendEvent.FPS, data))
+            elif event == CameraEvent.DROPPED_FRAMES:
+                self.queue_to_tkinter_frontend.put_nowait((FrontendEvent.DROPPED_FRAMES, data))
+            elif event == CameraEvent.DETECTION_TIMINGS:
+                self.queue_to_tkinter_frontend.put_nowait((FrontendEvent.DETECTION_TIMINGS, data))
             elif event == CameraEvent.STRIKE:
                 self.queue_to_motors.put_nowait((MotorEvent.STRIKE, None))
             elif event == CameraEvent.QUICK_STRIKE:
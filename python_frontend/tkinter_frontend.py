@@ -2,10 +2,12 @@ import time
 import tkinter as tk
 from multiprocessing import Queue
 from queue import Empty
+from typing import Optional
 from tkinter import messagebox
 
 import cv2
 
+from camera.frame_ring import SharedFrameRing
 from other.events import FrontendEvent
 from PIL import ImageTk, Image
 
@@ -30,6 +32,9 @@ class Frontend(tk.Tk):
         self.geometry("1600x480")
         self.fps_var = tk.StringVar()
         self.fps_var.set("FPS: ")
+        self.fps = ""
+        self.dropped_frames = ""
+        self.detection_timings = ""
         self.encoder_var = tk.StringVar()
         self.encoder_var.set("M1 Encoder:  M2 Encoder:  M1 MM:  M2 Degrees:  ")
         self.encoder_label = tk.Label(self, textvariable=self.encoder_var, font=("Helvetica", 20))
@@ -73,6 +78,8 @@ class Frontend(tk.Tk):
         self.video_feed.grid(row=8, column=0, columnspan=2, sticky="NSWE")
         self.frame_count = 0
         self.start_time = time.time()
+        # Shared memory ring the camera process publishes its frames to, attached on the first frame.
+        self.frame_ring: Optional[SharedFrameRing] = None
 
         self.event_loop()
 
@@ -85,7 +92,19 @@ class Frontend(tk.Tk):
         self.queue_from_frontend.put((FrontendEvent.HOME_M1, None))
 
     def update_fps(self, data):
-        self.fps_var.set(f'FPS: {str(data)}')
+        self.fps = str(data)
+        self.update_fps_label()
+
+    def update_dropped_frames(self, data):
+        self.dropped_frames = str(data)
+        self.update_fps_label()
+
+    def update_detection_timings(self, data):
+        self.detection_timings = ", ".join(f'{stage} {ms} ms' for stage, ms in data.items())
+        self.update_fps_label()
+
+    def update_fps_label(self):
+        self.fps_var.set(f'FPS: {self.fps} Dropped Frames: {self.dropped_frames} Detection: {self.detection_timings}')
 
     def home_m2(self):
         self.queue_from_frontend.put((FrontendEvent.HOME_M2, None))
@@ -96,7 +115,8 @@ class Frontend(tk.Tk):
 
     def update_ball_position(self, data):
         self.ball_position_var.set(
-            f'Ball Pixel ({data["pixel"][0]}, {data["pixel"][1]}). Ball MM ({data["mm"][0]}, {data["mm"][1]}).')
+            f'Ball Pixel ({data["pixel"][0]}, {data["pixel"][1]}). Ball MM ({data["mm"][0]}, {data["mm"][1]}). '
+            f'Confidence {data.get("confidence", 1.0)}.')
 
     def update_predicted_ball_position(self, data):
         self.predicted_ball_var.set(
@@ -108,8 +128,33 @@ class Frontend(tk.Tk):
     def run(self):
         self.mainloop()
 
-    def update_frame(self, frame):
+    def update_frame_from_ring(self, data):
+        """
+        Displays a frame published to the shared memory frame ring by the camera process.
+        :param data: Ring name, ring id, slot index and sequence number of the frame.
+        :return:
+        """
+        # A different ring id means the camera process was restarted and recreated the ring under the same name.
+        if self.frame_ring is not None and (self.frame_ring.shm.name != data["name"] or
+                                            self.frame_ring.ring_id != data["ring_id"]):
+            self.frame_ring.close()
+            self.frame_ring = None
+        if self.frame_ring is None:
+            try:
+                self.frame_ring = SharedFrameRing.attach(data["name"])
+            except FileNotFoundError:
+                # The camera process already shut down.
+                return
+        frame = self.frame_ring.read(data["slot"], data["sequence"])
+        if frame is None:
+            return
         cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
+        # Skip the frame if the camera process overwrote it during the conversion.
+        if not self.frame_ring.is_valid(data["slot"], data["sequence"]):
+            return
+        self.update_image(cv2image)
+
+    def update_image(self, cv2image):
         img = Image.fromarray(cv2image)
         imgtk = ImageTk.PhotoImage(image=img)
         self.video_feed.imgtk = imgtk
@@ -131,8 +176,12 @@ class Frontend(tk.Tk):
                 self.display_error(event[1])
             elif event_type == FrontendEvent.FPS:
                 self.update_fps(event[1])
+            elif event_type == FrontendEvent.DROPPED_FRAMES:
+                self.update_dropped_frames(event[1])
+            elif event_type == FrontendEvent.DETECTION_TIMINGS:
+                self.update_detection_timings(event[1])
             elif event_type == FrontendEvent.CURRENT_FRAME:
-                self.update_frame(event[1])
+                self.update_frame_from_ring(event[1])
         except Empty:
             pass
 
@@ -148,6 +197,6 @@ class Frontend(tk.Tk):
             if time.time() - self.start_time > 1:
                 self.frame_count = 0
                 self.start_time = time.time()
-            self.update_frame(last_frame)
+            self.update_frame_from_ring(last_frame)
 
         self.after(1, self.event_loop)